@@ -28,6 +28,8 @@ PLOTLY_USERNAME = __env.get_secret("PLOTLY_USERNAME")
 PLOTLY_API_KEY = __env.get_secret("PLOTLY_API_KEY")
 
 GEMINI_API_KEY = __env.get_secret("GEMINI_API_KEY")
+# Optional Gemini endpoint override (e.g. the stub server used by loadtest_sms).
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL") or None
 
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -117,9 +119,84 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, __env.get_secret("DB_NAME")),
+        # Reuse connections across requests so the pragmas below run once per
+        # worker connection instead of on every request.
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Take the write lock when a transaction begins, so concurrent writers
+            # wait on busy_timeout instead of failing with "database is locked".
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
+# Applied to every new SQLite connection by main_app.db.apply_sqlite_pragmas.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # Readers no longer block the writer (or vice versa)
+    "synchronous": "NORMAL",  # Durable with WAL; fsync on checkpoint only
+    "busy_timeout": 5000,  # ms to wait for a lock before raising
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -32000,  # Negative values are KiB, so ~32 MB
+    "temp_store": "MEMORY",
+}
+
+# Rendered get_data responses, keyed by StationStats.version (see
+# main_app.response_cache). Point STATION_DATA_CACHE_DIR at a directory to share
+# the cache between worker processes; otherwise each keeps its own in memory.
+STATION_DATA_CACHE_DIR = os.environ.get("STATION_DATA_CACHE_DIR")
+STATION_DATA_CACHE_MAX_BYTES = 4 * 1024 * 1024  # Larger responses are not cached
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "station_data": {
+        "BACKEND": (
+            "django.core.cache.backends.filebased.FileBasedCache"
+            if STATION_DATA_CACHE_DIR
+            else "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": STATION_DATA_CACHE_DIR or "station-data",
+        # Entries never go stale, a new version just stops referencing them.
+        "TIMEOUT": 7 * 24 * 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    },
+}
+
+# How the download view sends files: streamed by Django when unset, or handed
+# to the web server with "x-sendfile" (Apache mod_xsendfile) or
+# "x-accel-redirect" (nginx, via an internal location aliasing STATIC_DIR).
+DOWNLOAD_OFFLOAD = os.environ.get("DOWNLOAD_OFFLOAD") or None
+DOWNLOAD_ACCEL_PREFIX = os.environ.get("DOWNLOAD_ACCEL_PREFIX", "/protected-static/")
+
+# Where main_app.snapshots writes the station GeoJSON snapshot, served as
+# static files (e.g. STATIC_DIR/snapshots); snapshots are off when unset.
+STATION_SNAPSHOT_DIR = os.environ.get("STATION_SNAPSHOT_DIR")
+
+# Directory of the per-station dygraph CSVs published by
+# main_app.crowdhydrology_website_database (on the production host
+# /htdocs/www/crowdhydrology_driver/data/); publishing is off when unset.
+STATION_CSV_DIR = os.environ.get("STATION_CSV_DIR")
+
+# Where main_app.charts renders the stats graphs; they are served by the chart
+# view with long-lived cache headers.
+CHART_DIR = os.environ.get("CHART_DIR", os.path.join(STATIC_DIR, "charts"))
+
+# Where main_app.station_pages writes the static station hydrograph pages that
+# SMS replies link to (crowdhydrology.com/charts/).
+STATION_PAGE_DIR = os.environ.get(
+    "STATION_PAGE_DIR", os.path.join(STATIC_DIR, "station_charts")
+)
+
+# Where main_app.parquet_snapshots writes the Parquet datasets for analysis;
+# `manage.py export_parquet` does nothing when it is unset and no directory is
+# given.
+PARQUET_DIR = os.environ.get("PARQUET_DIR")
+
+# Held by the running graph generation job (main_app.graph_jobs) so that only
+# one generation runs at a time across worker processes.
+GRAPH_JOB_LOCK_FILE = os.environ.get(
+    "GRAPH_JOB_LOCK_FILE", os.path.join(BASE_DIR, ".generate_graphs.lock")
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
 
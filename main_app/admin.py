@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 
 from main_app.models import InvalidSMSContribution, SMSContribution, Sponsor, Station
 
@@ -35,74 +36,34 @@ class InvalidSMSContributionAdmin(admin.ModelAdmin):
 class StationAdmin(admin.ModelAdmin):
     search_fields = ["id", "name", "state"]
     list_filter = ["status", "water_body_type", "state"]
-    list_display = ["id", "name", "state", "water_body_type", "status", "date_added"]
+    list_display = [
+        "id",
+        "name",
+        "state",
+        "water_body_type",
+        "status",
+        "date_added",
+        "contribution_count",
+        "last_reading",
+    ]
     list_editable = ["status"]
+    # Counters come from the one-to-one StationStats row, joined in the list query.
+    list_select_related = ["stats"]
 
-    # def save_model(self, request, obj, form, change):
-    #     test_csv_file = Path(
-    #         ("/htdocs/www/crowdhydrology_driver/data/" + obj.id.upper() + ".csv")
-    #     )
-    #     if not test_csv_file.is_file():
-    #         csv_file = open(
-    #             "/htdocs/www/crowdhydrology_driver/data/" + obj.id.upper() + ".csv", "w"
-    #         )
-    #         csv_file.write("Date and Time,Gage Height (ft),POSIX Stamp\n")
+    @admin.display(description="Contributions")
+    def contribution_count(self, obj):
+        stats = getattr(obj, "stats", None)
+        return stats.contribution_count if stats else 0
 
-    #     test_dygraph_file = Path(
-    #         (
-    #             "/htdocs/www/crowdhydrology_driver/charts/"
-    #             + obj.id.upper()
-    #             + "_dygraph.html"
-    #         )
-    #     )
-    #     if not test_dygraph_file.is_file():
-    #         dygraph_file = open(
-    #             "/htdocs/www/crowdhydrology_driver/charts/"
-    #             + obj.id.upper()
-    #             + "_dygraph.html",
-    #             "w",
-    #         )
-    #         dygraph_file.write(
-    #             """<!DOCTYPE html>
-    #         <html>
-    #           <head>
-    #             <meta http-equiv="X-UA-Compatible" content="IE=EmulateIE7; IE=EmulateIE9">
-    #             <!--[if IE]><script src="js/graph/excanvas.js"></script><![endif]-->
-    #           </head>
-    #           <body>
-    #             <script src="js/graph/dygraph-combined.js" type="text/javascript"></script>
-    #               <div id="graphdiv"></div>
-    #         <script>
-    #                 g = new Dygraph(
-    #                 document.getElementById("graphdiv"),
-    #                 "../data/"""
-    #             + obj.id.upper()
-    #             + """.csv",
-    #                 {   title: "Hydrograph at """
-    #             + obj.id.upper()
-    #             + """",
-    #                 labelsDivStyles: { 'textAlign': 'right' },
-    #                 showRoller: true,
-    #                 xValueFormatter: Dygraph.dateString_,
-    #                 xTicker: Dygraph.dateTicker,
-    #                 labelsSeparateLines: true,
-    #                 labelsKMB: true,
-    #                 visibility: [true,false],
-    #                 drawXGrid: false,
-    #                  width: 640,
-    #                 height: 300,
-    #                 xlabel: 'Date',
-    #                 ylabel: 'Gage Height (ft.)',
-    #                 colors: ["blue"],
-    #                 strokeWidth: 2,
-    #                 showRangeSelector: true
-    #                 }
-    #                 );
-    #         </script>
-    #         </body>
-    #         </html>"""
-    #         )
-    #     super().save_model(request, obj, form, change)
+    @admin.display(description="Last reading")
+    def last_reading(self, obj):
+        stats = getattr(obj, "stats", None)
+        if not stats or not stats.last_date_received:
+            return "-"
+        return "{} ({})".format(
+            stats.last_water_height,
+            timezone.localtime(stats.last_date_received).strftime("%D %H:%M"),
+        )
 
 
 class SponsorAdmin(admin.ModelAdmin):
@@ -1,5 +1,39 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class MainAppConfig(AppConfig):
     name = "main_app"
+
+    def ready(self):
+        from main_app.db import apply_sqlite_pragmas
+        from main_app.models import SMSContribution, Station
+        from main_app.rollups import contribution_changed, contribution_changing
+        from main_app.snapshots import refresh_station_snapshot
+        from main_app.spatial import invalidate_station_index
+
+        connection_created.connect(
+            apply_sqlite_pragmas, dispatch_uid="main_app.apply_sqlite_pragmas"
+        )
+        pre_save.connect(
+            contribution_changing,
+            sender=SMSContribution,
+            dispatch_uid="main_app.contribution_changing",
+        )
+        for signal in (post_save, post_delete):
+            signal.connect(
+                invalidate_station_index,
+                sender=Station,
+                dispatch_uid="main_app.invalidate_station_index",
+            )
+            signal.connect(
+                refresh_station_snapshot,
+                sender=Station,
+                dispatch_uid="main_app.refresh_station_snapshot",
+            )
+            signal.connect(
+                contribution_changed,
+                sender=SMSContribution,
+                dispatch_uid="main_app.contribution_changed",
+            )
@@ -0,0 +1,129 @@
+import contextlib
+import hashlib
+import json
+import os
+from typing import Optional
+
+import plotly
+import plotly.io as pio
+from django.conf import settings
+from django.utils import timezone
+from plotly.offline import get_plotlyjs
+
+from main_app.downloads import precompress
+from main_app.fileio import locked, write_atomic
+
+"""
+Charts rendered locally with plotly into a content-addressed artifact cache.
+
+render_chart writes a figure to settings.CHART_DIR as <name>.<hash>.html (a
+standalone page for iframes) and <name>.<hash>.json (the figure, for clients
+that draw it themselves), plus .gz variants. The hash is of the figure's JSON,
+which embeds the aggregates it was drawn from, so an unchanged chart is never
+rendered again and a changed one gets new file names. That lets the chart view
+serve them as immutable. charts.json names the current files of each chart:
+
+    {"contribution_dates_line_graph": {"html": ..., "json": ..., "hash": ...}}
+
+The pages load plotly.js from plotly-<version>.min.js in the same directory,
+written once per plotly version.
+"""
+
+MANIFEST_NAME = "charts.json"
+KEEP_RENDERS = 2  # Older renders are kept briefly for pages loaded before a change
+
+
+def _chart_dir() -> str:
+    return settings.CHART_DIR
+
+
+def plotlyjs_name() -> str:
+    return "plotly-{}.min.js".format(plotly.__version__)
+
+
+def read_manifest() -> dict:
+    try:
+        with open(os.path.join(_chart_dir(), MANIFEST_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_plotlyjs(directory: str):
+    path = os.path.join(directory, plotlyjs_name())
+    if not os.path.exists(path):
+        write_atomic(path, get_plotlyjs().encode())
+        precompress(path)
+
+
+def render_chart(name: str, figure) -> dict:
+    """
+    Write figure as chart name unless that exact figure is already current,
+    and return the chart's manifest entry.
+    """
+    directory = _chart_dir()
+    os.makedirs(directory, exist_ok=True)
+    figure_json = figure.to_json().encode()
+    digest = hashlib.sha256(figure_json).hexdigest()[:16]
+
+    with locked(directory):
+        manifest = read_manifest()
+        entry = manifest.get(name)
+        if entry and entry["hash"] == digest:
+            return entry
+
+        _write_plotlyjs(directory)
+        html_name = "{}.{}.html".format(name, digest)
+        json_name = "{}.{}.json".format(name, digest)
+        html = pio.to_html(
+            figure,
+            include_plotlyjs=plotlyjs_name(),
+            full_html=True,
+            div_id=name,
+        )
+        for filename, data in ((html_name, html.encode()), (json_name, figure_json)):
+            path = os.path.join(directory, filename)
+            write_atomic(path, data)
+            precompress(path)
+
+        entry = {
+            "html": html_name,
+            "json": json_name,
+            "hash": digest,
+            "rendered": timezone.now().isoformat(),
+        }
+        manifest[name] = entry
+        write_atomic(
+            os.path.join(directory, MANIFEST_NAME), json.dumps(manifest).encode()
+        )
+        _remove_old_renders(directory, name)
+        return entry
+
+
+def _remove_old_renders(directory: str, name: str):
+    renders = sorted(
+        (
+            entry
+            for entry in os.scandir(directory)
+            if entry.name.startswith(name + ".") and entry.name.endswith(".html")
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in renders[KEEP_RENDERS:]:
+        stem = entry.path[: -len(".html")]
+        for path in (stem + ".html", stem + ".json"):
+            for variant in (path, path + ".gz"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(variant)
+
+
+def chart_path(filename: str) -> Optional[str]:
+    """Path of a file written by render_chart, or None for any other name."""
+    if filename == plotlyjs_name() or (
+        filename.count(".") == 2 and filename.endswith((".html", ".json"))
+    ):
+        path = os.path.join(_chart_dir(), os.path.basename(filename))
+        if os.path.isfile(path):
+            return path
+    return None
@@ -3,8 +3,11 @@
 import uuid
 from typing import Optional, Union
 
+from django.db import transaction
 from django.utils import timezone
 
+from main_app import crowdhydrology_website_database as website_database
+from main_app import live, rollups, snapshots
 from main_app.models import InvalidSMSContribution, SMSContribution, Station
 
 """
@@ -27,7 +30,12 @@ def save_contribution(
 
     if is_valid:
         station = get_station_by_id(station_id)
-        save_valid_contribution(hashed_phone_number, station, temperature, water_height)
+        save_valid_contribution(
+            hashed_phone_number,
+            station,
+            water_height=water_height,
+            temperature=temperature,
+        )
     else:
         save_invalid_contribution(hashed_phone_number, message_body)
 
@@ -42,7 +50,9 @@ def save_invalid_contribution(hashed_phone_number, message_body):
         message_body=message_body,
         date_received=timezone.localtime(),
     )
-    new_invalid_contribution.save()
+    with transaction.atomic():
+        new_invalid_contribution.save()
+        rollups.record_invalid_contribution(new_invalid_contribution)
 
 
 def save_valid_contribution(
@@ -58,7 +68,13 @@ def save_valid_contribution(
         temperature=temperature,
         date_received=timezone.localtime(),
     )
-    new_contributon.save()
+    # Derived tables are updated in the same transaction as the contribution.
+    with transaction.atomic():
+        new_contributon.save()
+        rollups.record_contribution(new_contributon)
+        snapshots.station_changed(station.id)
+        website_database.station_changed(station.id)
+        live.publish_contribution(new_contributon)
     return new_contributon
 
 
@@ -1,42 +1,265 @@
 #!/util/python3/bin/python
 
 import csv
+import datetime
+import io
+import itertools
+import json
 import os
+import tempfile
 import time
-from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from loguru import logger
+
+from main_app.fileio import locked, write_atomic
 from main_app.models import SMSContribution, Station
 
+"""
+Per-station contribution CSVs for the crowdhydrology.com dygraphs.
 
-def save_contributions_to_csv(station_id):
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    print(dir_path)
+Each station opts in by having a <STATION>.csv in settings.STATION_CSV_DIR. The
+file is ordered by date_received, and a <STATION>.csv.watermark file next to it
+records the id and date of the newest contribution in it and the file's size.
+publish_station_csv appends only the contributions saved since then, so
+publishing after each saved contribution costs one small query and write.
+
+The file is rebuilt from scratch instead when the watermark is missing or
+doesn't match the file (e.g. an append was interrupted) or a new contribution
+is older than the file's newest. Rebuilds are written to a temporary file and
+renamed into place, so readers never see a half-written file.
+
+export_station_csvs writes every station's file whose watermark is behind, for
+`manage.py export_station_csvs` and main_app.station_pages.
+"""
+
+CSV_HEADER = ["Date and Time", "Gage Height (ft)", "POSIX Stamp"]
+CSV_FIELDS = ("id", "date_received", "water_height")
+BATCH_SIZE = 2000
+WATERMARK_KEYS = {"rows", "last_id", "last_date", "size"}
+
+
+def _csv_dir() -> Optional[str]:
+    return getattr(settings, "STATION_CSV_DIR", None)
+
+
+def csv_path(station_id: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or _csv_dir(), station_id.upper() + ".csv")
+
+
+def _format_rows(rows) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter=",")
+    for _, date_received, water_height in rows:
+        writer.writerow(
+            [
+                date_received.strftime("%m/%d/%Y %X"),
+                str(water_height),
+                str(time.mktime(date_received.timetuple())),
+            ]
+        )
+    return out.getvalue()
+
+
+def read_watermark(path: str) -> Optional[dict]:
+    try:
+        with open(path + ".watermark") as fh:
+            watermark = json.load(fh)
+        if WATERMARK_KEYS - watermark.keys():
+            return None
+        if watermark["size"] != os.path.getsize(path):
+            return None
+        return watermark
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_watermark(path: str, rows: int, last_id: int, last_date: Optional[str]):
+    watermark = {
+        "rows": rows,
+        "last_id": last_id,
+        "last_date": last_date,
+        "size": os.path.getsize(path),
+    }
+    write_atomic(path + ".watermark", json.dumps(watermark).encode())
+
+
+def write_station_csv(path: str, rows) -> int:
+    """
+    Write CSV_FIELDS rows, ordered by date_received, as the CSV at path through
+    a temporary file swapped into place; return the row count.
+    """
+    count, last_id, last_date = 0, 0, None
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".csv.tmp")
+    try:
+        with os.fdopen(fd, "w", newline="") as csv_file:
+            csv.writer(csv_file, delimiter=",").writerow(CSV_HEADER)
+            batch = []
+            for row in rows:
+                batch.append(row)
+                count += 1
+                last_id = max(last_id, row[0])
+                last_date = row[1]
+                if len(batch) == BATCH_SIZE:
+                    csv_file.write(_format_rows(batch))
+                    batch = []
+            csv_file.write(_format_rows(batch))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _write_watermark(path, count, last_id, last_date.isoformat() if last_date else None)
+    return count
+
+
+def rebuild_station_csv(station_id: str) -> int:
+    """Write a station's whole CSV and swap it into place; return its row count."""
+    contributions = (
+        SMSContribution.objects.filter(station_id=station_id)
+        .order_by("date_received", "id")
+        .values_list(*CSV_FIELDS)
+    )
+    return write_station_csv(
+        csv_path(station_id), contributions.iterator(chunk_size=BATCH_SIZE)
+    )
 
-    station = Station.objects.get(id=station_id)
 
-    contribution_list = SMSContribution.objects.filter(station=station)
+def append_station_csv(station_id: str) -> int:
+    """
+    Append the contributions saved since the CSV's watermark and return how
+    many rows were written, rebuilding the file when it can't be appended to.
+    """
+    path = csv_path(station_id)
+    watermark = read_watermark(path)
+    if watermark is None:
+        return rebuild_station_csv(station_id)
 
-    print(("/htdocs/www/crowdhydrology_driver/data/" + station.id.upper() + ".csv"))
-    my_file = Path(
-        ("/htdocs/www/crowdhydrology_driver/data/" + station.id.upper() + ".csv")
+    rows = list(
+        SMSContribution.objects.filter(
+            station_id=station_id, id__gt=watermark["last_id"]
+        )
+        .order_by("date_received", "id")
+        .values_list(*CSV_FIELDS)
     )
+    if not rows:
+        return 0
+    last_date = watermark["last_date"]
+    if last_date and rows[0][1] < datetime.datetime.fromisoformat(last_date):
+        # Older than rows already published; only a rebuild keeps date order.
+        return rebuild_station_csv(station_id)
 
-    if my_file.is_file():
-        print("FILE EXISTS!")
-
-        with open(
-            "/htdocs/www/crowdhydrology_driver/data/" + station.id.upper() + ".csv", "w"
-        ) as csv_file:
-            writer = csv.writer(csv_file, delimiter=",")
-            writer.writerow(["Date and Time", "Gage Height (ft)", "POSIX Stamp"])
-            for contribution in contribution_list:
-                writer.writerow(
-                    [
-                        contribution.date_received.strftime("%m/%d/%Y %X"),
-                        str(contribution.water_height),
-                        str(time.mktime(contribution.date_received.timetuple())),
-                    ]
+    with open(path, "a", newline="") as csv_file:
+        csv_file.write(_format_rows(rows))
+    _write_watermark(
+        path,
+        watermark["rows"] + len(rows),
+        max(row[0] for row in rows),
+        rows[-1][1].isoformat(),
+    )
+    return len(rows)
+
+
+def publish_station_csv(station_id: str, rebuild: bool = False) -> Optional[int]:
+    """
+    Bring a station's CSV up to date and return the rows written, or None if
+    the station has no CSV (or STATION_CSV_DIR is not set).
+    """
+    directory = _csv_dir()
+    if not directory or not os.path.isfile(csv_path(station_id)):
+        return None
+    with locked(directory):
+        if rebuild:
+            return rebuild_station_csv(station_id)
+        return append_station_csv(station_id)
+
+
+def export_station_csvs(
+    directory: str, workers: int = 4, rebuild: bool = False
+) -> dict:
+    """
+    Write the CSV of every station in directory whose watermark doesn't match
+    its contribution count and newest id (every station with rebuild), and
+    return the counts of stations written and skipped and rows written.
+
+    The changed stations' contributions are read in one scan ordered by station
+    and date_received, and each station's rows are handed to a thread pool that
+    writes its file while the scan moves on to the next station.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with locked(directory):
+        stations = Station.objects.values_list("id").annotate(
+            Count("smscontribution"), Max("smscontribution__id")
+        )
+        changed = []
+        for station_id, rows, last_id in stations:
+            watermark = read_watermark(csv_path(station_id, directory))
+            if (
+                rebuild
+                or not watermark
+                or (watermark["rows"], watermark["last_id"]) != (rows, last_id or 0)
+            ):
+                changed.append(station_id)
+        skipped = len(stations) - len(changed)
+
+        contributions = SMSContribution.objects.order_by(
+            "station_id", "date_received", "id"
+        ).values_list("station_id", *CSV_FIELDS)
+        if skipped:
+            contributions = contributions.filter(station_id__in=changed)
+
+        total_rows = 0
+        written = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for station_id, rows in itertools.groupby(
+                contributions.iterator(chunk_size=BATCH_SIZE),
+                key=lambda row: row[0],
+            ):
+                rows = [row[1:] for row in rows]
+                total_rows += len(rows)
+                written.add(station_id)
+                pending.add(
+                    pool.submit(
+                        write_station_csv, csv_path(station_id, directory), rows
+                    )
                 )
-        print("Done! Saved " + station_id + " contributions to csv.")
-    else:
+                # Bound the stations held in memory waiting to be written.
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+            # Changed stations without contributions get a header only file.
+            for station_id in set(changed) - written:
+                pending.add(
+                    pool.submit(write_station_csv, csv_path(station_id, directory), [])
+                )
+            for future in pending:
+                future.result()
+    return {"written": changed, "skipped": skipped, "rows": total_rows}
+
+
+def station_changed(station_id: str):
+    """Publish the station's new contributions once the transaction commits."""
+    if _csv_dir():
+        transaction.on_commit(lambda: _publish(station_id))
+
+
+def _publish(station_id):
+    # The contribution is committed; a publishing failure must not fail the
+    # SMS request. The next contribution retries, rebuilding if needed.
+    try:
+        publish_station_csv(station_id)
+    except Exception:
+        logger.exception("Couldn't publish the contribution CSV of {}", station_id)
+
+
+def save_contributions_to_csv(station_id):
+    rows = publish_station_csv(station_id, rebuild=True)
+    if rows is None:
         print("FILE DOESNT EXIST")
+    else:
+        print("Done! Saved " + station_id + " contributions to csv.")
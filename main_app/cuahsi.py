@@ -0,0 +1,114 @@
+import csv
+
+from main_app.models import SMSContribution, Station
+
+"""
+Contribution export in the CUAHSI HydroShare bulk upload CSV format.
+
+Every row repeats its station's site columns, so those are formatted once per
+station (site_columns) and the contributions are read with one chunked
+values_list query in station and date_received order, without loading a
+Station per row. Rows are written as they are read, so the export streams in
+constant memory however many contributions it covers.
+"""
+
+BULK_UPLOAD_HEADER = [
+    "SourceCode",
+    "DataValue",
+    "SiteCode",
+    "SiteName",
+    "Latitude",
+    "Longitude",
+    "State",
+    "SiteType",
+    "QualityControlLevelCode",
+    "CensorCode",
+    "UTCOffset",
+    "LocalDateTime",
+    "DateTimeUTC",
+    "MethodDescription",
+    "MethodCode",
+    "GeneralCategory",
+    "DataType",
+    "IsRegular",
+    "ValueType",
+    "SampleMedium",
+    "Units",
+    "VariableName",
+    "VariableCode",
+]
+METHOD_COLUMNS = (
+    "SMS from Citizen Scientist",
+    "1",
+    "Hydrology",
+    "Sporadic",
+    "False",
+    "Field Observation",
+    "Surface Water",
+    "Feet",
+    "Gage Height",
+    "1",
+)
+CHUNK_SIZE = 2000
+
+
+def site_columns(station) -> tuple:
+    """The SiteCode to CensorCode/UTCOffset columns shared by a station's rows."""
+    return (
+        station.id,
+        station.name,
+        float(station.loc_latitude),
+        float(station.loc_longitude),
+        station.state,
+        station.water_body_type,
+        "1",
+        "NC",
+        "0",
+    )
+
+
+def bulk_upload_rows(stations=None, start=None, end=None):
+    """
+    Yield the header and a row per contribution of the stations queryset
+    (every station by default) received in [start, end). Contributions without
+    a water height (temperature only readings, e.g. the migrated MI2026 logger
+    data) have no gage height value to upload and are left out.
+    """
+    if stations is None:
+        stations = Station.objects.all()
+    sites = {station.id: site_columns(station) for station in stations}
+
+    contributions = SMSContribution.objects.filter(
+        station__in=stations, water_height__isnull=False
+    )
+    if start:
+        contributions = contributions.filter(date_received__gte=start)
+    if end:
+        contributions = contributions.filter(date_received__lt=end)
+    rows = contributions.order_by("station_id", "date_received", "id").values_list(
+        "station_id", "contributor_id", "water_height", "date_received"
+    )
+
+    yield BULK_UPLOAD_HEADER
+    for station_id, contributor_id, water_height, date_received in rows.iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        day = date_received.strftime("%m/%d/%Y")
+        yield (
+            (str(contributor_id), float(water_height))
+            + sites[station_id]
+            + (day, day)
+            + METHOD_COLUMNS
+        )
+
+
+def write_bulk_upload(out, stations=None, start=None, end=None) -> int:
+    """Write the bulk upload CSV to the text file out; return its data rows."""
+    writer = csv.writer(out, delimiter=",")
+    rows = bulk_upload_rows(stations, start, end)
+    writer.writerow(next(rows))
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
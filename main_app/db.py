@@ -0,0 +1,23 @@
+from django.conf import settings
+
+"""
+Database connection tuning.
+
+apply_sqlite_pragmas is connected to django.db.backends.signals.connection_created
+in MainAppConfig.ready and runs settings.SQLITE_PRAGMAS on every new SQLite
+connection. With CONN_MAX_AGE set that is once per worker connection, not once
+per request.
+"""
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
@@ -0,0 +1,208 @@
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, parse_http_date_safe
+
+"""
+Serve files under STATIC_DIR (the stats CSVs) without loading them into memory.
+
+Files are streamed with FileResponse, or handed to the web server with
+X-Sendfile / X-Accel-Redirect when settings.DOWNLOAD_OFFLOAD is set. Clients that
+accept gzip get the precompressed "<file>.gz" written next to a file by
+precompress(), as long as it is newer than the file. Single byte ranges are
+honoured so interrupted downloads can resume, and ETag / Last-Modified let
+clients revalidate instead of downloading again.
+"""
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def resolve(path: str) -> str:
+    """Absolute path of a file under STATIC_DIR; Http404 for anything else."""
+    try:
+        file_path = safe_join(settings.STATIC_DIR, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(file_path):
+        raise Http404
+    return file_path
+
+
+def precompress(file_path: str) -> str:
+    """
+    Write file_path + ".gz" unless an up to date one exists, and return it.
+
+    The variant is written to a temporary file and renamed into place, so a
+    concurrent download never sees a partial file.
+    """
+    gz_path = file_path + ".gz"
+    if _is_fresh(gz_path, file_path):
+        return gz_path
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".gz.tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, open(file_path, "rb") as source:
+            with gzip.GzipFile(
+                filename=os.path.basename(file_path),
+                fileobj=out,
+                mode="wb",
+                mtime=int(os.path.getmtime(file_path)),
+            ) as compressed:
+                shutil.copyfileobj(source, compressed, BLOCK_SIZE)
+        os.replace(tmp_path, gz_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return gz_path
+
+
+def _is_fresh(gz_path: str, file_path: str) -> bool:
+    if not os.path.exists(gz_path):
+        return False
+    return os.path.getmtime(gz_path) >= os.path.getmtime(file_path)
+
+
+def _accepts_gzip(request) -> bool:
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.strip().replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def _byte_range(request, size: int, etag: str, last_modified: int):
+    """
+    The (start, end) inclusive range requested, None for the whole file, or
+    False if the range can't be satisfied. Multiple ranges are answered with
+    the whole file, which the RFC allows.
+    """
+    match = RANGE_RE.match(request.headers.get("Range", "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    if_range = request.headers.get("If-Range")
+    if (
+        if_range
+        and if_range != etag
+        and parse_http_date_safe(if_range) != last_modified
+    ):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _read_range(file_path: str, start: int, length: int):
+    with open(file_path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(file_path: str):
+    response = HttpResponse()
+    if settings.DOWNLOAD_OFFLOAD == "x-sendfile":
+        response["X-Sendfile"] = file_path
+    else:
+        relative = os.path.relpath(file_path, settings.STATIC_DIR)
+        response["X-Accel-Redirect"] = (
+            settings.DOWNLOAD_ACCEL_PREFIX.rstrip("/")
+            + "/"
+            + relative.replace(os.sep, "/")
+        )
+    return response
+
+
+def file_response(
+    request, file_path: str, as_attachment: bool = True, immutable: bool = False
+):
+    """
+    Serve file_path, honouring conditional and range requests. Files whose
+    name changes with their content can be served as immutable, which lets
+    browsers and proxies cache them for a year without revalidating.
+    """
+    served_path, encoding = file_path, None
+    if _accepts_gzip(request) and _is_fresh(file_path + ".gz", file_path):
+        served_path, encoding = file_path + ".gz", "gzip"
+
+    stat = os.stat(served_path)
+    last_modified = int(stat.st_mtime)
+    etag = '"{:x}-{:x}{}"'.format(
+        stat.st_size, stat.st_mtime_ns, "-gz" if encoding else ""
+    )
+
+    def finish(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        if immutable:
+            patch_cache_control(
+                response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+            )
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        return finish(not_modified)
+
+    content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    if settings.DOWNLOAD_OFFLOAD:
+        # The web server handles ranges itself.
+        response = _offload(served_path)
+    else:
+        byte_range = _byte_range(request, stat.st_size, etag, last_modified)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = "bytes */{}".format(stat.st_size)
+            return finish(response)
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(served_path, start, end - start + 1), status=206
+            )
+            response["Content-Range"] = "bytes {}-{}/{}".format(
+                start, end, stat.st_size
+            )
+            response["Content-Length"] = end - start + 1
+        else:
+            response = FileResponse(open(served_path, "rb"))
+            response["Content-Length"] = stat.st_size
+        response["Accept-Ranges"] = "bytes"
+
+    response["Content-Type"] = content_type
+    if encoding:
+        response["Content-Encoding"] = encoding
+    if as_attachment:
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(
+            os.path.basename(file_path)
+        )
+    return finish(response)
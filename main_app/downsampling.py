@@ -0,0 +1,197 @@
+import datetime
+from typing import Optional
+
+import numpy as np
+from django.db.models import Avg, Count, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from main_app.models import SMSContribution, StationDailyRollup, StationStats
+from main_app.rollups import local_day_bounds
+from main_app.timeseries import (
+    CHUNK_SIZE,
+    CONTRIBUTION_FIELDS,
+    TimeSeriesQueryError,
+    station_contributions,
+)
+
+"""
+Reduce a station's history to a bounded number of points for charting.
+
+points=N picks at most N of the real readings with Largest-Triangle-Three-
+Buckets, which keeps the peaks and troughs a plain stride would drop.
+bucket=1h|1d summarises each hour or day as count/min/max/mean instead. Daily
+buckets are read from StationDailyRollup when the rollups are complete, so
+their cost depends on the number of days rather than readings.
+"""
+
+MAX_POINTS = 10000
+BUCKETS = {"1h": TruncHour, "1d": TruncDay}
+BUCKET_FIELDS = (
+    "bucket_start",
+    "count",
+    "water_height_min",
+    "water_height_max",
+    "water_height_mean",
+    "temperature_mean",
+)
+ID_BATCH_SIZE = 500  # Stays under SQLite's bound parameter limit
+
+
+def parse_downsampling(params):
+    """Return the (points, bucket) requested, either of which may be None."""
+    points, bucket = params.get("points"), params.get("bucket")
+    if points and bucket:
+        raise TimeSeriesQueryError("Use either points or bucket, not both.")
+    if (points or bucket) and (params.get("limit") or params.get("cursor")):
+        raise TimeSeriesQueryError("Downsampled responses are not paginated.")
+    if bucket and bucket not in BUCKETS:
+        raise TimeSeriesQueryError(
+            "bucket must be one of: {}.".format(", ".join(BUCKETS))
+        )
+    if points:
+        try:
+            points = int(points)
+        except ValueError:
+            raise TimeSeriesQueryError("Invalid points.")
+        if not 3 <= points <= MAX_POINTS:
+            raise TimeSeriesQueryError(
+                "points must be between 3 and {}.".format(MAX_POINTS)
+            )
+    return points or None, bucket or None
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps of (x, y).
+
+    x must be sorted. The first and last points are always kept; every bucket
+    in between contributes the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket.
+    """
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+
+    # edges[i]:edges[i + 1] is bucket i of the n - 2 inner points.
+    every = (n - 2) / (points - 2)
+    edges = np.floor(np.arange(points - 1) * every).astype(np.int64) + 1
+    edges = np.append(edges, n)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = x[end : edges[i + 2]].mean()
+        next_y = y[end : edges[i + 2]].mean()
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb_contributions(
+    station_id: str,
+    start: Optional[datetime.datetime],
+    end: Optional[datetime.datetime],
+    points: int,
+):
+    """At most points of the station's readings, as CONTRIBUTION_FIELDS rows."""
+    readings = station_contributions(
+        [station_id], start, end, fields=("id", "date_received", "water_height")
+    ).filter(water_height__isnull=False)
+    ids, x, y = [], [], []
+    for pk, date_received, water_height in readings.iterator(chunk_size=CHUNK_SIZE):
+        ids.append(pk)
+        x.append(date_received.timestamp())
+        y.append(water_height)
+    if not ids:
+        return []
+
+    keep = lttb_indices(np.array(x), np.array(y), points)
+    kept_ids = [ids[i] for i in keep]
+    rows = {}
+    for i in range(0, len(kept_ids), ID_BATCH_SIZE):
+        batch = SMSContribution.objects.filter(
+            id__in=kept_ids[i : i + ID_BATCH_SIZE]
+        ).values_list("id", *CONTRIBUTION_FIELDS)
+        rows.update((row[0], row[1:]) for row in batch)
+    return [rows[pk] for pk in kept_ids]
+
+
+def _is_midnight(value: Optional[datetime.datetime]) -> bool:
+    return value is None or timezone.localtime(value).time() == datetime.time.min
+
+
+def rollups_complete(station_id: str) -> bool:
+    """True if the station's daily rollups account for all its contributions."""
+    expected = (
+        StationStats.objects.filter(station_id=station_id)
+        .values_list("contribution_count", flat=True)
+        .first()
+    )
+    if expected is None:
+        # Contributions loaded in bulk, before any were saved through rollups.
+        return False
+    total = StationDailyRollup.objects.filter(station_id=station_id).aggregate(
+        total=Sum("count")
+    )["total"]
+    return (total or 0) == expected
+
+
+def bucket_summaries(
+    station_id: str,
+    start: Optional[datetime.datetime],
+    end: Optional[datetime.datetime],
+    bucket: str,
+):
+    """
+    Per hour or day summaries of the station's readings, as BUCKET_FIELDS rows.
+
+    Buckets follow the current timezone's hours and days; bucket_start is
+    returned in UTC like date_received.
+    """
+    if bucket == "1d" and _is_midnight(start) and _is_midnight(end):
+        if rollups_complete(station_id):
+            return _in_utc(_daily_rollup_summaries(station_id, start, end))
+
+    return _in_utc(
+        station_contributions([station_id], start, end, fields=("id",))
+        .annotate(bucket_start=BUCKETS[bucket]("date_received"))
+        .values("bucket_start")
+        .annotate(
+            count=Count("id"),
+            water_height_min=Min("water_height"),
+            water_height_max=Max("water_height"),
+            water_height_mean=Avg("water_height"),
+            temperature_mean=Avg("temperature"),
+        )
+        .order_by("bucket_start")
+        .values_list(*BUCKET_FIELDS)
+    )
+
+
+def _in_utc(rows):
+    for bucket_start, *values in rows:
+        yield (bucket_start.astimezone(datetime.timezone.utc), *values)
+
+
+def _daily_rollup_summaries(station_id, start, end):
+    rollups = StationDailyRollup.objects.filter(station_id=station_id)
+    if start:
+        rollups = rollups.filter(day__gte=timezone.localtime(start).date())
+    if end:
+        rollups = rollups.filter(day__lt=timezone.localtime(end).date())
+    for rollup in rollups.order_by("day"):
+        yield (
+            local_day_bounds(rollup.day)[0],
+            rollup.count,
+            rollup.height_min,
+            rollup.height_max,
+            rollup.height_mean,
+            rollup.temperature_mean,
+        )
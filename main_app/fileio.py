@@ -0,0 +1,35 @@
+import contextlib
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows; concurrent writers are then not serialised.
+    fcntl = None
+
+"""
+Helpers for the modules that write files served as static files, e.g. the
+charts, snapshots and station pages: files are replaced atomically, so readers
+never see a partial one, and writers of a directory take its lock.
+"""
+
+
+def write_atomic(path: str, data: bytes):
+    """Write data to path through a temporary file renamed into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextlib.contextmanager
+def locked(directory: str):
+    """Serialise writers of the files in directory across processes."""
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
@@ -0,0 +1,383 @@
+import csv
+import datetime
+import io
+import itertools
+import json
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; clients fall back to gzip.
+    brotli = None
+
+"""
+Wire formats and response compression for station time series.
+
+A TimeSeries (column names plus lazily read row tuples) can be encoded as:
+    json     {"<name>": [{column: value, ...}, ...], ...meta}  (the default)
+    ndjson   one JSON object per line
+    csv      header line, then one line per row
+    columns  {"<name>": {column: [values...], ...}, ...meta}
+    arrow    Apache Arrow IPC stream
+    parquet  Apache Parquet file
+
+When the series has a group_by column (rows must be sorted by it), json and
+columns nest the rows under each group instead, e.g. {"<name>": {"<group>":
+[...], ...}}; the flat formats keep the group as an ordinary column.
+
+Clients pick one with ?format= or the Accept header. Text formats are streamed
+through brotli or gzip when the client's Accept-Encoding allows it. Arrow and
+Parquet need pyarrow, which is imported on first use only.
+"""
+
+ARROW_BATCH_SIZE = 10000
+PARQUET_ROW_GROUP_SIZE = 100000
+BROTLI_QUALITY = 5  # Higher levels are too slow to run inline with a stream.
+ARROW_TYPES = {
+    "contributor_id": "string",
+    "station": "string",
+    "date_received": "timestamp",
+    "bucket_start": "timestamp",
+}
+
+
+class UnsupportedFormat(Exception):
+    """Raised when no supported wire format matches the request."""
+
+
+@dataclass
+class TimeSeries:
+    name: str
+    columns: tuple
+    rows: Iterable[tuple]
+    meta: dict = field(default_factory=dict)
+    group_by: Optional[str] = None
+
+
+def text_value(value):
+    """Convert a database value to its JSON/CSV representation."""
+    if isinstance(value, datetime.datetime):
+        # Same as DjangoJSONEncoder: millisecond precision, "Z" for UTC.
+        text = value.isoformat()
+        if value.microsecond:
+            text = text[:23] + text[26:]
+        if text.endswith("+00:00"):
+            text = text[:-6] + "Z"
+        return text
+    if isinstance(value, (uuid.UUID, datetime.date)):
+        return str(value)
+    return value
+
+
+def _text_rows(series: TimeSeries):
+    for row in series.rows:
+        yield [text_value(value) for value in row]
+
+
+def _groups(series: TimeSeries):
+    """Yield (group, columns, rows) with the group column dropped from rows."""
+    index = series.columns.index(series.group_by)
+    columns = series.columns[:index] + series.columns[index + 1 :]
+    for group, rows in itertools.groupby(
+        _text_rows(series), key=lambda row: row[index]
+    ):
+        yield group, columns, (row[:index] + row[index + 1 :] for row in rows)
+
+
+def _meta_members(series: TimeSeries) -> str:
+    return "".join(
+        ", {}: {}".format(json.dumps(key), json.dumps(value))
+        for key, value in series.meta.items()
+    )
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _json_array(columns, rows):
+    yield "["
+    separator = ""
+    for batch in _batched(rows, 500):
+        yield separator + ",".join(json.dumps(dict(zip(columns, row))) for row in batch)
+        separator = ","
+    yield "]"
+
+
+def encode_json(series: TimeSeries):
+    yield "{{{}: ".format(json.dumps(series.name))
+    if series.group_by:
+        yield "{"
+        for i, (group, columns, rows) in enumerate(_groups(series)):
+            yield "{}{}: ".format(", " if i else "", json.dumps(group))
+            yield from _json_array(columns, rows)
+        yield "}"
+    else:
+        yield from _json_array(series.columns, _text_rows(series))
+    yield "{}}}".format(_meta_members(series))
+
+
+def encode_ndjson(series: TimeSeries):
+    for batch in _batched(_text_rows(series), 500):
+        yield "".join(
+            json.dumps(dict(zip(series.columns, row))) + "\n" for row in batch
+        )
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(series: TimeSeries):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(series.columns)
+    for batch in _batched(_text_rows(series), 500):
+        yield "".join(writer.writerow(row) for row in batch)
+
+
+def _json_columns(columns, rows) -> str:
+    # Parallel arrays can't be emitted until every row has been seen.
+    values = [[] for _ in columns]
+    for row in rows:
+        for column, value in zip(values, row):
+            column.append(value)
+    return json.dumps(dict(zip(columns, values)))
+
+
+def encode_columns(series: TimeSeries):
+    yield "{{{}: ".format(json.dumps(series.name))
+    if series.group_by:
+        # One group is buffered at a time.
+        yield "{"
+        for i, (group, columns, rows) in enumerate(_groups(series)):
+            yield "{}{}: {}".format(
+                ", " if i else "", json.dumps(group), _json_columns(columns, rows)
+            )
+        yield "}"
+    else:
+        yield _json_columns(series.columns, _text_rows(series))
+    yield "{}}}".format(_meta_members(series))
+
+
+def _arrow_type(name: str):
+    import pyarrow as pa
+
+    return {
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }.get(ARROW_TYPES.get(name))
+
+
+def _arrow_batches(series: TimeSeries, size: int):
+    import pyarrow as pa
+
+    schema = None
+    for batch in _batched(series.rows, size):
+        arrays = []
+        for name, values in zip(series.columns, zip(*batch)):
+            arrow_type = _arrow_type(name)
+            if arrow_type == pa.string():
+                values = [None if v is None else str(v) for v in values]
+            elif arrow_type is None and all(v is None for v in values):
+                arrow_type = pa.float64()
+            arrays.append(pa.array(values, type=arrow_type))
+
+        record_batch = pa.RecordBatch.from_arrays(arrays, names=list(series.columns))
+        if schema is None:
+            schema = record_batch.schema
+        elif record_batch.schema != schema:
+            record_batch = record_batch.cast(schema)
+        yield record_batch
+
+
+def _empty_schema(series: TimeSeries):
+    import pyarrow as pa
+
+    return pa.schema(
+        [(name, _arrow_type(name) or pa.float64()) for name in series.columns]
+    )
+
+
+class _Sink(io.RawIOBase):
+    """Write-only buffer that hands back whatever was written since last drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def encode_arrow(series: TimeSeries):
+    import pyarrow as pa
+
+    sink, writer = _Sink(), None
+    for batch in _arrow_batches(series, ARROW_BATCH_SIZE):
+        if writer is None:
+            writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), batch.schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+    if writer is None:
+        empty = _empty_schema(series)
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), empty)
+    writer.close()
+    yield sink.drain()
+
+
+def encode_parquet(series: TimeSeries):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink, writer = _Sink(), None
+    for batch in _arrow_batches(series, PARQUET_ROW_GROUP_SIZE):
+        if writer is None:
+            writer = pq.ParquetWriter(
+                pa.PythonFile(sink, mode="w"), batch.schema, compression="zstd"
+            )
+        writer.write_table(pa.Table.from_batches([batch]))
+        yield sink.drain()
+    if writer is None:
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), _empty_schema(series))
+    writer.close()
+    yield sink.drain()
+
+
+@dataclass(frozen=True)
+class WireFormat:
+    name: str
+    content_type: str
+    encode: Callable
+    extension: Optional[str] = None  # Served as an attachment when set
+    compressible: bool = True
+
+
+FORMATS = {
+    wire_format.name: wire_format
+    for wire_format in [
+        WireFormat("json", "application/json", encode_json),
+        WireFormat("ndjson", "application/x-ndjson", encode_ndjson),
+        WireFormat("csv", "text/csv", encode_csv, extension="csv"),
+        WireFormat("columns", "application/json", encode_columns),
+        WireFormat(
+            "arrow",
+            "application/vnd.apache.arrow.stream",
+            encode_arrow,
+            extension="arrow",
+        ),
+        WireFormat(
+            "parquet",
+            "application/vnd.apache.parquet",
+            encode_parquet,
+            extension="parquet",
+            compressible=False,  # Already zstd compressed internally
+        ),
+    ]
+}
+# Formats reachable through the Accept header, in order of preference.
+ACCEPT_FORMATS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "text/csv": "csv",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+}
+
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate_format(request) -> WireFormat:
+    name = request.GET.get("format")
+    if not name:
+        preferred = request.get_preferred_type(list(ACCEPT_FORMATS))
+        if preferred is None and "Accept" in request.headers:
+            raise UnsupportedFormat("No acceptable format.")
+        name = ACCEPT_FORMATS.get(preferred, "json")
+    if name not in FORMATS:
+        raise UnsupportedFormat(
+            "Unsupported format {}. Use one of: {}.".format(name, ", ".join(FORMATS))
+        )
+    if name in ("arrow", "parquet") and not _pyarrow_available():
+        raise UnsupportedFormat("The {} format is not available.".format(name))
+    return FORMATS[name]
+
+
+def negotiate_encoding(request) -> Optional[str]:
+    accepted = set()
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00"):
+            accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _as_bytes(chunks):
+    for chunk in chunks:
+        yield chunk.encode() if isinstance(chunk, str) else chunk
+
+
+def _brotli_sequence(chunks):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def response_encoding(request, wire_format: WireFormat) -> Optional[str]:
+    """The Content-Encoding streaming_response will use for this request."""
+    return negotiate_encoding(request) if wire_format.compressible else None
+
+
+def streaming_response(request, series: TimeSeries, wire_format: WireFormat, filename):
+    """Stream series in wire_format, compressed as the client allows."""
+    chunks = _as_bytes(wire_format.encode(series))
+    encoding = response_encoding(request, wire_format)
+    if encoding == "br":
+        chunks = _brotli_sequence(chunks)
+    elif encoding == "gzip":
+        chunks = compress_sequence(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=wire_format.content_type)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    if wire_format.extension:
+        response["Content-Disposition"] = 'attachment; filename="{}.{}"'.format(
+            filename, wire_format.extension
+        )
+    patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+    return response
@@ -0,0 +1,148 @@
+import threading
+import traceback
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from loguru import logger
+
+from main_app import graphs
+from main_app.models import GraphGenerationRun
+
+try:
+    import fcntl
+except ImportError:  # Windows; only runs within one process are then serialised.
+    fcntl = None
+
+"""
+Stats graph and CSV generation as a background job.
+
+Generation takes minutes, so start_generation runs main_app.graphs.generate on
+a background thread and returns its GraphGenerationRun at once. Only one
+generation runs at a time: the job holds an exclusive lock on
+settings.GRAPH_JOB_LOCK_FILE while it runs, and a request that arrives in the
+meantime gets the running job's record instead of starting another. The record
+is updated with each step, so the status endpoint and the index page can report
+progress, and is kept after the run as its outcome.
+"""
+
+RUNNING, SUCCEEDED, FAILED = "RU", "OK", "FA"
+
+_start_lock = threading.Lock()
+_worker = None  # The thread of the last job started by this process
+
+
+def _acquire_lock():
+    """The open, exclusively locked lock file, or None if a job holds it."""
+    lock = open(settings.GRAPH_JOB_LOCK_FILE, "w")
+    if fcntl:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+    elif _worker is not None and _worker.is_alive():
+        lock.close()
+        return None
+    return lock
+
+
+def _latest_run() -> Optional[GraphGenerationRun]:
+    return GraphGenerationRun.objects.order_by("-started", "-id").first()
+
+
+def _fail_interrupted_runs():
+    """Mark running runs failed; only call while holding the job lock."""
+    # Nothing else can be running now; these were left by a process that died
+    # mid run.
+    GraphGenerationRun.objects.filter(status=RUNNING).update(
+        status=FAILED, finished=timezone.now(), error="Interrupted"
+    )
+
+
+def latest_run() -> Optional[GraphGenerationRun]:
+    """
+    The latest run. A run still marked running while no job holds the lock was
+    left by a process that died, and is marked failed first.
+    """
+    run = _latest_run()
+    if run is None or run.status != RUNNING:
+        return run
+    with _start_lock:
+        lock = _acquire_lock()
+        if lock is None:
+            return run
+        try:
+            _fail_interrupted_runs()
+        finally:
+            lock.close()
+    run.refresh_from_db()
+    return run
+
+
+def last_successful_run() -> Optional[GraphGenerationRun]:
+    return (
+        GraphGenerationRun.objects.filter(status=SUCCEEDED)
+        .order_by("-finished")
+        .first()
+    )
+
+
+def start_generation(target=None) -> GraphGenerationRun:
+    """
+    Start target(progress), graphs.generate by default, on a background thread
+    and return its run, or return the running job's run if there is one.
+    """
+    global _worker
+    target = target or graphs.generate
+    with _start_lock:
+        lock = _acquire_lock()
+        if lock is None:
+            return _latest_run()
+        try:
+            _fail_interrupted_runs()
+            run = GraphGenerationRun.objects.create(
+                started=timezone.now(), step="Starting"
+            )
+        except BaseException:
+            lock.close()
+            raise
+        _worker = threading.Thread(
+            target=_run, args=(run, target, lock), name="generate-graphs", daemon=True
+        )
+        _worker.start()
+        return run
+
+
+def _run(run: GraphGenerationRun, target, lock):
+    def progress(step, percent):
+        run.step, run.progress = step, percent
+        run.save(update_fields=["step", "progress"])
+
+    try:
+        try:
+            target(progress)
+            run.status, run.step, run.progress = SUCCEEDED, "", 100
+        except Exception:
+            logger.exception("Graph generation failed")
+            run.status, run.error = FAILED, traceback.format_exc()
+        run.finished = timezone.now()
+        run.save()
+    finally:
+        lock.close()
+        connection.close()
+
+
+def run_json(run: Optional[GraphGenerationRun]) -> Optional[dict]:
+    if run is None:
+        return None
+    return {
+        "id": run.id,
+        "status": run.get_status_display().lower(),
+        "step": run.step,
+        "progress": run.progress,
+        "started": run.started.isoformat(),
+        "finished": run.finished.isoformat() if run.finished else None,
+        "error": run.error,
+    }
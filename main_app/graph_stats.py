@@ -0,0 +1,153 @@
+import uuid
+
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from main_app.models import (
+    ContributorStationCount,
+    ContributorStats,
+    GraphStatsWatermark,
+    SMSContribution,
+    StateDailyCount,
+)
+
+"""
+Aggregates behind the stats graphs and CSVs, kept up to date incrementally.
+
+StateDailyCount holds the daily counts of the contribution dates graph.
+GraphStatsWatermark records the newest SMSContribution id folded into it, so
+update_graph_stats only aggregates contributions saved since the last update and
+adds them to the stored counts. Contributions are assumed to be append only;
+after deleting or editing contributions, run
+`manage.py update_graph_stats --rebuild`.
+
+The per-contributor counts come from ContributorStats and
+ContributorStationCount, which main_app.rollups updates on every save.
+"""
+
+ARDUINO_CONTRIBUTOR_ID = "c54fffe2-2870-3b16-8d3c-fc0e65d5e946"
+LOOKUP_BATCH_SIZE = 500
+
+
+def _fold_counts(model, key_fields, groups):
+    """Add each group's "n" to the model row with the group's key fields."""
+    groups = {
+        tuple(group[field] for field in key_fields): group["n"] for group in groups
+    }
+    if not groups:
+        return
+
+    first_values = sorted({key[0] for key in groups})
+    existing = {}
+    for start in range(0, len(first_values), LOOKUP_BATCH_SIZE):
+        lookup = {
+            key_fields[0] + "__in": first_values[start : start + LOOKUP_BATCH_SIZE]
+        }
+        for row in model.objects.filter(**lookup):
+            key = tuple(getattr(row, field) for field in key_fields)
+            if key in groups:
+                existing[key] = row
+
+    for key, row in existing.items():
+        row.count += groups[key]
+    model.objects.bulk_update(
+        existing.values(), ["count"], batch_size=LOOKUP_BATCH_SIZE
+    )
+    model.objects.bulk_create(
+        (
+            model(count=amount, **dict(zip(key_fields, key)))
+            for key, amount in groups.items()
+            if key not in existing
+        ),
+        batch_size=LOOKUP_BATCH_SIZE,
+    )
+
+
+def update_graph_stats() -> int:
+    """
+    Fold the contributions saved since the last update into the graph stats
+    tables and return how many there were.
+    """
+    watermark, _ = GraphStatsWatermark.objects.get_or_create(pk=1)
+    new = SMSContribution.objects.filter(id__gt=watermark.last_contribution_id)
+    latest = new.aggregate(
+        last_id=Max("id"), last_date=Max("date_received"), count=Count("id")
+    )
+    if not latest["count"]:
+        return 0
+    new = new.filter(id__lte=latest["last_id"])
+
+    last_date_received = latest["last_date"]
+    if watermark.last_date_received:
+        last_date_received = max(last_date_received, watermark.last_date_received)
+
+    with transaction.atomic():
+        # Claim the range; if a concurrent update moved the watermark first,
+        # it folds these contributions instead.
+        claimed = GraphStatsWatermark.objects.filter(
+            pk=watermark.pk, last_contribution_id=watermark.last_contribution_id
+        ).update(
+            last_contribution_id=latest["last_id"],
+            last_date_received=last_date_received,
+            updated=timezone.now(),
+        )
+        if not claimed:
+            return 0
+
+        _fold_counts(
+            StateDailyCount,
+            ("state", "day"),
+            new.exclude(contributor_id=uuid.UUID(ARDUINO_CONTRIBUTOR_ID))
+            .annotate(state=F("station__state"), day=TruncDate("date_received"))
+            .values("state", "day")
+            .annotate(n=Count("id")),
+        )
+    return latest["count"]
+
+
+def rebuild_graph_stats() -> int:
+    """Recompute the graph stats tables from every contribution."""
+    with transaction.atomic():
+        StateDailyCount.objects.all().delete()
+        GraphStatsWatermark.objects.update_or_create(
+            pk=1,
+            defaults={
+                "last_contribution_id": 0,
+                "last_date_received": None,
+                "updated": None,
+            },
+        )
+        return update_graph_stats()
+
+
+def contributors_per_total(exclude=(ARDUINO_CONTRIBUTOR_ID,)) -> dict:
+    """Number of contributors who sent each total number of texts."""
+    return dict(
+        ContributorStats.objects.filter(contribution_count__gt=0)
+        .exclude(contributor_id__in=[uuid.UUID(id) for id in exclude])
+        .values_list("contribution_count")
+        .annotate(Count("pk"))
+        .order_by("contribution_count")
+    )
+
+
+def contributor_station_counts():
+    """(contributor, station, count) rows ordered by contributor and station."""
+    rows = ContributorStationCount.objects.order_by(
+        "contributor_id", "station_id"
+    ).values_list("contributor_id", "station_id", "count")
+    return [
+        (str(contributor_id), station_id, amount)
+        for contributor_id, station_id, amount in rows
+    ]
+
+
+def state_daily_counts():
+    """(state, day, count) rows ordered by state and day."""
+    return list(
+        StateDailyCount.objects.order_by("state", "day").values_list(
+            "state", "day", "count"
+        )
+    )
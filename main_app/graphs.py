@@ -1,14 +1,14 @@
 #!/util/python3/bin/python
 
-import datetime
 import os
-import sqlite3
+from dataclasses import dataclass, field
 
-import chart_studio.plotly as py
-import chart_studio.tools as tls
+import pandas as pd
 import plotly.graph_objs as go
 from django.conf import settings
-from tqdm import tqdm
+
+from main_app import charts, graph_stats
+from main_app.downloads import precompress
 
 """
 Functions to create graphs derived from data located in the CSV files.
@@ -20,246 +20,163 @@ Functions to create graphs derived from data located in the CSV files.
 Created: 06/18/2018
 """
 
+# Names of the rendered charts, see main_app.charts.
+PIE_CHART = "contribution_amount_pie_chart"
+LINE_GRAPH = "contribution_dates_line_graph"
 
-def generate_contribution_amount_pie_chart(cursor):
-    print("\tGenerating contribution amount pie chart...")
 
-    # Get a list of total contributions sent per contributor
-    arduino_contributor_id = "c54fffe2-2870-3b16-8d3c-fc0e65d5e946"
-    cursor.execute(
-        "SELECT ContributorID, count(*) FROM SMSContributions WHERE ContributorID != ? GROUP BY ContributorID",
-        (arduino_contributor_id,),
-    )
-    total_contributions_per_contributor_list = cursor.fetchall()
+@dataclass
+class ContributionCounts:
+    """
+    Contribution counts per contributor and station.
 
-    print("\t\tFetched total contributions")
+    per_pair holds (contributor, station, count) ordered by contributor and
+    station; the per contributor and per station totals are summed from it.
+    """
 
-    # print(total_contributions_per_contributor_list)
+    per_pair: list = field(default_factory=list)
+    per_contributor: dict = field(default_factory=dict)
+    per_station: dict = field(default_factory=dict)
 
-    # Count number of contributors for each amount of total contributions
-    # Index 1 with value 10 means : 10 users sent only 1 text
-    num_of_contributors_per_contribution_amount_list = [0] * 10000
+    @classmethod
+    def from_rows(cls, rows) -> "ContributionCounts":
+        """From (contributor, station, count) rows ordered by contributor and station."""
+        counts = cls()
+        for contributor_id, station_id, amount in rows:
+            counts.per_pair.append((contributor_id, station_id, amount))
+            counts.per_contributor[contributor_id] = (
+                counts.per_contributor.get(contributor_id, 0) + amount
+            )
+            counts.per_station[station_id] = (
+                counts.per_station.get(station_id, 0) + amount
+            )
+        return counts
 
-    for total_contributions in total_contributions_per_contributor_list:
-        num_of_contributors_per_contribution_amount_list[total_contributions[1]] += 1
+
+def generate_contribution_amount_pie_chart(contributors_per_total: dict):
+    """
+    contributors_per_total is the number of contributors for each amount of
+    total contributions, ex: {1: 10} means 10 users sent only 1 text.
+    """
+    print("\tGenerating contribution amount pie chart...")
 
     # Add the graph label and value for each contribution amount
-    labels = []
-    values = []
-    for i in tqdm(range(len(num_of_contributors_per_contribution_amount_list))):
-        if num_of_contributors_per_contribution_amount_list[i] != 0:
-            labels.append(str(i) + " texts")
-            values.append(num_of_contributors_per_contribution_amount_list[i])
+    labels = [str(total) + " texts" for total in contributors_per_total]
+    values = list(contributors_per_total.values())
 
     if labels:
-        print("\t\tSending data to plotly...")
+        print("\t\tRendering chart...")
         trace = go.Pie(labels=labels, values=values, hole=0.2, textposition="outside")
-        py.plot(
-            [trace],
-            filename="number_of_contributors_per_contribution_amount_list",
-            auto_open=False,
-        )
+        charts.render_chart(PIE_CHART, go.Figure(data=[trace]))
         print("\tSuccessfully graphed : Contributions Per Contributor Pie Graph")
 
 
-def generate_station_contrib_bar_graph(cursor):
-    print("\tGenerating user station contribution bar graph...")
-
-    plotly_traces = []
-
-    cursor.execute("SELECT DISTINCT ContributorID FROM SMSContributions")
-    contributor_ids = cursor.fetchall()
-
-    # contrib_id_len = len(contributor_ids)
-
-    station_contrib_file = open("../static/stats/station_contribution_dict.csv", "w")
-    station_contrib_file.write("contributor, station, sms_amount\n")
-
-    # Uncomment lines containing contrib_per_person_file or contrib_per_station_file
-    # to get contrib per person csv and contrib per station csv
-    contrib_per_person_file = open("../static/stats/contrib_per_person_file.csv", "w")
-    contrib_per_person_file.write("contributor, contribution_amount\n")
-    contrib_per_station_file = open("../static/stats/contrib_per_station_file.csv", "w")
-    contrib_per_station_file.write("station, contribution_amount\n")
-
-    contrib_per_station_dict = {}
-
-    # For each contributor, get the amount of their contributions per station
-    for contributor_id in tqdm(contributor_ids):
-        # print(contributor_id[0])
-        cursor.execute(
-            "SELECT DISTINCT StationID FROM SMSContributions WHERE ContributorID=(?)",
-            (contributor_id[0],),
+def write_contribution_stats_files(counts: ContributionCounts, stats_dir: str):
+    """Write the contribution CSVs offered on the index page."""
+    os.makedirs(stats_dir, exist_ok=True)
+    paths = {
+        name: os.path.join(stats_dir, name)
+        for name in (
+            "station_contribution_dict.csv",
+            "contrib_per_person_file.csv",
+            "contrib_per_station_file.csv",
         )
-        stations = cursor.fetchall()
-
-        station_contribution_dict = {}
-        total_contributions = 0
-        for station in stations:
-            cursor.execute(
-                "SELECT count(*) FROM SMSContributions WHERE ContributorID=? AND StationID=?",
-                (
-                    contributor_id[0],
-                    station[0],
-                ),
-            )
-            station_contributions_amount = cursor.fetchall()[0]
-            station_contribution_dict[station[0]] = station_contributions_amount[0]
-            total_contributions += station_contributions_amount[0]
-
-            if station in contrib_per_station_dict:
-                contrib_per_station_dict[station] += station_contributions_amount[0]
-            else:
-                contrib_per_station_dict[station] = station_contributions_amount[0]
-        # print(station_contribution_dict)
-
-        plotly_traces.append(
-            go.Bar(
-                x=list(station_contribution_dict.keys()),
-                y=list(station_contribution_dict.values()),
-                name=contributor_id[0],
-            )
+    }
+    with open(paths["station_contribution_dict.csv"], "w") as station_contrib_file:
+        station_contrib_file.write("contributor, station, sms_amount\n")
+        station_contrib_file.writelines(
+            "{},{},{}\n".format(contributor_id, station_id, amount)
+            for contributor_id, station_id, amount in counts.per_pair
         )
-
-        for key, value in station_contribution_dict.items():
-            station_contrib_file.write(
-                str(contributor_id[0]) + "," + str(key) + "," + str(value) + "\n"
-            )
-
-        contrib_per_person_file.write(
-            str(contributor_id[0]) + "," + str(total_contributions) + "\n"
+    with open(paths["contrib_per_person_file.csv"], "w") as contrib_per_person_file:
+        contrib_per_person_file.write("contributor, contribution_amount\n")
+        contrib_per_person_file.writelines(
+            "{},{}\n".format(contributor_id, total)
+            for contributor_id, total in counts.per_contributor.items()
         )
-
-    for station, contrib_amount in contrib_per_station_dict.items():
-        contrib_per_station_file.write(
-            str(station).replace("'", "").replace("(", "").replace(")", "")
-            + str(contrib_amount)
-            + "\n"
+    with open(paths["contrib_per_station_file.csv"], "w") as contrib_per_station_file:
+        contrib_per_station_file.write("station, contribution_amount\n")
+        contrib_per_station_file.writelines(
+            "{},{}\n".format(station_id, total)
+            for station_id, total in counts.per_station.items()
         )
 
-    # layout = go.Layout(barmode="stack")
+    # Refresh the .gz variants served by the download view.
+    for path in paths.values():
+        precompress(path)
 
-    contrib_per_person_file.close()
-    contrib_per_station_file.close()
-    station_contrib_file.close()
-
-    if plotly_traces:
-        print("\t\tSending data to plotly...")
-        # fig = go.Figure(data=plotly_traces, layout=layout)
-        # py.plot(fig, filename='july_12_contributions_per_station', auto_open=False)
-        print("\tSuccessfully graphed : Contributions Stations Bar Graph")
 
+def generate_station_contrib_bar_graph(counts: ContributionCounts):
+    print("\tGenerating user station contribution bar graph...")
 
-# Fills dates having 0 amount of texts in between date1 and date2
-def fill_dates_between(date1, date2, date_list, text_amount_list):
-    next_day = date1 + datetime.timedelta(days=1)
-    days_difference = (date2 - date1).days
+    write_contribution_stats_files(counts, os.path.join(settings.STATIC_DIR, "stats"))
 
-    for i in range(days_difference - 1):
-        try:
-            date_list.append(next_day)
-            text_amount_list.append(0)
-        except OverflowError:  # date value out of range, ex: July 32nd
-            if next_day.month == 12:
-                next_day = next_day.replace(month=1)
-            else:
-                next_day = next_day.replace(month=next_day.month + 1)
+    # The stacked bar graph of counts.per_pair is not rendered, only its CSVs
+    # are written.
+    print("\tSuccessfully wrote : Contributions Stations CSVs")
 
-        next_day += datetime.timedelta(days=1)
 
+def fill_state_days(rows) -> dict:
+    """
+    Number of contributions per day for each state, from (state, day, count)
+    rows, as pandas Series indexed by day from the state's first to its last
+    contribution, with 0 for days without any.
+    """
+    days = pd.DataFrame(list(rows), columns=["state", "day", "amount"])
+    days["day"] = pd.to_datetime(days["day"])
 
-def generate_contribution_dates_line_graph(cursor):
-    print("\tGenerating contribution dates line graph...")
+    state_days = {}
+    for state, state_rows in days.groupby("state", sort=True):
+        amounts = state_rows.set_index("day")["amount"]
+        state_days[state] = amounts.reindex(
+            pd.date_range(amounts.index[0], amounts.index[-1], freq="D"),
+            fill_value=0,
+        )
+    return state_days
 
-    state_dates_dict = dict()
 
-    # For each state, get all the contribution dates
-    cursor.execute("SELECT DISTINCT State FROM SMSContributions")
-    states = cursor.fetchall()
+def generate_contribution_dates_line_graph(state_days: dict):
+    print("\tGenerating contribution dates line graph...")
 
-    for state in states:
-        # print(state[0])
-        arduino_contributor_id = "c54fffe2-2870-3b16-8d3c-fc0e65d5e946"
-        cursor.execute(
-            "SELECT DateReceived FROM SMSContributions WHERE State=? AND ContributorID != ? ORDER BY DateReceived",
-            (state[0], arduino_contributor_id),
+    plotly_traces = [
+        go.Scatter(
+            x=list(amounts.index.to_pydatetime()),
+            y=amounts.tolist(),
+            mode="lines",
+            name=state,
         )
-        contribution_dates = cursor.fetchall()
-        # print(contribution_dates)
-        state_dates_dict[state[0]] = contribution_dates
-
-    plotly_traces = []
-
-    # state_dict_len = len(state_dates_dict.items())
-    # For each state, go through each contribution date and calculate the number of contributions on that day
-    for state, dates in tqdm(state_dates_dict.items()):
-        contribution_date_list = []
-        contribution_amount_list = []
-
-        prev_date = (
-            datetime.datetime.strptime(dates[0][0], "%Y-%m-%d %H:%M:%S")
-        ).replace(hour=0, minute=0, second=0, microsecond=0)
-        contribution_date_list.append(prev_date)
-        contribution_amount_list.append(0)
-
-        for date in dates:
-            date = datetime.datetime.strptime(date[0], "%Y-%m-%d %H:%M:%S").replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            if date > prev_date:
-                fill_dates_between(
-                    prev_date, date, contribution_date_list, contribution_amount_list
-                )
-
-                prev_date = date
-
-                contribution_date_list.append(date)
-                contribution_amount_list.append(1)
-            else:
-                # If the contribution's date is on the same day, increment the amount of contributions on that day
-                contribution_amount_list[-1] += 1
-
-        plotly_traces.append(
-            go.Scatter(
-                x=contribution_date_list,
-                y=contribution_amount_list,
-                mode="lines",
-                name=state,
-            )
-        )
-
-        print("\t\tTraced: ", state)
+        for state, amounts in state_days.items()
+    ]
 
     if plotly_traces:
-        print("\t\tSending data to plotly...")
-        py.plot(plotly_traces, filename="contribution_dates", auto_open=False)
+        print("\t\tRendering chart...")
+        charts.render_chart(LINE_GRAPH, go.Figure(data=plotly_traces))
         print("\tSuccessfully graphed : Contribution Date Line Graph")
 
 
-def generate(request):
-    # Connect to database
-    # CHANGE FILE AFTER DATA MIGRATION
-    conn = sqlite3.connect("old_crowdhydrology_db.sqlite")
-    cursor = conn.cursor()
+def _no_progress(step, percent):
+    pass
 
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    print(dir_path)
 
-    tls.set_credentials_file(
-        username=settings.PLOTLY_USERNAME, api_key=settings.PLOTLY_API_KEY
-    )
+def generate(progress=_no_progress):
+    """
+    Render the graphs (see main_app.charts) and write the stats CSVs from the
+    contributions database. progress(step, percent) is called as each step starts.
+    """
     print("Generating graphs...")
-    generate_contribution_amount_pie_chart(cursor)
-    generate_station_contrib_bar_graph(cursor)
-    generate_contribution_dates_line_graph(cursor)
+    progress("Folding in new contributions", 0)
+    graph_stats.update_graph_stats()
+    counts = ContributionCounts.from_rows(graph_stats.contributor_station_counts())
+    progress("Contribution amount pie chart", 25)
+    generate_contribution_amount_pie_chart(graph_stats.contributors_per_total())
+    progress("Contribution CSVs", 50)
+    generate_station_contrib_bar_graph(counts)
+    progress("Contribution dates line graph", 75)
+    generate_contribution_dates_line_graph(
+        fill_state_days(graph_stats.state_daily_counts())
+    )
     print("Graph generation complete.")
 
-    # Close database connection
-    conn.close()
-    from django.http import HttpResponse
-
-    return HttpResponse("Graphs generated successfully.")
-
 
 if __name__ == "__main__":
     generate()
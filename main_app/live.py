@@ -0,0 +1,201 @@
+import json
+import queue
+import threading
+import time
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Max
+
+from main_app.formats import text_value
+from main_app.models import SMSContribution
+
+"""
+Live feed of new contributions as server-sent events.
+
+Saved contributions are published (after commit) to an in-process broker that
+wakes the streams subscribed to their station or state, which then read every
+contribution newer than their last event from the database. Each subscriber has
+a bounded queue of wake-ups; a subscriber that falls behind is not waited for,
+its queue just overflows, so a slow viewer never holds up an SMS request. Event
+IDs are SMSContribution primary keys, which lets a reconnecting EventSource
+resume after Last-Event-ID.
+
+The broker only sees contributions saved by its own process. Streams also read
+the database every heartbeat, so with several worker processes events from the
+others arrive within HEARTBEAT_SECONDS. Each open stream holds a worker thread
+(run gunicorn with gthread workers) until it ends after MAX_STREAM_SECONDS and
+the client reconnects.
+"""
+
+MAX_SUBSCRIBERS = 100
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+MAX_STREAM_SECONDS = 10 * 60
+REPLAY_LIMIT = 500
+RETRY_MS = 5000
+EVENT_FIELDS = (
+    "id",
+    "station_id",
+    "station__state",
+    "contributor_id",
+    "water_height",
+    "temperature",
+    "date_received",
+)
+
+
+class TooManySubscribers(Exception):
+    """Raised when the process already serves MAX_SUBSCRIBERS streams."""
+
+
+def contribution_event(row) -> dict:
+    """The event payload of an EVENT_FIELDS row."""
+    id, station_id, state, contributor_id, water_height, temperature, date = row
+    return {
+        "id": id,
+        "station": station_id,
+        "state": state,
+        "contributor_id": text_value(contributor_id),
+        "gage_height": water_height,
+        "temperature": temperature,
+        "date_received": text_value(date),
+    }
+
+
+class Subscriber:
+    def __init__(self, station_id: Optional[str] = None, state: Optional[str] = None):
+        self.station_id = station_id
+        self.state = state
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def matches(self, event: dict) -> bool:
+        if self.station_id:
+            return event["station"] == self.station_id
+        return event["state"] == self.state
+
+    def contributions(self):
+        contributions = SMSContribution.objects.all()
+        if self.station_id:
+            return contributions.filter(station_id=self.station_id)
+        return contributions.filter(station__state=self.state)
+
+
+class Broker:
+    def __init__(self, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, subscriber: Subscriber) -> Subscriber:
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise TooManySubscribers
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event: dict):
+        with self.lock:
+            subscribers = [s for s in self.subscribers if s.matches(event)]
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                # A wake-up is already queued; the stream reads every new
+                # contribution from the database when it gets to it.
+                pass
+
+
+broker = Broker()
+
+
+def publish_contribution(contribution: SMSContribution):
+    """Publish a contribution to live subscribers once its transaction commits."""
+    event = contribution_event(
+        (
+            contribution.id,
+            contribution.station_id,
+            contribution.station.state,
+            contribution.contributor_id,
+            contribution.water_height,
+            contribution.temperature,
+            contribution.date_received,
+        )
+    )
+    transaction.on_commit(lambda: broker.publish(event))
+
+
+def latest_event_id() -> int:
+    return SMSContribution.objects.aggregate(latest=Max("id"))["latest"] or 0
+
+
+def format_event(event: dict) -> str:
+    return "id: {}\nevent: contribution\ndata: {}\n\n".format(
+        event["id"], json.dumps(event)
+    )
+
+
+def _catch_up(subscriber: Subscriber, last_id: int):
+    """Yield events newer than last_id from the database; return the new last_id."""
+    while True:
+        rows = list(
+            subscriber.contributions()
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list(*EVENT_FIELDS)[:REPLAY_LIMIT]
+        )
+        for row in rows:
+            event = contribution_event(row)
+            last_id = event["id"]
+            yield format_event(event)
+        if len(rows) < REPLAY_LIMIT:
+            return last_id
+
+
+def _events(subscriber: Subscriber, last_id: int):
+    yield "retry: {}\n\n".format(RETRY_MS)
+    last_id = yield from _catch_up(subscriber, last_id)
+
+    deadline = time.monotonic() + MAX_STREAM_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            subscriber.queue.get(timeout=HEARTBEAT_SECONDS)
+            woken = True
+        except queue.Empty:
+            woken = False
+
+        # Pushes only wake the stream; events are always read from the database
+        # after last_id. Sending a pushed event directly would move last_id past
+        # lower ids another process has yet to commit, skipping them for good.
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        last_id = yield from _catch_up(subscriber, last_id)
+        if not woken:
+            yield ": keepalive\n\n"
+
+
+class EventStream:
+    """
+    Server-sent events for a subscribed Subscriber, starting after last_id or,
+    without one, with contributions saved from now on.
+
+    The subscriber is released in close(), which the response calls when the
+    client goes away, even if streaming never started.
+    """
+
+    def __init__(self, subscriber: Subscriber, last_id: Optional[int] = None):
+        if last_id is None:
+            last_id = latest_event_id()
+        self.subscriber = subscriber
+        self.events = _events(subscriber, last_id)
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        broker.unsubscribe(self.subscriber)
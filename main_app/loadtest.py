@@ -0,0 +1,257 @@
+import contextlib
+import json
+import math
+import mimetypes
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from main_app.models import Station
+
+"""
+Stub servers, scratch databases and bookkeeping used by the load test and
+benchmark management commands.
+
+The media server stands in for Twilio's media storage and the Gemini server
+answers generateContent calls with a canned reading after a configurable delay,
+so the /sms/ webhook can be exercised without any external service.
+"""
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+@contextlib.contextmanager
+def throwaway_database(prefix: str = "loadtest_"):
+    """
+    Point the default connection at a freshly migrated temporary database.
+
+    The database lives in a file rather than SQLite's shared in-memory cache so
+    that worker threads, each with their own connection, can use it
+    concurrently. It is deleted on exit, along with the station snapshot
+    written for it.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    tmp_dir = tempfile.mkdtemp(prefix=prefix)
+    test_settings = connection.settings_dict["TEST"]
+    old_test_name = test_settings.get("NAME")
+    test_settings["NAME"] = os.path.join(tmp_dir, "db.sqlite3")
+
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        with override_settings(STATION_SNAPSHOT_DIR=os.path.join(tmp_dir, "snapshots")):
+            yield test_settings["NAME"]
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings["NAME"] = old_test_name
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def seed_stations(station_ids, upper_bound: float = 10.0) -> list[Station]:
+    return Station.objects.bulk_create(
+        Station(
+            id=station_id,
+            name="Load test " + station_id,
+            state=station_id[:2],
+            loc_latitude=0,
+            loc_longitude=0,
+            upper_bound=upper_bound,
+            lower_bound=0,
+            date_added=timezone.localdate(),
+        )
+        for station_id in station_ids
+    )
+
+
+def find_sample_images(directory: str) -> list[str]:
+    """Return image paths under directory, relative to it."""
+    images = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(images)
+
+
+def image_content_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "image/jpeg"
+
+
+class _QuietHandlerMixin:
+    def log_message(self, format, *args):
+        pass
+
+
+class _MediaRequestHandler(_QuietHandlerMixin, SimpleHTTPRequestHandler):
+    pass
+
+
+class _GeminiRequestHandler(_QuietHandlerMixin, SimpleHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if not self.path.endswith(":generateContent"):
+            self.send_error(404)
+            return
+
+        with server.rng_lock:
+            delay = max(0.0, server.rng.gauss(server.latency_ms, server.jitter_ms))
+            station_id = server.rng.choice(server.station_ids)
+            gauge_reading = round(server.rng.uniform(0.5, 4.5), 2)
+        time.sleep(delay / 1000)
+
+        reading = {
+            "station_label": {
+                "is_valid_station_label": True,
+                "station_id": station_id,
+            },
+            "gauge_reading": {
+                "is_valid_gauge": True,
+                "gauge_reading": gauge_reading,
+            },
+        }
+        body = json.dumps(
+            {
+                "candidates": [
+                    {
+                        "content": {
+                            "role": "model",
+                            "parts": [{"text": json.dumps(reading)}],
+                        },
+                        "finishReason": "STOP",
+                        "index": 0,
+                    }
+                ]
+            }
+        ).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer:
+    """A ThreadingHTTPServer bound to an ephemeral localhost port."""
+
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StubMediaServer(StubServer):
+    """Serves the files of a directory, like Twilio's MediaUrl endpoints."""
+
+    def __init__(self, directory: str):
+        super().__init__(partial(_MediaRequestHandler, directory=directory))
+
+
+class StubGeminiServer(StubServer):
+    """Answers Gemini generateContent requests with a random valid reading."""
+
+    def __init__(
+        self,
+        station_ids: list[str],
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        super().__init__(_GeminiRequestHandler)
+        self.httpd.station_ids = station_ids
+        self.httpd.latency_ms = latency_ms
+        self.httpd.jitter_ms = jitter_ms
+        self.httpd.rng = random.Random(seed)
+        self.httpd.rng_lock = threading.Lock()
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+@dataclass
+class LoadResults:
+    """Thread-safe tally of request outcomes, grouped by request kind."""
+
+    latencies: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    statuses: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, kind: str, latency: float, status, failed: bool):
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(latency)
+            self.errors[kind] = self.errors.get(kind, 0) + int(failed)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    def summary_lines(self, elapsed: float) -> list[str]:
+        lines = [
+            "Requests: {} in {:.2f}s ({:.1f} req/s)".format(
+                self.total, elapsed, self.total / elapsed if elapsed else 0.0
+            )
+        ]
+        groups = sorted(self.latencies.items())
+        if len(groups) > 1:
+            groups.append(("all", [v for _, values in groups for v in values]))
+        for kind, values in groups:
+            values = sorted(values)
+            errors = (
+                sum(self.errors.values()) if kind == "all" else self.errors.get(kind, 0)
+            )
+            lines.append(
+                "  {:<5} n={:<6} errors={} ({:.1%})  latency ms: "
+                "p50={:.1f} p90={:.1f} p95={:.1f} p99={:.1f} max={:.1f}".format(
+                    kind,
+                    len(values),
+                    errors,
+                    errors / len(values) if values else 0.0,
+                    percentile(values, 50) * 1000,
+                    percentile(values, 90) * 1000,
+                    percentile(values, 95) * 1000,
+                    percentile(values, 99) * 1000,
+                    values[-1] * 1000 if values else 0.0,
+                )
+            )
+        lines.append(
+            "  status codes: "
+            + ", ".join(
+                "{}={}".format(status, count)
+                for status, count in sorted(self.statuses.items(), key=str)
+            )
+        )
+        return lines
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main_app.models import Station
+from main_app.rollups import rebuild_station_rollups
+
+"""
+Rebuild StationDailyRollup from the raw SMSContribution history.
+
+Each station is rebuilt in its own transaction, so contributions saved while the
+backfill runs are either already in the recomputed rows or added on top of them.
+
+Example:
+    python manage.py backfill_station_rollups --workers 4
+    python manage.py backfill_station_rollups --station NY1000 --station NY1001
+"""
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily per-station rollups from contribution history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--station",
+            action="append",
+            dest="stations",
+            help="Only rebuild this station (repeatable). Defaults to all.",
+        )
+        parser.add_argument("--workers", type=int, default=4)
+
+    def handle(self, *args, **options):
+        station_ids = options["stations"] or list(
+            Station.objects.values_list("id", flat=True)
+        )
+
+        def rebuild(station_id):
+            try:
+                return station_id, rebuild_station_rollups(station_id)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        total = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            for station_id, days in pool.map(rebuild, station_ids):
+                total += days
+                if options["verbosity"] > 1:
+                    self.stdout.write("{}: {} days".format(station_id, days))
+
+        self.stdout.write(
+            "Rebuilt {} daily rollups for {} stations in {:.2f}s.".format(
+                total, len(station_ids), time.perf_counter() - started
+            )
+        )
@@ -0,0 +1,202 @@
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.graph_stats import ARDUINO_CONTRIBUTOR_ID
+from main_app.graphs import ContributionCounts, fill_state_days
+
+"""
+Benchmark the contribution counts behind the stats graphs and CSVs.
+
+A synthetic legacy SMSContributions table is written to a temporary sqlite
+file. The counts are computed with a single GROUP BY scan folded by
+main_app.graphs.ContributionCounts, as main_app.graph_stats does, and with the
+previous per contributor queries (one DISTINCT StationID query per contributor
+plus one count per contributor and station) for a sample of contributors, which
+is extrapolated to all of them. The sampled
+contributors' counts are checked to agree.
+
+The per state daily counts of the contribution dates line graph are timed the
+same way, grouped by day and filled by main_app.graphs.fill_state_days, against
+the previous per state queries that parsed and walked every row in Python.
+
+Example:
+    python manage.py bench_graph_stats --rows 1000000 --contributors 20000
+"""
+
+LEGACY_SCHEMA = (
+    "CREATE TABLE SMSContributions (ContributorID text, StationID text, "
+    "State text, WaterHeight float, Temperature float, DateReceived text)"
+)
+STATES = ("NY", "PA", "MI", "IL", "WI")
+FIRST_DATE = datetime.datetime(2016, 1, 1)
+DATE_SPAN_SECONDS = 3 * 365 * 24 * 3600
+
+
+def write_legacy_database(path, rows, contributors, stations, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany(
+        "INSERT INTO SMSContributions VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (
+                "contributor-%d"
+                % (int(rng.paretovariate(1.2) * contributors / 10) % contributors),
+                "%s%04d" % (STATES[station % len(STATES)], station),
+                STATES[station % len(STATES)],
+                rng.uniform(0, 10),
+                None,
+                (
+                    FIRST_DATE
+                    + datetime.timedelta(seconds=rng.randrange(DATE_SPAN_SECONDS))
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+            )
+            for station in (rng.randrange(stations) for _ in range(rows))
+        ),
+    )
+    conn.commit()
+    return conn
+
+
+def grouped_counts(cursor) -> ContributionCounts:
+    """The contribution counts, in one scan."""
+    cursor.execute(
+        "SELECT ContributorID, StationID, count(*) FROM SMSContributions "
+        "GROUP BY ContributorID, StationID ORDER BY ContributorID, StationID"
+    )
+    return ContributionCounts.from_rows(cursor)
+
+
+def grouped_days(cursor) -> dict:
+    """The fill_state_days daily counts, in one scan."""
+    cursor.execute(
+        "SELECT State, substr(DateReceived, 1, 10) AS Day, count(*) "
+        "FROM SMSContributions WHERE ContributorID != ? "
+        "GROUP BY State, Day ORDER BY State, Day",
+        (ARDUINO_CONTRIBUTOR_ID,),
+    )
+    return fill_state_days(cursor.fetchall())
+
+
+def legacy_counts(cursor, contributor_id):
+    """The previous per contributor queries: {station: count}."""
+    cursor.execute(
+        "SELECT DISTINCT StationID FROM SMSContributions WHERE ContributorID=(?)",
+        (contributor_id,),
+    )
+    counts = {}
+    for (station_id,) in cursor.fetchall():
+        cursor.execute(
+            "SELECT count(*) FROM SMSContributions WHERE ContributorID=? AND StationID=?",
+            (contributor_id, station_id),
+        )
+        counts[station_id] = cursor.fetchone()[0]
+    return counts
+
+
+def legacy_days(cursor, state):
+    """The previous per state query and walk: (days, amounts)."""
+    cursor.execute(
+        "SELECT DateReceived FROM SMSContributions WHERE State=? AND ContributorID != ? ORDER BY DateReceived",
+        (state, ARDUINO_CONTRIBUTOR_ID),
+    )
+    days, amounts = [], []
+    for (date,) in cursor.fetchall():
+        day = datetime.datetime.strptime(date, "%Y-%m-%d %H:%M:%S").replace(
+            hour=0, minute=0, second=0
+        )
+        while days and days[-1] + datetime.timedelta(days=1) < day:
+            days.append(days[-1] + datetime.timedelta(days=1))
+            amounts.append(0)
+        if days and days[-1] == day:
+            amounts[-1] += 1
+        else:
+            days.append(day)
+            amounts.append(1)
+    return days, amounts
+
+
+class Command(BaseCommand):
+    help = "Compare the single pass contribution counts with per contributor queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000000)
+        parser.add_argument("--contributors", type=int, default=20000)
+        parser.add_argument("--stations", type=int, default=200)
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=20,
+            help="Contributors to time the per contributor queries for.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            started = time.perf_counter()
+            conn = write_legacy_database(
+                os.path.join(tmp_dir, "legacy.sqlite"),
+                options["rows"],
+                options["contributors"],
+                options["stations"],
+                options["seed"],
+            )
+            self.stdout.write(
+                "Wrote {} rows in {:.1f} s".format(
+                    options["rows"], time.perf_counter() - started
+                )
+            )
+            cursor = conn.cursor()
+
+            started = time.perf_counter()
+            counts = grouped_counts(cursor)
+            single_pass = time.perf_counter() - started
+            self.stdout.write(
+                "Single pass: {:.2f} s for {} contributors, {} stations".format(
+                    single_pass, len(counts.per_contributor), len(counts.per_station)
+                )
+            )
+
+            per_station = {}
+            for contributor_id, station_id, amount in counts.per_pair:
+                per_station.setdefault(contributor_id, {})[station_id] = amount
+            sample = random.Random(options["seed"]).sample(
+                sorted(per_station), min(options["sample"], len(per_station))
+            )
+
+            started = time.perf_counter()
+            for contributor_id in sample:
+                if legacy_counts(cursor, contributor_id) != per_station[contributor_id]:
+                    self.stderr.write("Count mismatch for {}".format(contributor_id))
+            per_contributor = (time.perf_counter() - started) / max(len(sample), 1)
+            estimate = per_contributor * len(per_station)
+            self.stdout.write(
+                "Per contributor queries: {:.1f} ms each, ~{:.0f} s for all "
+                "({:.0f}x slower)".format(
+                    per_contributor * 1000, estimate, estimate / single_pass
+                )
+            )
+
+            started = time.perf_counter()
+            state_days = grouped_days(cursor)
+            bucketed = time.perf_counter() - started
+            started = time.perf_counter()
+            for state, amounts in state_days.items():
+                days, legacy_amounts = legacy_days(cursor, state)
+                if (
+                    list(amounts.index.to_pydatetime()) != days
+                    or amounts.tolist() != legacy_amounts
+                ):
+                    self.stderr.write("Daily count mismatch for {}".format(state))
+            walked = time.perf_counter() - started
+            self.stdout.write(
+                "Daily counts: {:.2f} s bucketed, {:.2f} s per state walk "
+                "({:.0f}x slower)".format(bucketed, walked, walked / bucketed)
+            )
+            conn.close()
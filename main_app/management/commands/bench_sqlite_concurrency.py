@@ -0,0 +1,129 @@
+import datetime
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from main_app.contribution_database import save_valid_contribution
+from main_app.loadtest import LoadResults, seed_stations, throwaway_database
+from main_app.models import SMSContribution
+
+"""
+Benchmark mixed SQLite reads and writes with and without the connection tuning
+from settings (SQLITE_PRAGMAS and the IMMEDIATE transaction mode).
+
+Writer threads save contributions through contribution_database while reader
+threads run get_data-style station queries. Each mode gets its own scratch
+database so the persistent journal_mode of one run can't leak into the other.
+
+Example:
+    python manage.py bench_sqlite_concurrency --writers 4 --readers 8 --duration 10
+"""
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite read/write concurrency before and after connection tuning."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds.")
+        parser.add_argument("--stations", type=int, default=20)
+        parser.add_argument(
+            "--seed-rows",
+            type=int,
+            default=20000,
+            help="Historical contributions loaded before the run.",
+        )
+
+    def handle(self, *args, **options):
+        db_options = connections[DEFAULT_DB_ALIAS].settings_dict["OPTIONS"]
+        modes = [
+            ("defaults", {}, {}),
+            ("tuned", settings.SQLITE_PRAGMAS, dict(db_options)),
+        ]
+
+        saved_options = dict(db_options)
+        try:
+            for name, pragmas, mode_options in modes:
+                db_options.clear()
+                db_options.update(mode_options)
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    results, elapsed = self.run_mode(options)
+
+                self.stdout.write("[{}] pragmas={}".format(name, pragmas or "none"))
+                for line in results.summary_lines(elapsed):
+                    self.stdout.write(line)
+        finally:
+            db_options.clear()
+            db_options.update(saved_options)
+
+    def run_mode(self, options):
+        with throwaway_database(prefix="bench_sqlite_"):
+            station_ids = ["NY%04d" % i for i in range(options["stations"])]
+            stations = seed_stations(station_ids)
+            self.seed_contributions(stations, options["seed_rows"])
+            connections.close_all()
+
+            results = LoadResults()
+            deadline = time.perf_counter() + options["duration"]
+
+            def run(kind, operation):
+                rng = random.Random()
+                try:
+                    while time.perf_counter() < deadline:
+                        started = time.perf_counter()
+                        status, failed = "ok", False
+                        try:
+                            operation(rng)
+                        except OperationalError as e:
+                            status, failed = str(e), True
+                        except Exception as e:
+                            status, failed = type(e).__name__, True
+                        results.record(
+                            kind, time.perf_counter() - started, status, failed
+                        )
+                finally:
+                    connections.close_all()
+
+            def write(rng):
+                save_valid_contribution(
+                    str(uuid.uuid4()), rng.choice(stations), rng.uniform(0, 5)
+                )
+
+            def read(rng):
+                list(
+                    SMSContribution.objects.filter(
+                        station_id=rng.choice(station_ids)
+                    ).values_list("contributor_id", "water_height", "date_received")
+                )
+
+            workers = [("write", write)] * options["writers"]
+            workers += [("read", read)] * options["readers"]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+                for future in [pool.submit(run, *worker) for worker in workers]:
+                    future.result()
+            return results, time.perf_counter() - started
+
+    def seed_contributions(self, stations, count):
+        rng = random.Random(0)
+        now = timezone.now()
+        SMSContribution.objects.bulk_create(
+            (
+                SMSContribution(
+                    contributor_id=uuid.UUID(int=rng.getrandbits(128)),
+                    station=rng.choice(stations),
+                    water_height=rng.uniform(0, 5),
+                    date_received=now - datetime.timedelta(seconds=i + 1),
+                )
+                for i in range(count)
+            ),
+            batch_size=5000,
+        )
@@ -0,0 +1,117 @@
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.loadtest import percentile
+from main_app.spatial import EARTH_RADIUS_KM, StationIndex, StationPoint
+
+"""
+Benchmark the in-memory station index against a linear scan.
+
+Synthetic stations are scattered over the continental US (or the real ones are
+loaded with --from-db). Each query runs against the index and a brute force
+haversine scan, the results are checked to agree, and per query latency
+percentiles are reported for both.
+
+Example:
+    python manage.py bench_station_index --stations 5000 --queries 2000 --k 10
+"""
+
+US_BOUNDS = (-125.0, 24.0, -66.0, 50.0)  # west, south, east, north
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Command(BaseCommand):
+    help = "Compare station index queries with a linear scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stations", type=int, default=5000)
+        parser.add_argument("--queries", type=int, default=1000)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument(
+            "--bbox-degrees",
+            type=float,
+            default=2.0,
+            help="Width and height of the bounding box queries.",
+        )
+        parser.add_argument("--from-db", action="store_true")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        west, south, east, north = US_BOUNDS
+
+        started = time.perf_counter()
+        if options["from_db"]:
+            index = StationIndex.from_database()
+        else:
+            index = StationIndex(
+                [
+                    StationPoint(
+                        "ST%05d" % i,
+                        "Station %d" % i,
+                        "NY",
+                        rng.uniform(south, north),
+                        rng.uniform(west, east),
+                    )
+                    for i in range(options["stations"])
+                ]
+            )
+        self.stdout.write(
+            "Indexed {} stations in {:.1f} ms".format(
+                len(index.points), (time.perf_counter() - started) * 1000
+            )
+        )
+
+        k, size = options["k"], options["bbox_degrees"]
+        timings = {"near index": [], "near scan": [], "bbox index": [], "bbox scan": []}
+        for _ in range(options["queries"]):
+            lat, lon = rng.uniform(south, north), rng.uniform(west, east)
+
+            started = time.perf_counter()
+            nearest = index.nearest(lat, lon, k)
+            timings["near index"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            scanned = sorted(
+                index.points,
+                key=lambda p: haversine_km(lat, lon, p.latitude, p.longitude),
+            )[:k]
+            timings["near scan"].append(time.perf_counter() - started)
+            if [p.id for _, p in nearest] != [p.id for p in scanned]:
+                self.stderr.write("Nearest mismatch at {}, {}".format(lat, lon))
+
+            box = (lon, lat, lon + size, lat + size)
+            started = time.perf_counter()
+            inside = index.within(*box)
+            timings["bbox index"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            scanned = [
+                p
+                for p in index.points
+                if box[1] <= p.latitude <= box[3] and box[0] <= p.longitude <= box[2]
+            ]
+            timings["bbox scan"].append(time.perf_counter() - started)
+            if {p.id for p in inside} != {p.id for p in scanned}:
+                self.stderr.write("Bounding box mismatch at {}, {}".format(lat, lon))
+
+        for name, values in timings.items():
+            values.sort()
+            self.stdout.write(
+                "{:<11} p50={:8.1f}us p99={:8.1f}us".format(
+                    name,
+                    percentile(values, 50) * 1e6,
+                    percentile(values, 99) * 1e6,
+                )
+            )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from main_app.station_pages import build_station_pages
+
+"""
+Build the static hydrograph page of every station (see main_app.station_pages).
+
+The station CSVs are exported first; only stations with new contributions get
+new CSVs and data files, and only changed pages are written, so it can run
+every few minutes.
+
+Example:
+    python manage.py build_station_pages --output-dir /htdocs/www/crowdhydrology_driver/charts --workers 4
+"""
+
+
+class Command(BaseCommand):
+    help = "Write the static chart pages and data files of stations with new data."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir", help="Defaults to settings.STATION_PAGE_DIR."
+        )
+        parser.add_argument(
+            "--csv-dir",
+            help="Station CSVs to publish from; defaults to settings.STATION_CSV_DIR.",
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rewrite the CSVs of unchanged stations too.",
+        )
+
+    def handle(self, *args, **options):
+        result = build_station_pages(
+            options["output_dir"],
+            options["csv_dir"],
+            options["workers"],
+            rebuild=options["all"],
+        )
+        self.stdout.write(
+            "{stations} stations: wrote {csvs_written} CSVs from {rows} rows, "
+            "{data_written} data files and {pages_written} pages".format(**result)
+        )
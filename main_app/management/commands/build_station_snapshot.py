@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.snapshots import write_snapshot
+
+"""
+Rebuild the station summary GeoJSON snapshot from scratch.
+
+Contributions and station edits keep the snapshot current incrementally; run
+this after deploying, after bulk imports, or if a refresh failed.
+
+Example:
+    python manage.py build_station_snapshot
+"""
+
+
+class Command(BaseCommand):
+    help = "Regenerate the station GeoJSON snapshot for every station."
+
+    def handle(self, *args, **options):
+        manifest = write_snapshot()
+        if manifest is None:
+            raise CommandError("STATION_SNAPSHOT_DIR is not set.")
+        self.stdout.write(
+            "Wrote {} stations to {}".format(manifest["stations"], manifest["url"])
+        )
@@ -0,0 +1,44 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main_app.downloads import precompress
+
+"""
+Write or refresh the precompressed .gz variant of every file served by the
+download view, so clients accepting gzip get them without compressing per
+request. Variants already newer than their file are left alone.
+
+Example:
+    python manage.py compress_stats --dir static/stats
+"""
+
+
+class Command(BaseCommand):
+    help = "Precompress downloadable stats files into .gz variants."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dir",
+            default=os.path.join(settings.STATIC_DIR, "stats"),
+            help="Directory of files to compress (recursively).",
+        )
+
+    def handle(self, *args, **options):
+        compressed = 0
+        for root, _, filenames in os.walk(options["dir"]):
+            for filename in sorted(filenames):
+                if filename.endswith((".gz", ".tmp")):
+                    continue
+                file_path = os.path.join(root, filename)
+                gz_path = precompress(file_path)
+                compressed += 1
+                self.stdout.write(
+                    "{}: {} -> {} bytes".format(
+                        file_path,
+                        os.path.getsize(file_path),
+                        os.path.getsize(gz_path),
+                    )
+                )
+        self.stdout.write("{} files compressed.".format(compressed))
@@ -0,0 +1,84 @@
+import gzip
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.cuahsi import write_bulk_upload
+from main_app.models import Station
+from main_app.timeseries import TimeSeriesQueryError, parse_timestamp
+
+"""
+Export contributions as a CUAHSI HydroShare bulk upload CSV (see main_app.cuahsi).
+
+Without filters every station's contributions are exported in one pass. The
+file is streamed to a temporary file renamed into place when complete, and is
+gzipped with --gzip or an output path ending in .gz. Pass "-" as the output to
+write to stdout.
+
+Example:
+    python manage.py export_cuahsi bulkUpload.csv.gz --state NY --since 2019-01-01
+"""
+
+
+class Command(BaseCommand):
+    help = "Write contributions in the CUAHSI bulk upload CSV format."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help='Output file, or "-" for stdout.')
+        parser.add_argument(
+            "--station", action="append", default=[], help="Repeat for several."
+        )
+        parser.add_argument(
+            "--state", action="append", default=[], help="Repeat for several."
+        )
+        parser.add_argument("--since", help="Date or datetime, inclusive.")
+        parser.add_argument("--until", help="Date (inclusive) or datetime.")
+        parser.add_argument("--gzip", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            start = options["since"] and parse_timestamp(options["since"])
+            end = options["until"] and parse_timestamp(
+                options["until"], end_of_day=True
+            )
+        except TimeSeriesQueryError as e:
+            raise CommandError(e)
+
+        stations = Station.objects.order_by("id")
+        if options["station"]:
+            stations = stations.filter(
+                id__in=[station.upper() for station in options["station"]]
+            )
+        if options["state"]:
+            stations = stations.filter(
+                state__in=[state.upper() for state in options["state"]]
+            )
+
+        started = time.perf_counter()
+        output = options["output"]
+        if output == "-":
+            rows = write_bulk_upload(self.stdout, stations, start, end)
+        else:
+            compress = options["gzip"] or output.endswith(".gz")
+            rows = self.write_file(output, stations, start, end, compress)
+        self.stderr.write(
+            "Wrote {} rows to {} in {:.2f} s".format(
+                rows, output, time.perf_counter() - started
+            )
+        )
+
+    def write_file(self, path, stations, start, end, compress):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+        )
+        os.close(fd)
+        try:
+            with (gzip.open if compress else open)(tmp_path, "wt", newline="") as out:
+                rows = write_bulk_upload(out, stations, start, end)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return rows
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.parquet_snapshots import write_parquet_snapshot
+
+"""
+Add new contributions to the Parquet snapshot for analysis (see
+main_app.parquet_snapshots). Run it on a schedule; each run only reads the
+contributions saved since the last one.
+
+Example:
+    python manage.py export_parquet --output-dir /data/crowdhydrology-parquet
+
+    >>> import pandas
+    >>> pandas.read_parquet(
+    ...     "/data/crowdhydrology-parquet/contributions",
+    ...     filters=[("state", "=", "NY"), ("year", ">=", 2020)],
+    ... )
+"""
+
+
+class Command(BaseCommand):
+    help = "Append new contributions to the partitioned Parquet snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output-dir", help="Defaults to settings.PARQUET_DIR.")
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Rewrite the snapshot from every contribution.",
+        )
+
+    def handle(self, *args, **options):
+        manifest = write_parquet_snapshot(options["output_dir"], options["rebuild"])
+        if manifest is None:
+            raise CommandError("Pass --output-dir or set PARQUET_DIR.")
+        for name, added in manifest["added"].items():
+            self.stdout.write(
+                "{}: added {} rows (last id {})".format(
+                    name, added, manifest["tables"][name]["last_id"]
+                )
+            )
+        self.stdout.write(
+            "stations: {} rows".format(manifest["tables"]["stations"]["rows"])
+        )
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.crowdhydrology_website_database import export_station_csvs
+
+"""
+Export every station's dygraph CSV (see main_app.crowdhydrology_website_database).
+
+Stations whose CSV watermark already matches their contribution count and
+newest contribution id are skipped. The contributions of the others are read in
+one scan ordered by station and date_received, and each station's rows are
+handed to a thread pool that writes its file (to a temporary file renamed into
+place) while the scan moves on to the next station.
+
+Example:
+    python manage.py export_station_csvs --output-dir /htdocs/www/crowdhydrology_driver/data --workers 4
+"""
+
+
+class Command(BaseCommand):
+    help = "Write the dygraph CSV of every station whose data changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir", help="Defaults to settings.STATION_CSV_DIR."
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--all", action="store_true", help="Also rewrite unchanged stations."
+        )
+
+    def handle(self, *args, **options):
+        directory = options["output_dir"] or settings.STATION_CSV_DIR
+        if not directory:
+            raise CommandError("Pass --output-dir or set STATION_CSV_DIR.")
+
+        started = time.perf_counter()
+        result = export_station_csvs(directory, options["workers"], options["all"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            "Wrote {} stations ({} unchanged skipped), {} rows in {:.2f} s "
+            "({:.0f} rows/s)".format(
+                len(result["written"]),
+                result["skipped"],
+                result["rows"],
+                elapsed,
+                result["rows"] / elapsed if elapsed else 0,
+            )
+        )
@@ -0,0 +1,264 @@
+import contextlib
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from localflavor.us.us_states import STATE_CHOICES
+from loguru import logger
+
+from main_app.loadtest import (
+    LoadResults,
+    StubGeminiServer,
+    StubMediaServer,
+    find_sample_images,
+    image_content_type,
+    seed_stations,
+    throwaway_database,
+)
+from main_app.models import InvalidSMSContribution, SMSContribution
+from main_app.receive_sms import CONTRIBUTION_EXCEPTION_MESSAGE
+from model.responses import StationIdEnum
+
+"""
+Fire a configurable mix of text and MMS webhook posts at /sms/ and report
+throughput, latency percentiles, error rates and database rows written.
+
+By default the requests go through the Django test client against a throwaway
+SQLite database seeded with one station per known station label, so nothing
+touches the configured database. With --url the posts are sent over HTTP to a
+running server instead; point that server's GEMINI_BASE_URL at the stub LLM
+address printed on startup to keep Gemini out of the loop.
+
+Example:
+    python manage.py loadtest_sms --requests 500 --rate 50 --concurrency 16 \\
+        --mms-ratio 0.2 --llm-latency-ms 1500
+"""
+
+INVALID_BODIES = ["hello", "NY 2.5", "what is this number", "XX1000 abc", "1.5"]
+
+
+class Command(BaseCommand):
+    help = "Load test the /sms/ webhook with synthetic text and MMS contributions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0.0,
+            help="Target requests per second (0 sends as fast as possible).",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--mms-ratio",
+            type=float,
+            default=0.2,
+            help="Fraction of requests that are MMS image contributions.",
+        )
+        parser.add_argument(
+            "--invalid-ratio",
+            type=float,
+            default=0.1,
+            help="Fraction of text requests with an unparseable body.",
+        )
+        parser.add_argument("--contributors", type=int, default=500)
+        parser.add_argument("--llm-latency-ms", type=float, default=1000.0)
+        parser.add_argument("--llm-jitter-ms", type=float, default=250.0)
+        parser.add_argument(
+            "--images-dir",
+            default=os.path.join(settings.BASE_DIR, "Training_Images"),
+            help="Directory of sample images served as MMS media.",
+        )
+        parser.add_argument(
+            "--url",
+            help="Post to a running server (e.g. http://127.0.0.1:8000/sms/) "
+            "instead of the in-process test client.",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["mms_ratio"] <= 1 or not 0 <= options["invalid_ratio"] <= 1:
+            raise CommandError("--mms-ratio and --invalid-ratio must be in [0, 1].")
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        images = []
+        if options["mms_ratio"] > 0:
+            images = find_sample_images(options["images_dir"])
+            if not images:
+                raise CommandError(
+                    "No sample images found in {}; pass --images-dir or use "
+                    "--mms-ratio 0.".format(options["images_dir"])
+                )
+            if not os.path.exists(
+                os.path.join(settings.BASE_DIR, "model", "models", "best.pt")
+            ):
+                self.stderr.write(
+                    "model/models/best.pt is missing; MMS requests will exercise "
+                    "the error path only."
+                )
+
+        station_ids = [station.value for station in StationIdEnum]
+        rng = random.Random(options["seed"])
+        plan = self.build_plan(rng, station_ids, images, options)
+
+        with contextlib.ExitStack() as stack:
+            media = stack.enter_context(StubMediaServer(options["images_dir"]))
+            llm = stack.enter_context(
+                StubGeminiServer(
+                    station_ids,
+                    options["llm_latency_ms"],
+                    options["llm_jitter_ms"],
+                    options["seed"],
+                )
+            )
+            self.stdout.write("Stub media server: " + media.url)
+            self.stdout.write("Stub LLM server:   " + llm.url)
+
+            if options["url"]:
+                send = self.http_sender(options["url"])
+            else:
+                stack.enter_context(throwaway_database())
+                seed_stations(station_ids)
+                setup_test_environment(debug=False)
+                stack.callback(teardown_test_environment)
+                stack.enter_context(
+                    override_settings(
+                        GEMINI_BASE_URL=llm.url, GEMINI_API_KEY="loadtest"
+                    )
+                )
+                send = self.client_sender(reverse("main_app:sms"))
+
+            # The webhook logs and prints for every message; keep the report readable.
+            logger.disable("main_app")
+            stack.callback(logger.enable, "main_app")
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+
+            rows_before = self.count_rows()
+            results, elapsed = self.run(plan, media.url, send, options)
+            rows_after = self.count_rows()
+
+        for line in results.summary_lines(elapsed):
+            self.stdout.write(line)
+        self.stdout.write(
+            "Rows written: SMSContribution={} InvalidSMSContribution={}".format(
+                rows_after[0] - rows_before[0], rows_after[1] - rows_before[1]
+            )
+        )
+
+    def build_plan(self, rng, station_ids, images, options):
+        """Pre-generate every request so the hot loop only sends."""
+        text_station_ids = [
+            station_id
+            for station_id in station_ids
+            if station_id[:2] in dict(STATE_CHOICES)
+        ]
+        phone_numbers = [
+            "+1716{:07d}".format(rng.randrange(10**7))
+            for _ in range(options["contributors"])
+        ]
+
+        plan = []
+        for i in range(options["requests"]):
+            data = {"From": rng.choice(phone_numbers), "SmsSid": "SMloadtest%d" % i}
+            if images and rng.random() < options["mms_ratio"]:
+                image = rng.choice(images)
+                data.update(
+                    NumMedia="1",
+                    MediaUrl0=image.replace(os.sep, "/"),
+                    MediaContentType0=image_content_type(image),
+                )
+                plan.append(("mms", data))
+                continue
+
+            if rng.random() < options["invalid_ratio"]:
+                body = rng.choice(INVALID_BODIES)
+            else:
+                body = "{} {:.2f}".format(
+                    rng.choice(text_station_ids), rng.uniform(0.5, 4.5)
+                )
+            data.update(NumMedia="0", Body=body)
+            plan.append(("text", data))
+        return plan
+
+    def run(self, plan, media_url, send, options):
+        results = LoadResults()
+        counter = itertools.count()
+        counter_lock = threading.Lock()
+        interval = 1 / options["rate"] if options["rate"] > 0 else 0.0
+        start = time.perf_counter()
+
+        def worker():
+            try:
+                while True:
+                    with counter_lock:
+                        i = next(counter)
+                    if i >= len(plan):
+                        return
+                    if interval:
+                        time.sleep(max(0.0, start + i * interval - time.perf_counter()))
+
+                    kind, data = plan[i]
+                    if kind == "mms":
+                        data = dict(data, MediaUrl0=media_url + "/" + data["MediaUrl0"])
+
+                    sent = time.perf_counter()
+                    try:
+                        status, content = send(data)
+                        failed = (
+                            status >= 400 or CONTRIBUTION_EXCEPTION_MESSAGE in content
+                        )
+                    except Exception as e:
+                        status, failed = type(e).__name__, True
+                    results.record(kind, time.perf_counter() - sent, status, failed)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            for future in [pool.submit(worker) for _ in range(options["concurrency"])]:
+                future.result()
+
+        return results, time.perf_counter() - start
+
+    def client_sender(self, path):
+        local = threading.local()
+
+        def send(data):
+            if not hasattr(local, "client"):
+                local.client = Client()
+            response = local.client.post(path, data)
+            return response.status_code, response.content.decode()
+
+        return send
+
+    def http_sender(self, url):
+        local = threading.local()
+
+        def send(data):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            response = local.session.post(url, data=data, timeout=120)
+            return response.status_code, response.text
+
+        return send
+
+    def count_rows(self):
+        return (
+            SMSContribution.objects.count(),
+            InvalidSMSContribution.objects.count(),
+        )
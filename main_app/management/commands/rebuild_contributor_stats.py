@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from main_app.rollups import rebuild_contributor_stats
+
+"""
+Rebuild ContributorStats and ContributorStationCount from contribution history.
+
+Needed once for contributions saved before the tables existed, and after
+contributions are added or deleted outside contribution_database (admin, shell,
+data migrations). The tables are replaced in one transaction.
+
+Example:
+    python manage.py rebuild_contributor_stats
+"""
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-contributor counters from contribution history."
+
+    def handle(self, *args, **options):
+        contributors = rebuild_contributor_stats()
+        self.stdout.write("Rebuilt stats for {} contributors".format(contributors))
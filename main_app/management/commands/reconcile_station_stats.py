@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main_app.models import Station, StationStats
+from main_app.rollups import bump_station_version, compute_station_stats
+
+"""
+Repair drift between StationStats and the raw SMSContribution rows.
+
+Contributions added or deleted outside contribution_database (admin, shell,
+data migrations) bypass the incremental counters; this recomputes each station's
+count and latest reading and rewrites the rows that disagree.
+
+Example:
+    python manage.py reconcile_station_stats --dry-run
+"""
+
+
+class Command(BaseCommand):
+    help = "Recompute StationStats from contributions and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report drift without fixing it."
+        )
+
+    def handle(self, *args, **options):
+        stored = {stats.station_id: stats for stats in StationStats.objects.all()}
+        repaired = 0
+
+        for station_id in Station.objects.values_list("id", flat=True):
+            with transaction.atomic():
+                expected = compute_station_stats(station_id)
+                stats = stored.get(station_id)
+                actual = (
+                    {field: getattr(stats, field) for field in expected}
+                    if stats
+                    else None
+                )
+                if actual == expected:
+                    continue
+
+                repaired += 1
+                self.stdout.write("{}: {} -> {}".format(station_id, actual, expected))
+                if not options["dry_run"]:
+                    StationStats.objects.update_or_create(
+                        station_id=station_id, defaults=expected
+                    )
+                    bump_station_version(station_id)
+
+        self.stdout.write(
+            "{} {} station stats.".format(
+                "Found drift in" if options["dry_run"] else "Repaired", repaired
+            )
+        )
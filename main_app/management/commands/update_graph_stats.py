@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from main_app.graph_stats import rebuild_graph_stats, update_graph_stats
+
+"""
+Fold new contributions into the aggregates behind the stats graphs and CSVs.
+
+Only contributions saved since the last update are read, so this is cheap to
+run periodically (generating the graphs also runs it first). --rebuild
+recomputes the aggregates from every contribution, which is needed after
+contributions are deleted or edited.
+
+Example:
+    python manage.py update_graph_stats
+"""
+
+
+class Command(BaseCommand):
+    help = "Update the graph statistics with contributions saved since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute the statistics from every contribution.",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            folded = rebuild_graph_stats()
+        else:
+            folded = update_graph_stats()
+        self.stdout.write("Folded in {} contributions".format(folded))
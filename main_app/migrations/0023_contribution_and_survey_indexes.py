@@ -0,0 +1,54 @@
+# Generated by Django 5.2.2 on 2026-10-19 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0022_auto_20230120_1454"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="smscontribution",
+            index=models.Index(
+                fields=["station", "date_received"], name="sms_station_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="smscontribution",
+            index=models.Index(fields=["contributor_id"], name="sms_contributor_idx"),
+        ),
+        # The composite index above has station_id as its prefix, so the FK's own
+        # single-column index is redundant.
+        migrations.AlterField(
+            model_name="smscontribution",
+            name="station",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                to="main_app.station",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invalidsmscontribution",
+            index=models.Index(
+                fields=["contributor_id"], name="invalid_sms_contributor_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="surveysent",
+            index=models.Index(
+                fields=["survey_id", "contributor_id", "date_sent"],
+                name="survey_sent_lookup_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="surveyreceived",
+            index=models.Index(
+                fields=["survey_id", "contributor_id"],
+                name="survey_received_lookup_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.2 on 2026-10-19 12:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0023_contribution_and_survey_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StationDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("contributors", models.PositiveIntegerField(default=0)),
+                ("height_count", models.PositiveIntegerField(default=0)),
+                ("height_sum", models.FloatField(default=0)),
+                ("height_min", models.FloatField(blank=True, null=True)),
+                ("height_max", models.FloatField(blank=True, null=True)),
+                ("temperature_count", models.PositiveIntegerField(default=0)),
+                ("temperature_sum", models.FloatField(default=0)),
+                ("temperature_min", models.FloatField(blank=True, null=True)),
+                ("temperature_max", models.FloatField(blank=True, null=True)),
+                (
+                    "station",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="main_app.station",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("station", "day"), name="station_daily_rollup_unique"
+                    )
+                ],
+            },
+        ),
+    ]
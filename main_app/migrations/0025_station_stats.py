@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-19 12:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0024_station_daily_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StationStats",
+            fields=[
+                (
+                    "station",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="main_app.station",
+                    ),
+                ),
+                ("contribution_count", models.PositiveIntegerField(default=0)),
+                ("last_date_received", models.DateTimeField(blank=True, null=True)),
+                ("last_water_height", models.FloatField(blank=True, null=True)),
+                ("last_temperature", models.FloatField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.2 on 2026-10-19 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0025_station_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stationstats",
+            name="modified",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="stationstats",
+            name="version",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.2 on 2026-10-19 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0026_station_stats_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GraphGenerationRun",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("RU", "Running"),
+                            ("OK", "Succeeded"),
+                            ("FA", "Failed"),
+                        ],
+                        default="RU",
+                        max_length=2,
+                    ),
+                ),
+                ("step", models.CharField(blank=True, max_length=100)),
+                ("progress", models.PositiveSmallIntegerField(default=0)),
+                ("started", models.DateTimeField()),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.2 on 2026-10-19 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0028_graph_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContributorStats",
+            fields=[
+                ("contributor_id", models.UUIDField(primary_key=True, serialize=False)),
+                ("contribution_count", models.PositiveIntegerField(default=0)),
+                ("invalid_count", models.PositiveIntegerField(default=0)),
+                ("first_date_received", models.DateTimeField(blank=True, null=True)),
+                ("last_date_received", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["contribution_count"],
+                        name="contributor_stats_count_idx",
+                    )
+                ],
+            },
+        ),
+    ]
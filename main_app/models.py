@@ -78,11 +78,20 @@ class Station(models.Model):
 
 class SMSContribution(models.Model):
     contributor_id = models.UUIDField()
-    station = models.ForeignKey(Station, on_delete=models.PROTECT)
+    # Indexed through the (station, date_received) composite index below.
+    station = models.ForeignKey(Station, on_delete=models.PROTECT, db_index=False)
     water_height = models.FloatField(null=True)
     temperature = models.FloatField(null=True, blank=True, default=None)
     date_received = models.DateTimeField(unique=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["station", "date_received"], name="sms_station_date_idx"
+            ),
+            models.Index(fields=["contributor_id"], name="sms_contributor_idx"),
+        ]
+
     def __str__(self):
         return "{} : w={} t={} ({})".format(
             self.station_id,
@@ -92,11 +101,83 @@ class SMSContribution(models.Model):
         )
 
 
+class StationDailyRollup(models.Model):
+    """
+    Per-station, per-day contribution statistics (days are in TIME_ZONE).
+
+    Kept up to date by main_app.rollups in the same transaction as each saved
+    contribution; rebuild with `manage.py backfill_station_rollups`.
+    """
+
+    station = models.ForeignKey(Station, on_delete=models.CASCADE)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    contributors = models.PositiveIntegerField(default=0)
+    height_count = models.PositiveIntegerField(default=0)
+    height_sum = models.FloatField(default=0)
+    height_min = models.FloatField(null=True, blank=True)
+    height_max = models.FloatField(null=True, blank=True)
+    temperature_count = models.PositiveIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["station", "day"], name="station_daily_rollup_unique"
+            ),
+        ]
+
+    @property
+    def height_mean(self):
+        return self.height_sum / self.height_count if self.height_count else None
+
+    @property
+    def temperature_mean(self):
+        if not self.temperature_count:
+            return None
+        return self.temperature_sum / self.temperature_count
+
+    def __str__(self):
+        return "{} {} : n={}".format(self.station_id, self.day, self.count)
+
+
+class StationStats(models.Model):
+    """
+    Denormalized contribution counter and latest reading for a station.
+
+    Kept up to date by main_app.rollups on each saved contribution; repair drift
+    with `manage.py reconcile_station_stats`. version and modified change
+    whenever the station's data does, and key its cached data responses.
+    """
+
+    station = models.OneToOneField(
+        Station, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    contribution_count = models.PositiveIntegerField(default=0)
+    last_date_received = models.DateTimeField(null=True, blank=True)
+    last_water_height = models.FloatField(null=True, blank=True)
+    last_temperature = models.FloatField(null=True, blank=True)
+    version = models.PositiveBigIntegerField(default=0)
+    modified = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return "{} : n={} last={}".format(
+            self.station_id, self.contribution_count, self.last_date_received
+        )
+
+
 class InvalidSMSContribution(models.Model):
     contributor_id = models.UUIDField()
     message_body = models.CharField(max_length=300)
     date_received = models.DateTimeField(unique=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["contributor_id"], name="invalid_sms_contributor_idx"),
+        ]
+
     def __str__(self):
         return "{} ({})".format(
             self.message_body,
@@ -109,6 +190,15 @@ class SurveySent(models.Model):
     contributor_id = models.UUIDField()
     date_sent = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            # SurveyDistribution.should_send: equality on both ids, range on date.
+            models.Index(
+                fields=["survey_id", "contributor_id", "date_sent"],
+                name="survey_sent_lookup_idx",
+            ),
+        ]
+
     def __str__(self):
         return "sid={} cid={} ({})".format(
             self.survey_id, self.contributor_id, timezone.localtime(self.date_sent)
@@ -121,6 +211,14 @@ class SurveyReceived(models.Model):
     contributor_id = models.UUIDField(null=True, blank=True)
     date_received = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["survey_id", "contributor_id"],
+                name="survey_received_lookup_idx",
+            ),
+        ]
+
     def __str__(self):
         return "sid={} rid={} cid={} ({})".format(
             self.survey_id,
@@ -128,3 +226,114 @@ class SurveyReceived(models.Model):
             self.contributor_id,
             timezone.localtime(self.date_received),
         )
+
+
+class ContributorStats(models.Model):
+    """
+    Per-contributor totals, kept up to date by main_app.rollups on each saved
+    contribution (valid or invalid); rebuild with
+    `manage.py rebuild_contributor_stats`. first and last_date_received are
+    of valid contributions.
+    """
+
+    contributor_id = models.UUIDField(primary_key=True)
+    contribution_count = models.PositiveIntegerField(default=0)
+    invalid_count = models.PositiveIntegerField(default=0)
+    first_date_received = models.DateTimeField(null=True, blank=True)
+    last_date_received = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["contribution_count"], name="contributor_stats_count_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return "{} : n={} invalid={}".format(
+            self.contributor_id, self.contribution_count, self.invalid_count
+        )
+
+
+class ContributorStationCount(models.Model):
+    """
+    Number of contributions per contributor and station. Kept up to date by
+    main_app.rollups alongside ContributorStats.
+    """
+
+    contributor_id = models.UUIDField()
+    station = models.ForeignKey(Station, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["contributor_id", "station"],
+                name="contributor_station_count_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return "{} {} : n={}".format(self.contributor_id, self.station_id, self.count)
+
+
+class StateDailyCount(models.Model):
+    """
+    Number of contributions per state and day (in TIME_ZONE), excluding the
+    arduino contributor, for the contribution dates graph. Folded in
+    incrementally by main_app.graph_stats.
+    """
+
+    state = models.CharField(max_length=2)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["state", "day"], name="state_daily_count_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return "{} {} : n={}".format(self.state, self.day, self.count)
+
+
+class GraphStatsWatermark(models.Model):
+    """
+    The newest SMSContribution folded into the graph stats tables. There is a
+    single row.
+    """
+
+    last_contribution_id = models.PositiveBigIntegerField(default=0)
+    last_date_received = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return "id={} ({})".format(self.last_contribution_id, self.updated)
+
+
+class GraphGenerationRun(models.Model):
+    """
+    A run of the stats graph and CSV generation job (main_app.graph_jobs).
+
+    step and progress (a percentage) are updated while the run is going; the
+    latest finished run is what the index page reports.
+    """
+
+    STATUS_CHOICES = (
+        ("RU", "Running"),
+        ("OK", "Succeeded"),
+        ("FA", "Failed"),
+    )
+    status = models.CharField(max_length=2, choices=STATUS_CHOICES, default="RU")
+    step = models.CharField(max_length=100, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    started = models.DateTimeField()
+    finished = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return "{} ({})".format(
+            self.get_status_display(), timezone.localtime(self.started)
+        )
@@ -0,0 +1,344 @@
+import contextlib
+import json
+import os
+import re
+import shutil
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from main_app.fileio import locked, write_atomic
+from main_app.models import InvalidSMSContribution, SMSContribution, Station
+
+"""
+Parquet snapshots of the contribution history for analysis.
+
+write_parquet_snapshot writes a hive partitioned dataset per table to
+settings.PARQUET_DIR (or the directory given):
+
+    contributions/state=NY/year=2020/part-<first id>-<last id>.parquet
+    invalid_contributions/year=2020/part-<first id>-<last id>.parquet
+    stations/stations.parquet
+
+so pandas.read_parquet, pyarrow.dataset or Spark can read a whole table, or
+just the states and years they filter on, without querying the site's
+database. Years are UTC years of date_received; invalid contributions have no
+station, so they are only partitioned by year.
+
+_snapshot.json records the newest id written of each table, and each run only
+reads rows past it and adds one part file to each partition they fall in, with
+a row group per ROW_GROUP_SIZE rows. Once a partition has MAX_PARTS part files
+they are merged into one. Like main_app.graph_stats, this assumes contributions
+are append only; after deleting or editing some, rebuild the snapshot. The
+stations table is small and is rewritten on each run.
+
+Part files are renamed into place when complete, then _snapshot.json is
+written, and only then are partitions compacted. A run that dies in between
+leaves parts holding ids past the recorded ones, or parts already merged into
+another, which the next run removes before writing.
+"""
+
+MANIFEST_NAME = "_snapshot.json"
+ROW_GROUP_SIZE = 100000
+CHUNK_SIZE = 5000
+MAX_PARTS = 16
+COMPRESSION = "zstd"
+PART_NAME = re.compile(r"^part-(\d+)-(\d+)\.parquet$")
+
+UTC_TIMESTAMP = pa.timestamp("us", tz="UTC")
+CONTRIBUTION_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("contributor_id", pa.string()),
+        ("station_id", pa.string()),
+        ("water_height", pa.float64()),
+        ("temperature", pa.float64()),
+        ("date_received", UTC_TIMESTAMP),
+    ]
+)
+INVALID_CONTRIBUTION_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("contributor_id", pa.string()),
+        ("message_body", pa.string()),
+        ("date_received", UTC_TIMESTAMP),
+    ]
+)
+STATION_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("state", pa.string()),
+        ("loc_latitude", pa.float64()),
+        ("loc_longitude", pa.float64()),
+        ("upper_bound", pa.float64()),
+        ("lower_bound", pa.float64()),
+        ("water_body_type", pa.string()),
+        ("status", pa.string()),
+        ("date_added", pa.date32()),
+    ]
+)
+
+
+def _parquet_dir() -> Optional[str]:
+    return getattr(settings, "PARQUET_DIR", None)
+
+
+def read_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _parts(partition_dir: str) -> list:
+    """(first id, last id, path) of the partition's part files."""
+    parts = []
+    for entry in os.scandir(partition_dir):
+        match = PART_NAME.match(entry.name)
+        if match:
+            parts.append((int(match[1]), int(match[2]), entry.path))
+    return sorted(parts)
+
+
+def _partition_dirs(table_dir: str):
+    for root, _, filenames in os.walk(table_dir):
+        if any(PART_NAME.match(filename) for filename in filenames):
+            yield root
+
+
+def _remove_unrecorded(table_dir: str, last_id: int):
+    """Remove what an interrupted run left in a table's directory."""
+    for root, _, filenames in os.walk(table_dir):
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                os.unlink(os.path.join(root, filename))
+    for partition_dir in list(_partition_dirs(table_dir)):
+        parts = _parts(partition_dir)
+        for first, last, path in parts:
+            superseded = any(
+                (other_first, other_last) != (first, last)
+                and other_first <= first
+                and last <= other_last
+                for other_first, other_last, _ in parts
+            )
+            if last > last_id or superseded:
+                os.unlink(path)
+
+
+class _PartitionWriter:
+    """
+    Writes the rows of one run to a new part file in each partition they
+    belong to, flushing a row group whenever a partition buffers
+    ROW_GROUP_SIZE rows.
+    """
+
+    def __init__(self, table_dir: str, schema: pa.Schema, first_id: int):
+        self.table_dir = table_dir
+        self.schema = schema
+        self.first_id = first_id
+        self.buffers = {}
+        self.writers = {}
+        self.last_ids = {}
+
+    def add(self, partition: str, row: tuple):
+        buffer = self.buffers.setdefault(partition, [])
+        buffer.append(row)
+        self.last_ids[partition] = row[0]
+        if len(buffer) >= ROW_GROUP_SIZE:
+            self._flush(partition)
+
+    def _flush(self, partition: str):
+        rows = self.buffers.pop(partition, None)
+        if not rows:
+            return
+        if partition not in self.writers:
+            partition_dir = os.path.join(self.table_dir, partition)
+            os.makedirs(partition_dir, exist_ok=True)
+            path = os.path.join(partition_dir, "{}.tmp".format(self.first_id))
+            self.writers[partition] = pq.ParquetWriter(
+                path, self.schema, compression=COMPRESSION
+            )
+        columns = zip(*rows)
+        self.writers[partition].write_table(
+            pa.Table.from_arrays(
+                [
+                    pa.array(column, field.type)
+                    for column, field in zip(columns, self.schema)
+                ],
+                schema=self.schema,
+            ),
+            row_group_size=ROW_GROUP_SIZE,
+        )
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.close()
+            os.unlink(writer.where)
+
+    def close(self) -> list:
+        """Finish the part files and return the partitions written to."""
+        for partition in list(self.buffers):
+            self._flush(partition)
+        for partition, writer in self.writers.items():
+            writer.close()
+            partition_dir = os.path.join(self.table_dir, partition)
+            os.replace(
+                writer.where,
+                os.path.join(
+                    partition_dir,
+                    "part-{}-{}.parquet".format(
+                        self.first_id, self.last_ids[partition]
+                    ),
+                ),
+            )
+        return list(self.writers)
+
+
+def _compact(partition_dir: str, schema: pa.Schema):
+    """Merge a partition's part files into one once it has MAX_PARTS of them."""
+    parts = _parts(partition_dir)
+    if len(parts) < MAX_PARTS:
+        return
+    tmp_path = os.path.join(partition_dir, "compact.tmp")
+    with pq.ParquetWriter(tmp_path, schema, compression=COMPRESSION) as writer:
+        for _, _, path in parts:
+            parquet_file = pq.ParquetFile(path)
+            for group in range(parquet_file.num_row_groups):
+                writer.write_table(parquet_file.read_row_group(group))
+    os.replace(
+        tmp_path,
+        os.path.join(
+            partition_dir, "part-{}-{}.parquet".format(parts[0][0], parts[-1][1])
+        ),
+    )
+    for _, _, path in parts:
+        os.unlink(path)
+
+
+def _append_table(directory, name, schema, queryset, fields, partition_of, last_id):
+    """
+    Add the rows of queryset with ids past last_id to the table's dataset;
+    return the new last id, the number of rows added and the partition
+    directories written to.
+    """
+    table_dir = os.path.join(directory, name)
+    os.makedirs(table_dir, exist_ok=True)
+    _remove_unrecorded(table_dir, last_id)
+
+    new = queryset.filter(id__gt=last_id)
+    newest = new.aggregate(newest=Max("id"))["newest"]
+    if newest is None:
+        return last_id, 0, []
+
+    writer = _PartitionWriter(table_dir, schema, last_id + 1)
+    count = 0
+    rows = new.filter(id__lte=newest).order_by("id").values_list(*fields)
+    try:
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            partition, row = partition_of(row)
+            writer.add(partition, row)
+            count += 1
+    except BaseException:
+        writer.abort()
+        raise
+    partitions = [os.path.join(table_dir, partition) for partition in writer.close()]
+    return newest, count, partitions
+
+
+def _contribution_partition(row):
+    id, contributor_id, station_id, water_height, temperature, date, state = row
+    return (
+        os.path.join("state={}".format(state), "year={}".format(date.year)),
+        (id, str(contributor_id), station_id, water_height, temperature, date),
+    )
+
+
+def _invalid_contribution_partition(row):
+    id, contributor_id, message_body, date = row
+    return (
+        "year={}".format(date.year),
+        (id, str(contributor_id), message_body, date),
+    )
+
+
+def _write_stations(directory: str):
+    rows = Station.objects.order_by("id").values_list(*STATION_SCHEMA.names)
+    columns = list(zip(*rows)) or [[] for _ in STATION_SCHEMA]
+    table = pa.Table.from_arrays(
+        [
+            pa.array([float(value) for value in column], field.type)
+            if field.name.startswith("loc_")
+            else pa.array(column, field.type)
+            for column, field in zip(columns, STATION_SCHEMA)
+        ],
+        schema=STATION_SCHEMA,
+    )
+    table_dir = os.path.join(directory, "stations")
+    os.makedirs(table_dir, exist_ok=True)
+    tmp_path = os.path.join(table_dir, "stations.tmp")
+    pq.write_table(table, tmp_path, compression=COMPRESSION)
+    os.replace(tmp_path, os.path.join(table_dir, "stations.parquet"))
+    return table.num_rows
+
+
+def write_parquet_snapshot(
+    directory: Optional[str] = None, rebuild: bool = False
+) -> Optional[dict]:
+    """
+    Add the contributions saved since the last snapshot to the Parquet datasets
+    in directory (settings.PARQUET_DIR by default), or write them from scratch
+    with rebuild, and return the manifest, or None if no directory is set.
+    """
+    directory = directory or _parquet_dir()
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+
+    with locked(directory):
+        if rebuild:
+            for name in ("contributions", "invalid_contributions"):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(os.path.join(directory, MANIFEST_NAME))
+        manifest = read_manifest(directory)
+        tables = manifest.get("tables", {})
+        added = {}
+        written = []
+        for name, schema, queryset, fields, partition_of in (
+            (
+                "contributions",
+                CONTRIBUTION_SCHEMA,
+                SMSContribution.objects.all(),
+                CONTRIBUTION_SCHEMA.names + ["station__state"],
+                _contribution_partition,
+            ),
+            (
+                "invalid_contributions",
+                INVALID_CONTRIBUTION_SCHEMA,
+                InvalidSMSContribution.objects.all(),
+                INVALID_CONTRIBUTION_SCHEMA.names,
+                _invalid_contribution_partition,
+            ),
+        ):
+            last_id = tables.get(name, {}).get("last_id", 0)
+            last_id, added[name], partitions = _append_table(
+                directory, name, schema, queryset, fields, partition_of, last_id
+            )
+            tables[name] = {"last_id": last_id}
+            written.extend((partition, schema) for partition in partitions)
+
+        tables["stations"] = {"rows": _write_stations(directory)}
+        manifest = {"tables": tables, "updated": timezone.now().isoformat()}
+        write_atomic(
+            os.path.join(directory, MANIFEST_NAME), json.dumps(manifest).encode()
+        )
+        # Only merge parts once the manifest records every id in them.
+        for partition_dir, schema in written:
+            _compact(partition_dir, schema)
+    return dict(manifest, added=added)
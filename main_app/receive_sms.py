@@ -149,7 +149,10 @@ def incoming_sms(request):
             logger.info("Extracting Gauge and Station Label Values.")
 
             # Extract reading values.
-            llm_client = GeminiClient(secret_key=settings.GEMINI_API_KEY)
+            llm_client = GeminiClient(
+                secret_key=settings.GEMINI_API_KEY,
+                base_url=settings.GEMINI_BASE_URL,
+            )
 
             logger.warning(
                 "Extracting gauge and station label reading from the image..."
@@ -253,8 +256,6 @@ def incoming_sms(request):
     database.save_contribution(
         is_valid, station_id, water_height, temperature, phone_number, message_body
     )
-    # if is_valid:
-    #     website_database.save_contributions_to_csv(station_id)
 
     # TODO: send sms asynchronously.
     return HttpResponse(str(resp), content_type="application/xml")
@@ -0,0 +1,99 @@
+import hashlib
+import json
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from main_app import formats
+from main_app.models import Station
+
+"""
+Versioned cache and HTTP validators for station data responses.
+
+Every change to a station's contributions bumps StationStats.version (see
+main_app.rollups), so a response can be identified by the station, its version
+and the request's parameters, format and encoding. That identity is both the
+cache key and the ETag: a repeat poll costs one version lookup and is answered
+with 304 Not Modified or the cached body, and entries for old versions are
+simply never read again. Stations without a StationStats row have only seen
+bulk loads that don't bump versions, so their responses are not cached.
+"""
+
+CACHE_ALIAS = "station_data"
+
+
+def station_version(station_id: str):
+    """
+    Return (version, modified) for an existing station, or None if there is no
+    such station. version is None when the station has no StationStats row.
+    """
+    return (
+        Station.objects.filter(id=station_id)
+        .values_list("stats__version", "stats__modified")
+        .first()
+    )
+
+
+class StationResponseCache:
+    """Cache entry and validators of one station data request."""
+
+    def __init__(self, request, station_id: str, version, modified, wire_format):
+        self.request = request
+        self.modified = modified
+        params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+        encoding = formats.response_encoding(request, wire_format)
+        digest = hashlib.sha1(
+            json.dumps([params, wire_format.name, encoding]).encode()
+        ).hexdigest()[:20]
+        self.key = "{}:{}:{}".format(station_id, version, digest)
+        self.etag = '"{}-{}"'.format(version, digest)
+
+    def _last_modified(self) -> Optional[int]:
+        return int(self.modified.timestamp()) if self.modified else None
+
+    def _add_validators(self, response):
+        response["ETag"] = self.etag
+        if self.modified:
+            response["Last-Modified"] = http_date(self._last_modified())
+        # Clients may keep the response but must revalidate before reusing it.
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def not_modified(self) -> Optional[HttpResponse]:
+        """A 304 response if the client's copy is current, else None."""
+        response = get_conditional_response(
+            self.request, etag=self.etag, last_modified=self._last_modified()
+        )
+        return self._add_validators(response) if response is not None else None
+
+    def cached(self) -> Optional[HttpResponse]:
+        entry = caches[CACHE_ALIAS].get(self.key)
+        if entry is None:
+            return None
+        headers, body = entry
+        return HttpResponse(body, headers=headers)
+
+    def store(self, response):
+        """Add validators and cache the body once it has streamed in full."""
+        self._add_validators(response)
+        response.streaming_content = self._tee(
+            response.streaming_content, dict(response.items())
+        )
+        return response
+
+    def _tee(self, chunks, headers):
+        body, size = [], 0
+        for chunk in chunks:
+            if body is not None:
+                size += len(chunk)
+                if size > settings.STATION_DATA_CACHE_MAX_BYTES:
+                    body = None
+                else:
+                    body.append(chunk)
+            yield chunk
+        if body is not None:
+            caches[CACHE_ALIAS].set(self.key, (headers, b"".join(body)))
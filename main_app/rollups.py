@@ -0,0 +1,369 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
+from django.utils import timezone
+
+from main_app.models import (
+    ContributorStationCount,
+    ContributorStats,
+    InvalidSMSContribution,
+    SMSContribution,
+    StationDailyRollup,
+    StationStats,
+)
+
+"""
+Incremental maintenance of the tables derived from SMSContribution.
+
+record_contribution folds one newly saved contribution into its station's
+StationDailyRollup for that day, its StationStats row and its contributor's
+ContributorStats and ContributorStationCount rows, each with a single UPDATE of
+F() expressions so concurrent saves never lose counts. Contributions edited or
+deleted afterwards (e.g. in the admin) have the rows they were counted in
+recounted by recount_contribution. The rebuild_* functions recompute the same
+rows from the raw contributions. Every change bumps StationStats.version,
+which invalidates cached data responses.
+"""
+
+
+def local_day_bounds(day: datetime.date):
+    """Return the aware [start, end) datetimes of a day in the current timezone."""
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(day, datetime.time.min, tzinfo=tz)
+    end = datetime.datetime.combine(
+        day + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz
+    )
+    return start, end
+
+
+def _fold(field, value, func):
+    # Least/Greatest are NULL if either side is, so seed empty min/max with value.
+    return Coalesce(func(F(field), Value(value)), Value(value))
+
+
+def _update_or_create(queryset, updates, **create_kwargs):
+    """UPDATE the matching row, or create it if this is the first one."""
+    if queryset.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            queryset.model.objects.create(**create_kwargs)
+    except IntegrityError:
+        # A concurrent save created the row first; add to it instead.
+        queryset.update(**updates)
+
+
+def record_contribution(contribution: SMSContribution):
+    """Fold a just-saved contribution into the derived tables."""
+    record_daily_rollup(contribution)
+    record_station_stats(contribution)
+    record_contributor_stats(contribution)
+
+
+def record_daily_rollup(contribution: SMSContribution):
+    day = timezone.localtime(contribution.date_received).date()
+    start, end = local_day_bounds(day)
+    is_new_contributor = (
+        not SMSContribution.objects.filter(
+            station_id=contribution.station_id,
+            date_received__gte=start,
+            date_received__lt=end,
+            contributor_id=contribution.contributor_id,
+        )
+        .exclude(pk=contribution.pk)
+        .exists()
+    )
+
+    updates = {
+        "count": F("count") + 1,
+        "contributors": F("contributors") + int(is_new_contributor),
+    }
+    height, temperature = contribution.water_height, contribution.temperature
+    if height is not None:
+        updates.update(
+            height_count=F("height_count") + 1,
+            height_sum=F("height_sum") + height,
+            height_min=_fold("height_min", height, Least),
+            height_max=_fold("height_max", height, Greatest),
+        )
+    if temperature is not None:
+        updates.update(
+            temperature_count=F("temperature_count") + 1,
+            temperature_sum=F("temperature_sum") + temperature,
+            temperature_min=_fold("temperature_min", temperature, Least),
+            temperature_max=_fold("temperature_max", temperature, Greatest),
+        )
+
+    _update_or_create(
+        StationDailyRollup.objects.filter(station_id=contribution.station_id, day=day),
+        updates,
+        station_id=contribution.station_id,
+        day=day,
+        count=1,
+        contributors=1,
+        height_count=int(height is not None),
+        height_sum=height or 0,
+        height_min=height,
+        height_max=height,
+        temperature_count=int(temperature is not None),
+        temperature_sum=temperature or 0,
+        temperature_min=temperature,
+        temperature_max=temperature,
+    )
+
+
+def record_station_stats(contribution: SMSContribution):
+    is_latest = Q(last_date_received__isnull=True) | Q(
+        last_date_received__lt=contribution.date_received
+    )
+
+    def latest(field, value):
+        return Case(
+            When(is_latest, then=Value(value)),
+            default=F(field),
+            output_field=StationStats._meta.get_field(field),
+        )
+
+    now = timezone.now()
+    _update_or_create(
+        StationStats.objects.filter(station_id=contribution.station_id),
+        {
+            "contribution_count": F("contribution_count") + 1,
+            "version": F("version") + 1,
+            "modified": Value(now),
+            # Evaluated against the pre-update row, so all three move together.
+            "last_date_received": latest(
+                "last_date_received", contribution.date_received
+            ),
+            "last_water_height": latest("last_water_height", contribution.water_height),
+            "last_temperature": latest("last_temperature", contribution.temperature),
+        },
+        station_id=contribution.station_id,
+        contribution_count=1,
+        last_date_received=contribution.date_received,
+        last_water_height=contribution.water_height,
+        last_temperature=contribution.temperature,
+        version=1,
+        modified=now,
+    )
+
+
+def record_contributor_stats(contribution: SMSContribution):
+    date = contribution.date_received
+    _update_or_create(
+        ContributorStats.objects.filter(contributor_id=contribution.contributor_id),
+        {
+            "contribution_count": F("contribution_count") + 1,
+            "first_date_received": _fold("first_date_received", date, Least),
+            "last_date_received": _fold("last_date_received", date, Greatest),
+        },
+        contributor_id=contribution.contributor_id,
+        contribution_count=1,
+        first_date_received=date,
+        last_date_received=date,
+    )
+    _update_or_create(
+        ContributorStationCount.objects.filter(
+            contributor_id=contribution.contributor_id,
+            station_id=contribution.station_id,
+        ),
+        {"count": F("count") + 1},
+        contributor_id=contribution.contributor_id,
+        station_id=contribution.station_id,
+        count=1,
+    )
+
+
+def record_invalid_contribution(contribution: InvalidSMSContribution):
+    _update_or_create(
+        ContributorStats.objects.filter(contributor_id=contribution.contributor_id),
+        {"invalid_count": F("invalid_count") + 1},
+        contributor_id=contribution.contributor_id,
+        invalid_count=1,
+    )
+
+
+def bump_station_version(station_id: str):
+    """
+    Mark a station's data as changed outside record_contribution. Stations
+    without a StationStats row have no cached responses to invalidate.
+    """
+    StationStats.objects.filter(station_id=station_id).update(
+        version=F("version") + 1, modified=timezone.now()
+    )
+
+
+def _counted_under(contribution: SMSContribution) -> tuple:
+    """The (station, day, contributor) rows a contribution is counted in."""
+    day = timezone.localtime(contribution.date_received).date()
+    return contribution.station_id, day, contribution.contributor_id
+
+
+def contribution_changing(sender, instance, **kwargs):
+    """
+    pre_save receiver for SMSContribution: remember the rows an edited
+    contribution was counted in, in case the edit moves it out of them.
+    """
+    if instance._state.adding:
+        return
+    previous = SMSContribution.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._counted_under = _counted_under(previous)
+
+
+def contribution_changed(sender, instance, **kwargs):
+    """
+    post_save / post_delete receiver for SMSContribution. Contributions edited
+    or deleted (e.g. in the admin) don't go through record_contribution, so
+    the rows they were and are counted in are recounted from the raw
+    contributions, and their stations' versions are bumped once the change
+    commits. New ones are left to record_contribution.
+    """
+    if kwargs.get("created"):
+        return
+    counted_under = {_counted_under(instance)}
+    previous = instance.__dict__.pop("_counted_under", None)
+    if previous:
+        counted_under.add(previous)
+    for station_id, day, contributor_id in counted_under:
+        recount_contribution(station_id, day, contributor_id)
+
+    station_ids = {station_id for station_id, _, _ in counted_under}
+    transaction.on_commit(
+        lambda: [bump_station_version(station_id) for station_id in station_ids]
+    )
+
+
+def _rollup_aggregates() -> dict:
+    return {
+        "count": Count("id"),
+        "contributors": Count("contributor_id", distinct=True),
+        "height_count": Count("water_height"),
+        "height_sum": Coalesce(Sum("water_height"), 0.0),
+        "height_min": Min("water_height"),
+        "height_max": Max("water_height"),
+        "temperature_count": Count("temperature"),
+        "temperature_sum": Coalesce(Sum("temperature"), 0.0),
+        "temperature_min": Min("temperature"),
+        "temperature_max": Max("temperature"),
+    }
+
+
+def recount_contribution(station_id: str, day: datetime.date, contributor_id):
+    """
+    Recompute the station's rollup for day, its StationStats and the
+    contributor's ContributorStats and ContributorStationCount rows from the
+    raw contributions, after one of them was edited or deleted.
+    """
+    start, end = local_day_bounds(day)
+    rollup = SMSContribution.objects.filter(
+        station_id=station_id, date_received__gte=start, date_received__lt=end
+    ).aggregate(**_rollup_aggregates())
+    if rollup["count"]:
+        StationDailyRollup.objects.update_or_create(
+            station_id=station_id, day=day, defaults=rollup
+        )
+    else:
+        StationDailyRollup.objects.filter(station_id=station_id, day=day).delete()
+
+    StationStats.objects.filter(station_id=station_id).update(
+        **compute_station_stats(station_id)
+    )
+
+    ContributorStats.objects.filter(contributor_id=contributor_id).update(
+        **SMSContribution.objects.filter(contributor_id=contributor_id).aggregate(
+            contribution_count=Count("id"),
+            first_date_received=Min("date_received"),
+            last_date_received=Max("date_received"),
+        )
+    )
+    count = SMSContribution.objects.filter(
+        contributor_id=contributor_id, station_id=station_id
+    ).count()
+    station_count = ContributorStationCount.objects.filter(
+        contributor_id=contributor_id, station_id=station_id
+    )
+    if count:
+        _update_or_create(
+            station_count,
+            {"count": count},
+            contributor_id=contributor_id,
+            station_id=station_id,
+            count=count,
+        )
+    else:
+        station_count.delete()
+
+
+def rebuild_station_rollups(station_id: str) -> int:
+    """Replace a station's rollups with ones computed from its contributions."""
+    days = (
+        SMSContribution.objects.filter(station_id=station_id)
+        .annotate(day=TruncDate("date_received"))
+        .values("day")
+        .annotate(**_rollup_aggregates())
+        .order_by("day")
+    )
+
+    with transaction.atomic():
+        StationDailyRollup.objects.filter(station_id=station_id).delete()
+        rollups = StationDailyRollup.objects.bulk_create(
+            StationDailyRollup(station_id=station_id, **day) for day in days
+        )
+        bump_station_version(station_id)
+    return len(rollups)
+
+
+def compute_station_stats(station_id: str) -> dict:
+    """Station stats as recomputed from the raw contributions."""
+    contributions = SMSContribution.objects.filter(station_id=station_id)
+    latest = (
+        contributions.order_by("-date_received")
+        .values("date_received", "water_height", "temperature")
+        .first()
+    ) or {}
+    return {
+        "contribution_count": contributions.count(),
+        "last_date_received": latest.get("date_received"),
+        "last_water_height": latest.get("water_height"),
+        "last_temperature": latest.get("temperature"),
+    }
+
+
+def rebuild_contributor_stats() -> int:
+    """
+    Replace ContributorStats and ContributorStationCount with rows computed
+    from the raw contributions, and return the number of contributors.
+    """
+    with transaction.atomic():
+        stats = {
+            row["contributor_id"]: ContributorStats(**row)
+            for row in SMSContribution.objects.values("contributor_id").annotate(
+                contribution_count=Count("id"),
+                first_date_received=Min("date_received"),
+                last_date_received=Max("date_received"),
+            )
+        }
+        invalid_counts = InvalidSMSContribution.objects.values_list(
+            "contributor_id"
+        ).annotate(Count("id"))
+        for contributor_id, invalid_count in invalid_counts:
+            stats.setdefault(
+                contributor_id, ContributorStats(contributor_id=contributor_id)
+            ).invalid_count = invalid_count
+
+        ContributorStats.objects.all().delete()
+        ContributorStationCount.objects.all().delete()
+        ContributorStats.objects.bulk_create(stats.values(), batch_size=500)
+        ContributorStationCount.objects.bulk_create(
+            (
+                ContributorStationCount(**row)
+                for row in SMSContribution.objects.values(
+                    "contributor_id", "station_id"
+                ).annotate(count=Count("id"))
+            ),
+            batch_size=500,
+        )
+    return len(stats)
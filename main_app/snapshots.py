@@ -0,0 +1,183 @@
+import contextlib
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from loguru import logger
+
+from main_app.downloads import precompress
+from main_app.fileio import locked, write_atomic
+from main_app.models import Station
+
+"""
+Station summary GeoJSON snapshot for map clients.
+
+The snapshot is a FeatureCollection with one Point feature per station carrying
+its status, water body type and latest reading (from StationStats). It is
+written to settings.STATION_SNAPSHOT_DIR as stations.<content hash>.geojson
+plus a .gz variant, so the web server can serve it as an immutable static file,
+and stations.json names the current one:
+
+    {"url": "/static/snapshots/stations.<hash>.geojson", "hash": ..., ...}
+
+When a contribution is saved or a station edited, only that station's feature
+is recomputed and merged into the current snapshot. Every file is written to a
+temporary name and renamed into place, so readers never see a partial file.
+"""
+
+SNAPSHOT_NAME = "stations"
+MANIFEST_NAME = "stations.json"
+KEEP_SNAPSHOTS = 2  # Older hashes are kept briefly for clients mid-download
+
+
+def _snapshot_dir() -> Optional[str]:
+    return getattr(settings, "STATION_SNAPSHOT_DIR", None)
+
+
+def _stations(station_ids=None):
+    stations = Station.objects.select_related("stats").order_by("id")
+    if station_ids is not None:
+        stations = stations.filter(id__in=station_ids)
+    return stations
+
+
+def station_feature(station: Station) -> dict:
+    stats = getattr(station, "stats", None)
+    last_date = stats.last_date_received if stats else None
+    return {
+        "type": "Feature",
+        "id": station.id,
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(station.loc_longitude), float(station.loc_latitude)],
+        },
+        "properties": {
+            "name": station.name,
+            "state": station.state,
+            "status": station.status,
+            "water_body_type": station.water_body_type,
+            "upper_bound": station.upper_bound,
+            "lower_bound": station.lower_bound,
+            "contribution_count": stats.contribution_count if stats else 0,
+            "last_date_received": last_date.isoformat() if last_date else None,
+            "last_water_height": stats.last_water_height if stats else None,
+            "last_temperature": stats.last_temperature if stats else None,
+        },
+    }
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_features(directory: str, manifest: Optional[dict]) -> Optional[list]:
+    if not manifest:
+        return None
+    try:
+        with open(os.path.join(directory, manifest["file"])) as fh:
+            return json.load(fh)["features"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_snapshot(station_ids: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """
+    Regenerate the snapshot and return its manifest.
+
+    With station_ids only those stations' features are recomputed (and
+    dropped if the station no longer exists); the rest are taken from the
+    current snapshot. Without, or when there is no current snapshot, every
+    feature is rebuilt. Returns None if STATION_SNAPSHOT_DIR is not set.
+    """
+    directory = _snapshot_dir()
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+
+    with locked(directory):
+        manifest = read_manifest(directory)
+        features = _read_features(directory, manifest)
+        if station_ids is None or features is None:
+            features = [station_feature(station) for station in _stations()]
+        else:
+            station_ids = set(station_ids)
+            features = {
+                feature["id"]: feature
+                for feature in features
+                if feature["id"] not in station_ids
+            }
+            for station in _stations(station_ids):
+                features[station.id] = station_feature(station)
+            features = [features[station_id] for station_id in sorted(features)]
+
+        data = json.dumps(
+            {"type": "FeatureCollection", "features": features},
+            separators=(",", ":"),
+        ).encode()
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        if manifest and manifest.get("hash") == digest:
+            return manifest
+
+        filename = "{}.{}.geojson".format(SNAPSHOT_NAME, digest)
+        path = os.path.join(directory, filename)
+        write_atomic(path, data)
+        precompress(path)
+
+        manifest = {
+            "url": settings.STATIC_URL
+            + os.path.relpath(path, settings.STATIC_DIR).replace(os.sep, "/"),
+            "file": filename,
+            "hash": digest,
+            "stations": len(features),
+            "generated": timezone.now().isoformat(),
+        }
+        write_atomic(
+            os.path.join(directory, MANIFEST_NAME), json.dumps(manifest).encode()
+        )
+        _remove_old_snapshots(directory)
+        return manifest
+
+
+def _remove_old_snapshots(directory: str):
+    snapshots = sorted(
+        (
+            entry
+            for entry in os.scandir(directory)
+            if entry.name.startswith(SNAPSHOT_NAME + ".")
+            and entry.name.endswith(".geojson")
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in snapshots[KEEP_SNAPSHOTS:]:
+        for path in (entry.path, entry.path + ".gz"):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+
+
+def station_changed(station_id: str):
+    """Refresh the station's feature once the current transaction commits."""
+    if _snapshot_dir():
+        transaction.on_commit(lambda: _refresh([station_id]))
+
+
+def _refresh(station_ids):
+    # The change itself is committed; a snapshot failure must not fail the
+    # request that made it. The next change or build_station_snapshot fixes it.
+    try:
+        write_snapshot(station_ids)
+    except Exception:
+        logger.exception("Couldn't refresh the station snapshot for {}", station_ids)
+
+
+def refresh_station_snapshot(sender, instance, **kwargs):
+    """post_save / post_delete receiver for Station."""
+    station_changed(instance.pk)
@@ -0,0 +1,172 @@
+import bisect
+import heapq
+import math
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+from django.db import transaction
+
+from main_app.models import Station
+
+"""
+In-memory spatial index of station locations.
+
+Nearest-station queries use a KD-tree over the stations' positions as unit
+vectors on the sphere: straight-line (chord) distance between unit vectors
+orders points exactly like great-circle distance, with no special cases at the
+poles or the antimeridian. Bounding box queries binary search a latitude-sorted
+list and filter that band by longitude.
+
+station_index() builds the index on first use and caches it per process.
+MainAppConfig connects invalidate_station_index to Station's post_save and
+post_delete, which drops the index when the change commits, and the index is
+also rebuilt after MAX_AGE seconds so changes saved by other worker processes
+show up.
+"""
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_AGE = 300  # seconds
+
+
+class StationPoint(NamedTuple):
+    id: str
+    name: str
+    state: str
+    latitude: float
+    longitude: float
+
+
+def unit_vector(latitude: float, longitude: float):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    )
+
+
+def chord_to_km(chord_squared: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_squared) / 2))
+
+
+class StationIndex:
+    def __init__(self, points: List[StationPoint]):
+        self.points = points
+        self.vectors = [unit_vector(p.latitude, p.longitude) for p in points]
+
+        by_latitude = sorted(range(len(points)), key=lambda i: points[i].latitude)
+        self.latitudes = [points[i].latitude for i in by_latitude]
+        self.by_latitude = [points[i] for i in by_latitude]
+
+        # Implicit KD-tree: node -> (point index, split axis, left, right).
+        self.nodes = []
+        self.root = self._build(list(range(len(points))), 0)
+
+    @classmethod
+    def from_database(cls) -> "StationIndex":
+        return cls(
+            [
+                StationPoint(id, name, state, float(latitude), float(longitude))
+                for id, name, state, latitude, longitude in Station.objects.values_list(
+                    "id", "name", "state", "loc_latitude", "loc_longitude"
+                )
+            ]
+        )
+
+    def _build(self, indices, depth) -> int:
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda i: self.vectors[i][axis])
+        middle = len(indices) // 2
+        node = len(self.nodes)
+        self.nodes.append(None)
+        left = self._build(indices[:middle], depth + 1)
+        right = self._build(indices[middle + 1 :], depth + 1)
+        self.nodes[node] = (indices[middle], axis, left, right)
+        return node
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        radius_km: Optional[float] = None,
+    ):
+        """The k stations closest to a point as (distance_km, StationPoint), closest first."""
+        query = unit_vector(latitude, longitude)
+        limit = math.inf
+        if radius_km is not None:
+            limit = (2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)) ** 2
+        best = []  # Max-heap of (-chord squared, point index)
+
+        def visit(node):
+            if node == -1:
+                return
+            index, axis, left, right = self.nodes[node]
+            vector = self.vectors[index]
+            distance = (
+                (vector[0] - query[0]) ** 2
+                + (vector[1] - query[1]) ** 2
+                + (vector[2] - query[2]) ** 2
+            )
+            if distance <= limit:
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, index))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, index))
+
+            offset = query[axis] - vector[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            visit(near)
+            bound = -best[0][0] if len(best) == k else limit
+            if offset * offset <= bound:
+                visit(far)
+
+        visit(self.root)
+        return [
+            (chord_to_km(-distance), self.points[index])
+            for distance, index in sorted(best, reverse=True)
+        ]
+
+    def within(self, west: float, south: float, east: float, north: float):
+        """
+        Stations inside a bounding box, by latitude. A box with west > east
+        crosses the antimeridian.
+        """
+        start = bisect.bisect_left(self.latitudes, south)
+        end = bisect.bisect_right(self.latitudes, north)
+        band = self.by_latitude[start:end]
+        if west <= east:
+            return [p for p in band if west <= p.longitude <= east]
+        return [p for p in band if p.longitude >= west or p.longitude <= east]
+
+
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def station_index() -> StationIndex:
+    global _index, _built_at
+    index = _index
+    if index is not None and time.monotonic() - _built_at < MAX_AGE:
+        return index
+    with _lock:
+        if _index is None or time.monotonic() - _built_at >= MAX_AGE:
+            _index, _built_at = StationIndex.from_database(), time.monotonic()
+        return _index
+
+
+def _clear_station_index():
+    global _index
+    _index = None
+
+
+def invalidate_station_index(sender=None, **kwargs):
+    """
+    Drop the cached index once the current transaction commits, so no request
+    rebuilds it from the stations as they were before the change.
+    """
+    transaction.on_commit(_clear_station_index)
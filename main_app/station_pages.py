@@ -0,0 +1,189 @@
+import contextlib
+import hashlib
+import json
+import os
+from typing import Optional
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+from plotly.offline import get_plotlyjs
+
+from main_app.charts import plotlyjs_name
+from main_app.crowdhydrology_website_database import (
+    csv_path,
+    export_station_csvs,
+    read_watermark,
+)
+from main_app.downloads import precompress
+from main_app.fileio import locked, write_atomic
+from main_app.models import Station
+
+"""
+Static hydrograph pages for every station, the ones SMS replies link to.
+
+build_station_pages writes to settings.STATION_PAGE_DIR (served as
+crowdhydrology.com/charts/):
+
+    <STATION>_dygraph.html                the page, from main_app/station_chart.html
+    data/<STATION>.<hash>.csv             its readings
+    assets/station_chart.<hash>.js        draws the chart, from main_app/station_chart.js
+    assets/plotly-<version>.min.js
+
+The readings are the station's dygraph CSV from STATION_CSV_DIR (see
+main_app.crowdhydrology_website_database), which build_station_pages first
+brings up to date with export_station_csvs: only stations with new
+contributions are read, in one ordered scan, and written on a thread pool.
+Those CSVs are appended to in place, so each page gets a copy named after its
+content instead.
+
+Data files and assets are named after their content, so the web server or a CDN
+can cache them as immutable; only the pages, whose names are in the SMS replies,
+need revalidating. Every file gets a .gz variant for gzip_static.
+
+pages.json records the CSV watermark each station's data file was copied at, so
+only changed CSVs are copied. Every page is re-rendered, which is cheap, but
+only written when its content changed, e.g. with new data, a station edit or a
+new template. The data file a page used before is kept for pages loaded before
+the change, and removed the next time the data changes.
+"""
+
+MANIFEST_NAME = "pages.json"
+PAGE_NAME = "{}_dygraph.html"
+
+
+def _page_dir() -> str:
+    return settings.STATION_PAGE_DIR
+
+
+def read_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _write(path: str, data: bytes):
+    write_atomic(path, data)
+    precompress(path)
+
+
+def _remove(path: str):
+    for variant in (path, path + ".gz"):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(variant)
+
+
+def _write_assets(directory: str) -> dict:
+    """Write the assets the pages load and return their paths from a page."""
+    os.makedirs(os.path.join(directory, "assets"), exist_ok=True)
+    plotly_path = "assets/" + plotlyjs_name()
+    if not os.path.exists(os.path.join(directory, plotly_path)):
+        _write(os.path.join(directory, plotly_path), get_plotlyjs().encode())
+
+    script = render_to_string("main_app/station_chart.js").encode()
+    script_path = "assets/station_chart.{}.js".format(_digest(script))
+    if not os.path.exists(os.path.join(directory, script_path)):
+        _write(os.path.join(directory, script_path), script)
+    return {"plotly": plotly_path, "script": script_path}
+
+
+def _copy_data(directory: str, csv_dir: str, station_id: str, entry: dict) -> dict:
+    """Point the entry at a content-named copy of the station's current CSV."""
+    source = csv_path(station_id, csv_dir)
+    watermark = read_watermark(source)
+    if watermark is not None and watermark == entry.get("source"):
+        return entry
+    with open(source, "rb") as fh:
+        data = fh.read()
+    data_path = "data/{}.{}.csv".format(station_id, _digest(data))
+    entry = dict(entry, source=watermark)
+    if data_path != entry.get("data"):
+        _write(os.path.join(directory, data_path), data)
+        if entry.get("previous_data"):
+            _remove(os.path.join(directory, entry["previous_data"]))
+        entry["previous_data"] = entry.get("data")
+        entry["data"] = data_path
+    return entry
+
+
+def _write_page(directory: str, station, entry: dict, assets) -> bool:
+    """Write the station's page if it changed and return whether it did."""
+    page = render_to_string(
+        "main_app/station_chart.html",
+        {"station": station, "data_file": entry["data"], "assets": assets},
+    ).encode()
+    page_path = os.path.join(directory, PAGE_NAME.format(station.id))
+    page_hash = _digest(page)
+    if page_hash == entry.get("page_hash") and os.path.exists(page_path):
+        return False
+    _write(page_path, page)
+    entry["page_hash"] = page_hash
+    return True
+
+
+def build_station_pages(
+    directory: Optional[str] = None,
+    csv_dir: Optional[str] = None,
+    workers: int = 4,
+    rebuild: bool = False,
+) -> dict:
+    """
+    Bring the station CSVs in csv_dir (settings.STATION_CSV_DIR, or a csv
+    directory next to the pages, by default) and every station's page and data
+    file in directory (settings.STATION_PAGE_DIR by default) up to date, and
+    return the counts of stations, CSVs, data files and pages written and
+    rows read.
+    """
+    directory = directory or _page_dir()
+    csv_dir = csv_dir or settings.STATION_CSV_DIR or os.path.join(directory, "csv")
+    os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+    exported = export_station_csvs(csv_dir, workers, rebuild)
+
+    with locked(directory):
+        manifest = read_manifest(directory)
+        entries = manifest.get("stations", {})
+        assets = _write_assets(directory)
+
+        built = {}
+        data_written = pages_written = 0
+        for station in Station.objects.order_by("id"):
+            entry = entries.get(station.id, {})
+            # Hold the CSVs still while copying; contributions append to them.
+            with locked(csv_dir):
+                built[station.id] = _copy_data(directory, csv_dir, station.id, entry)
+            data_written += built[station.id].get("data") != entry.get("data")
+            pages_written += _write_page(directory, station, built[station.id], assets)
+
+        for station_id in entries.keys() - built.keys():
+            # The station was deleted.
+            for path in (
+                entries[station_id].get("data"),
+                entries[station_id].get("previous_data"),
+                PAGE_NAME.format(station_id),
+            ):
+                if path:
+                    _remove(os.path.join(directory, path))
+
+        write_atomic(
+            os.path.join(directory, MANIFEST_NAME),
+            json.dumps(
+                {
+                    "assets": assets,
+                    "stations": built,
+                    "updated": timezone.now().isoformat(),
+                }
+            ).encode(),
+        )
+    return {
+        "stations": len(built),
+        "csvs_written": len(exported["written"]),
+        "data_written": data_written,
+        "pages_written": pages_written,
+        "rows": exported["rows"],
+    }
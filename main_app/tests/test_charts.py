@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import plotly.graph_objs as go
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+
+from main_app import charts
+from main_app.views import chart
+
+
+def pie(values):
+    return go.Figure(data=[go.Pie(labels=["1 texts", "2 texts"], values=values)])
+
+
+class TestCharts(TestCase):
+    def setUp(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir)
+        self.chart_dir = os.path.join(static_dir, "charts")
+        settings_override = override_settings(
+            STATIC_DIR=static_dir, CHART_DIR=self.chart_dir
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        plotlyjs = mock.patch.object(charts, "get_plotlyjs", return_value="/* js */")
+        plotlyjs.start()
+        self.addCleanup(plotlyjs.stop)
+
+    def test_renders_only_changed_figures(self):
+        """
+        An unchanged figure is not rendered again; a changed one gets new files
+        """
+        with mock.patch.object(charts.pio, "to_html", wraps=charts.pio.to_html) as html:
+            first = charts.render_chart("pie", pie([3, 1]))
+            self.assertEqual(charts.render_chart("pie", pie([3, 1])), first)
+            self.assertEqual(html.call_count, 1)
+
+            second = charts.render_chart("pie", pie([3, 2]))
+            self.assertEqual(html.call_count, 2)
+        self.assertNotEqual(second["hash"], first["hash"])
+        self.assertEqual(charts.read_manifest(), {"pie": second})
+
+        with open(os.path.join(self.chart_dir, second["html"])) as fh:
+            page = fh.read()
+        self.assertIn('src="{}"'.format(charts.plotlyjs_name()), page)
+        for name in (second["html"], second["json"], charts.plotlyjs_name()):
+            self.assertTrue(os.path.exists(os.path.join(self.chart_dir, name + ".gz")))
+
+        charts.render_chart("pie", pie([3, 3]))
+        self.assertFalse(os.path.exists(os.path.join(self.chart_dir, first["html"])))
+        self.assertTrue(os.path.exists(os.path.join(self.chart_dir, second["html"])))
+
+    def test_chart_view(self):
+        """
+        Rendered files are served inline as immutable; other names are 404
+        """
+        entry = charts.render_chart("pie", pie([3, 1]))
+        factory = RequestFactory()
+
+        response = chart(factory.get("/charts/"), entry["html"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/html")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+        self.assertFalse(
+            response.get("Content-Disposition", "").startswith("attachment")
+        )
+
+        for filename in ("charts.json", "..", "pie.0000000000000000.html"):
+            with self.assertRaises(Http404):
+                chart(factory.get("/charts/"), filename)
@@ -0,0 +1,123 @@
+import csv
+import datetime
+import gzip
+import os
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from main_app.cuahsi import BULK_UPLOAD_HEADER, write_bulk_upload
+from main_app.models import SMSContribution, Station
+from main_app.tests.test_rollups import create_station
+
+
+class TestCuahsiExport(TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        stations = [create_station("NY%04d" % i) for i in range(2)]
+        stations.append(create_station("MI0001"))
+        Station.objects.filter(id="MI0001").update(state="MI")
+        Station.objects.exclude(id="MI0001").update(state="NY")
+        start = datetime.datetime(2020, 1, 1, 12, tzinfo=datetime.timezone.utc)
+        self.contributor_id = uuid.uuid4()
+        SMSContribution.objects.bulk_create(
+            SMSContribution(
+                contributor_id=self.contributor_id,
+                station=stations[i % 3],
+                water_height=i / 2,
+                date_received=start + datetime.timedelta(days=i),
+            )
+            for i in range(9)
+        )
+
+    def export(self, *args):
+        path = os.path.join(self.output_dir, "bulkUpload.csv")
+        call_command("export_cuahsi", path, *args, stderr=StringIO())
+        return path
+
+    def test_rows(self):
+        """Rows repeat the station's site columns and read all stations in two queries"""
+        out = StringIO()
+        with self.assertNumQueries(2):
+            self.assertEqual(write_bulk_upload(out), 9)
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        self.assertEqual(rows[0], BULK_UPLOAD_HEADER)
+        self.assertEqual(
+            [row[2] for row in rows[1:]],
+            ["MI0001"] * 3 + ["NY0000"] * 3 + ["NY0001"] * 3,
+        )
+        self.assertEqual(
+            rows[4],
+            [
+                str(self.contributor_id),
+                "0.0",
+                "NY0000",
+                "NY0000",
+                "0.0",
+                "0.0",
+                "NY",
+                "RI",
+                "1",
+                "NC",
+                "0",
+                "01/01/2020",
+                "01/01/2020",
+            ]
+            + [
+                "SMS from Citizen Scientist",
+                "1",
+                "Hydrology",
+                "Sporadic",
+                "False",
+                "Field Observation",
+                "Surface Water",
+                "Feet",
+                "Gage Height",
+                "1",
+            ],
+        )
+
+    def test_null_water_height(self):
+        """Temperature only contributions without a water height are left out"""
+        SMSContribution.objects.create(
+            contributor_id=self.contributor_id,
+            station_id="NY0000",
+            water_height=None,
+            temperature=12.5,
+            date_received=datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+        out = StringIO()
+        self.assertEqual(write_bulk_upload(out), 9)
+        self.assertNotIn("01/01/2021", out.getvalue())
+
+    def test_filters(self):
+        """Station, state and date filters combine"""
+        with open(
+            self.export(
+                "--state", "ny", "--since", "2020-01-02", "--until", "2020-01-05"
+            )
+        ) as fh:
+            rows = list(csv.reader(fh))
+        self.assertEqual(
+            [(row[2], row[12]) for row in rows[1:]],
+            [
+                ("NY0000", "01/04/2020"),
+                ("NY0001", "01/02/2020"),
+                ("NY0001", "01/05/2020"),
+            ],
+        )
+
+        with open(self.export("--station", "MI0001", "--station", "NY0000")) as fh:
+            self.assertEqual(len(fh.readlines()), 7)
+
+    def test_gzip(self):
+        """--gzip writes a gzipped file and leaves no temporary files behind"""
+        path = self.export("--gzip")
+        with gzip.open(path, "rt") as fh:
+            self.assertEqual(len(fh.readlines()), 10)
+        self.assertEqual(os.listdir(self.output_dir), ["bulkUpload.csv"])
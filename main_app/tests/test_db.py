@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from main_app.db import apply_sqlite_pragmas
+
+
+class TestSQLitePragmas(TestCase):
+    def read_pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA {}".format(name))
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        """
+        New connections run the configured SQLITE_PRAGMAS
+        """
+        self.assertEqual(
+            self.read_pragma("busy_timeout"), settings.SQLITE_PRAGMAS["busy_timeout"]
+        )
+        self.assertEqual(
+            self.read_pragma("cache_size"), settings.SQLITE_PRAGMAS["cache_size"]
+        )
+
+    @override_settings(SQLITE_PRAGMAS={"busy_timeout": 1234})
+    def test_pragmas_follow_settings(self):
+        """
+        apply_sqlite_pragmas reads SQLITE_PRAGMAS at connection time
+        """
+        apply_sqlite_pragmas(sender=None, connection=connection)
+        self.assertEqual(self.read_pragma("busy_timeout"), 1234)
@@ -0,0 +1,136 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from main_app.downloads import precompress
+
+CSV = b"station, contribution_amount\n" + b"".join(
+    b"NY%04d,%d\n" % (i, i) for i in range(1000)
+)
+
+
+class TestDownload(TestCase):
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        os.mkdir(os.path.join(self.static_dir, "stats"))
+        self.file_path = os.path.join(self.static_dir, "stats", "per_station.csv")
+        with open(self.file_path, "wb") as fh:
+            fh.write(CSV)
+
+        settings_override = override_settings(STATIC_DIR=self.static_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create(username="staff")
+        self.client.force_login(user)
+
+    def download(self, path="stats/per_station.csv", **headers):
+        response = self.client.get(
+            reverse("main_app:download"), {"path": path}, headers=headers
+        )
+        body = b"".join(response.streaming_content) if response.streaming else b""
+        return response, body
+
+    def test_streams_whole_file(self):
+        """
+        The file is streamed as an attachment with validators and range support
+        """
+        response, body = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, CSV)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(response["Content-Length"], str(len(CSV)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("per_station.csv", response["Content-Disposition"])
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+    def test_byte_ranges(self):
+        """
+        Single byte ranges are served with 206; unsatisfiable ones with 416
+        """
+        response, body = self.download(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, CSV[10:20])
+        self.assertEqual(response["Content-Range"], "bytes 10-19/{}".format(len(CSV)))
+
+        response, body = self.download(Range="bytes=-5")
+        self.assertEqual(body, CSV[-5:])
+
+        response, body = self.download(Range="bytes=100-")
+        self.assertEqual(body, CSV[100:])
+
+        response, _ = self.download(Range="bytes=999999-")
+        self.assertEqual(response.status_code, 416)
+
+        response, body = self.download(Range="bytes=10-19", If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, CSV)
+
+    def test_conditional_request(self):
+        """
+        A matching If-None-Match is answered with 304
+        """
+        response, _ = self.download()
+        response, _ = self.download(If_None_Match=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_precompressed_variant(self):
+        """
+        Clients accepting gzip get the .gz variant while it is up to date
+        """
+        precompress(self.file_path)
+        response, body = self.download(Accept_Encoding="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), CSV)
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        response, body = self.download()
+        self.assertNotIn("Content-Encoding", response)
+
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, (stat.st_atime, stat.st_mtime + 10))
+        response, body = self.download(Accept_Encoding="gzip")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(body, CSV)
+
+    def test_missing_and_outside_files(self):
+        """
+        Missing files and paths outside STATIC_DIR are not found
+        """
+        self.assertEqual(self.download("stats/missing.csv")[0].status_code, 404)
+        self.assertEqual(self.download("../etc/passwd")[0].status_code, 404)
+        self.assertEqual(self.download("stats")[0].status_code, 404)
+
+    def test_offload(self):
+        """
+        With DOWNLOAD_OFFLOAD set the web server is asked to send the file
+        """
+        with override_settings(
+            DOWNLOAD_OFFLOAD="x-accel-redirect", DOWNLOAD_ACCEL_PREFIX="/internal/"
+        ):
+            response, _ = self.download()
+            self.assertEqual(
+                response["X-Accel-Redirect"], "/internal/stats/per_station.csv"
+            )
+            self.assertEqual(response.content, b"")
+
+        with override_settings(DOWNLOAD_OFFLOAD="x-sendfile"):
+            response, _ = self.download()
+            self.assertEqual(response["X-Sendfile"], self.file_path)
+
+    def test_compress_stats_command(self):
+        """
+        compress_stats writes a .gz variant next to each stats file
+        """
+        call_command("compress_stats", stdout=StringIO())
+        with gzip.open(self.file_path + ".gz") as fh:
+            self.assertEqual(fh.read(), CSV)
@@ -0,0 +1,136 @@
+import datetime
+import json
+import uuid
+from unittest import mock
+
+import numpy as np
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from main_app import downsampling
+from main_app.models import SMSContribution, Station, StationStats
+from main_app.rollups import compute_station_stats, rebuild_station_rollups
+from main_app.views import get_data
+
+
+class TestLTTB(TestCase):
+    def test_lttb_keeps_extremes(self):
+        """
+        LTTB keeps the end points and a spike a plain stride would skip
+        """
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        y[503] = 10
+        keep = downsampling.lttb_indices(x, y, 50)
+        self.assertEqual(len(keep), 50)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(503, keep)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_lttb_short_series_unchanged(self):
+        """
+        Series no longer than the requested points are returned whole
+        """
+        keep = downsampling.lttb_indices(np.arange(5.0), np.arange(5.0), 10)
+        self.assertEqual(list(keep), [0, 1, 2, 3, 4])
+
+
+class TestDownsampledGetData(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.station = Station.objects.create(
+            id="NY9999",
+            name="NY9999",
+            loc_latitude=0,
+            loc_longitude=0,
+            upper_bound=5,
+            lower_bound=0,
+            date_added=timezone.now(),
+        )
+        # Six readings a day, four hours apart, for five days.
+        first = timezone.make_aware(datetime.datetime(2024, 5, 1))
+        SMSContribution.objects.bulk_create(
+            SMSContribution(
+                contributor_id=uuid.uuid4(),
+                station=self.station,
+                water_height=i % 6,
+                temperature=20,
+                date_received=first + datetime.timedelta(hours=4 * i),
+            )
+            for i in range(30)
+        )
+
+    def get(self, **params):
+        response = get_data(
+            self.factory.get("/data/", dict(params, station=self.station.id))
+        )
+        if response.status_code != 200:
+            return response.status_code, None
+        return 200, json.loads(b"".join(response.streaming_content))
+
+    def test_points(self):
+        """
+        points returns at most that many real readings, oldest first
+        """
+        status, data = self.get(points=10)
+        rows = data["contributions"]
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(data["points"], 10)
+        self.assertEqual(rows[0]["date_received"], "2024-05-01T04:00:00Z")
+        dates = [row["date_received"] for row in rows]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_daily_buckets_from_sql_and_rollups(self):
+        """
+        Daily buckets are the same whether computed in SQL or from rollups
+        """
+        params = {"bucket": "1d", "start": "2024-05-02", "end": "2024-05-03"}
+        with mock.patch.object(downsampling, "_daily_rollup_summaries") as rollups:
+            status, from_sql = self.get(**params)
+            rollups.assert_not_called()
+
+        rebuild_station_rollups(self.station.id)
+        stats = compute_station_stats(self.station.id)
+        StationStats.objects.create(station=self.station, **stats)
+        self.assertTrue(downsampling.rollups_complete(self.station.id))
+        status, from_rollups = self.get(**params)
+
+        self.assertEqual(from_sql, from_rollups)
+        self.assertEqual(len(from_sql["buckets"]), 2)
+        bucket = from_sql["buckets"][0]
+        self.assertEqual(bucket["count"], 6)
+        self.assertEqual(bucket["gage_height_min"], 0)
+        self.assertEqual(bucket["gage_height_max"], 5)
+        self.assertEqual(bucket["gage_height_mean"], 2.5)
+
+    def test_daily_buckets_after_delete(self):
+        """
+        Deleted contributions drop out of the rollups daily buckets are read from
+        """
+        rebuild_station_rollups(self.station.id)
+        stats = compute_station_stats(self.station.id)
+        StationStats.objects.create(station=self.station, **stats)
+        SMSContribution.objects.filter(water_height=5).order_by("id").first().delete()
+
+        self.assertTrue(downsampling.rollups_complete(self.station.id))
+        status, data = self.get(bucket="1d", start="2024-05-01", end="2024-05-01")
+        self.assertEqual(data["buckets"][0]["count"], 5)
+        self.assertEqual(data["buckets"][0]["gage_height_max"], 4)
+
+    def test_hourly_buckets(self):
+        """
+        Hourly buckets only include hours with readings
+        """
+        status, data = self.get(bucket="1h", end="2024-05-01")
+        self.assertEqual(len(data["buckets"]), 6)
+        self.assertEqual(data["buckets"][1]["bucket_start"], "2024-05-01T08:00:00Z")
+
+    def test_bad_downsampling_requests(self):
+        """
+        Invalid or conflicting downsampling parameters are rejected
+        """
+        self.assertEqual(self.get(points=2)[0], 400)
+        self.assertEqual(self.get(points="many")[0], 400)
+        self.assertEqual(self.get(bucket="1w")[0], 400)
+        self.assertEqual(self.get(points=10, bucket="1d")[0], 400)
+        self.assertEqual(self.get(points=10, limit=5)[0], 400)
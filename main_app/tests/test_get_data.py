@@ -0,0 +1,259 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import unittest
+import uuid
+from unittest import mock
+
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from main_app.models import SMSContribution, Station
+from main_app.timeseries import TimeSeriesQueryError, select_stations
+from main_app.views import get_bulk_data, get_data
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class StationDataTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.station = Station.objects.create(
+            id="NY9999",
+            name="NY9999",
+            loc_latitude=0,
+            loc_longitude=0,
+            upper_bound=5,
+            lower_bound=0,
+            date_added=timezone.now(),
+        )
+        self.first_day = timezone.make_aware(datetime.datetime(2024, 5, 1, 12))
+        SMSContribution.objects.bulk_create(
+            SMSContribution(
+                contributor_id=uuid.uuid4(),
+                station=self.station,
+                water_height=i / 10,
+                date_received=self.first_day + datetime.timedelta(days=i),
+            )
+            for i in range(10)
+        )
+
+
+class TestGetData(StationDataTestCase):
+    def get(self, **params):
+        response = get_data(self.factory.get("/data/", params))
+        if response.status_code != 200:
+            return response.status_code, None
+        return 200, json.loads(b"".join(response.streaming_content))
+
+    def test_get_data_returns_all_contributions(self):
+        """
+        get_data without filters streams every contribution, oldest first
+        """
+        status, data = self.get(station=self.station.id)
+        self.assertEqual(status, 200)
+        heights = [row["gage_height"] for row in data["contributions"]]
+        self.assertEqual(heights, [i / 10 for i in range(10)])
+        self.assertIsNone(data["next"])
+
+    def test_get_data_date_range(self):
+        """
+        start is inclusive and a bare end date includes that whole day
+        """
+        status, data = self.get(
+            station=self.station.id, start="2024-05-03", end="2024-05-05"
+        )
+        heights = [row["gage_height"] for row in data["contributions"]]
+        self.assertEqual(heights, [0.2, 0.3, 0.4])
+
+    def test_get_data_keyset_pagination(self):
+        """
+        Following next cursors visits every contribution exactly once
+        """
+        heights, cursor = [], None
+        for _ in range(4):
+            params = {"station": self.station.id, "limit": 4}
+            if cursor:
+                params["cursor"] = cursor
+            status, data = self.get(**params)
+            heights += [row["gage_height"] for row in data["contributions"]]
+            cursor = data["next"]
+            if cursor is None:
+                break
+        self.assertEqual(heights, [i / 10 for i in range(10)])
+        self.assertIsNone(cursor)
+
+    def test_get_data_bad_requests(self):
+        """
+        Unknown stations and malformed parameters are rejected with 400
+        """
+        self.assertEqual(self.get(station="NY0000")[0], 400)
+        self.assertEqual(self.get(station=self.station.id, start="May 1")[0], 400)
+        self.assertEqual(self.get(station=self.station.id, limit=0)[0], 400)
+        self.assertEqual(self.get(station=self.station.id, cursor="nope")[0], 400)
+
+
+class TestGetDataFormats(StationDataTestCase):
+    def fetch(self, headers=None, **params):
+        params.setdefault("station", self.station.id)
+        request = self.factory.get("/data/", params, headers=headers or {})
+        response = get_data(request)
+        if not response.streaming:
+            return response, response.content
+        return response, b"".join(response.streaming_content)
+
+    def test_ndjson_and_csv(self):
+        """
+        ndjson and csv carry the same rows as the default JSON format
+        """
+        response, body = self.fetch(format="ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row["gage_height"] for row in rows][:3], [0.0, 0.1, 0.2])
+
+        response, body = self.fetch(headers={"Accept": "text/csv"})
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[1]["gage_height"], "0.1")
+
+    def test_columns_format(self):
+        """
+        The columns format returns parallel arrays plus the next cursor
+        """
+        response, body = self.fetch(format="columns", limit=3)
+        data = json.loads(body)
+        self.assertEqual(data["contributions"]["gage_height"], [0.0, 0.1, 0.2])
+        self.assertEqual(len(data["contributions"]["date_received"]), 3)
+        self.assertEqual(data["next"], response["X-Next-Cursor"])
+
+    def test_gzip_encoding(self):
+        """
+        Text formats are gzip compressed when the client accepts it
+        """
+        response, body = self.fetch(headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(body))["contributions"]), 10)
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_arrow_and_parquet(self):
+        """
+        Arrow IPC and Parquet responses decode to the station's rows
+        """
+        import pyarrow.parquet
+
+        response, body = self.fetch(format="arrow")
+        table = pyarrow.ipc.open_stream(body).read_all()
+        self.assertEqual(table.column("gage_height").to_pylist()[:2], [0.0, 0.1])
+
+        response, body = self.fetch(format="parquet", limit=4)
+        table = pyarrow.parquet.read_table(io.BytesIO(body))
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(str(table.schema.field("date_received").type.tz), "UTC")
+
+    def test_unsupported_format(self):
+        """
+        Unknown formats and unsatisfiable Accept headers get 406
+        """
+        self.assertEqual(self.fetch(format="xml")[0].status_code, 406)
+        self.assertEqual(
+            self.fetch(headers={"Accept": "image/png"})[0].status_code, 406
+        )
+
+
+class TestGetBulkData(StationDataTestCase):
+    def setUp(self):
+        super().setUp()
+        for minutes, station_id, state in [(1, "NY9998", "NY"), (2, "PA9999", "PA")]:
+            station = Station.objects.create(
+                id=station_id,
+                name=station_id,
+                state=state,
+                loc_latitude=0,
+                loc_longitude=0,
+                upper_bound=5,
+                lower_bound=0,
+                date_added=timezone.now(),
+            )
+            SMSContribution.objects.create(
+                contributor_id=uuid.uuid4(),
+                station=station,
+                water_height=1.5,
+                date_received=self.first_day + datetime.timedelta(minutes=minutes),
+            )
+        self.station.state = "NY"
+        self.station.save()
+
+    def get(self, **params):
+        response = get_bulk_data(self.factory.get("/data/bulk/", params))
+        if response.status_code != 200:
+            return response.status_code, None
+        return 200, b"".join(response.streaming_content).decode()
+
+    def test_bulk_data_grouped_by_station(self):
+        """
+        json responses nest each station's contributions under its ID
+        """
+        status, content = self.get(stations="NY9999,PA9999", end="2024-05-02")
+        self.assertEqual(status, 200)
+        data = json.loads(content)
+        self.assertEqual(list(data["stations"]), ["NY9999", "PA9999"])
+        self.assertEqual(
+            [row["gage_height"] for row in data["stations"]["NY9999"]], [0.0, 0.1]
+        )
+        self.assertNotIn("station", data["stations"]["PA9999"][0])
+
+    def test_bulk_data_by_state_and_flat_formats(self):
+        """
+        state selects its stations and flat formats carry a station column
+        """
+        status, content = self.get(state="ny", format="csv", start="2024-05-10")
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row["station"] for row in rows], ["NY9999"])
+
+        status, content = self.get(stations="all", format="columns")
+        data = json.loads(content)
+        self.assertEqual(list(data["stations"]), ["NY9998", "NY9999", "PA9999"])
+        self.assertEqual(len(data["stations"]["NY9999"]["gage_height"]), 10)
+
+    @mock.patch("main_app.timeseries.MAX_BULK_STATIONS", 2)
+    def test_bulk_data_station_pages(self):
+        """
+        Requests cover a bounded number of stations and link to the rest
+        """
+        status, content = self.get(stations="all")
+        data = json.loads(content)
+        self.assertEqual(list(data["stations"]), ["NY9998", "NY9999"])
+        self.assertEqual(data["next"], "NY9999")
+
+        status, content = self.get(stations="all", cursor=data["next"])
+        data = json.loads(content)
+        self.assertEqual(list(data["stations"]), ["PA9999"])
+        self.assertIsNone(data["next"])
+
+    def test_bulk_data_bad_requests(self):
+        """
+        Missing selections and unknown stations are rejected
+        """
+        self.assertEqual(self.get()[0], 400)
+        self.assertEqual(self.get(stations="NY9999,XX0000")[0], 400)
+        self.assertEqual(self.get(stations="all", start="yesterday")[0], 400)
+
+    def test_bulk_data_station_errors(self):
+        """
+        Unknown stations are reported as such, not as outside the state
+        """
+        with self.assertRaisesMessage(TimeSeriesQueryError, "Unknown stations: XX0000"):
+            select_stations({"stations": "NY9999,XX0000", "state": "NY"})
+        with self.assertRaisesMessage(
+            TimeSeriesQueryError, "Stations not in NY: PA9999"
+        ):
+            select_stations({"stations": "NY9999,PA9999", "state": "ny"})
+        self.assertEqual(
+            select_stations({"stations": "NY9998,NY9999", "state": "NY"}),
+            (["NY9998", "NY9999"], None),
+        )
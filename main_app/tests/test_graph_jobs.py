@@ -0,0 +1,118 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main_app import graph_jobs
+from main_app.models import GraphGenerationRun
+
+
+class TestGraphJobs(TransactionTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        lock_file = override_settings(
+            GRAPH_JOB_LOCK_FILE=os.path.join(tmp_dir.name, "graphs.lock")
+        )
+        lock_file.enable()
+        self.addCleanup(lock_file.disable)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def wait_for_job(self):
+        graph_jobs._worker.join(timeout=10)
+        self.assertFalse(graph_jobs._worker.is_alive())
+
+    def blocking_job(self, progress):
+        progress("Counting contributions", 25)
+        self.started.set()
+        self.release.wait(timeout=10)
+
+    def test_single_flight(self):
+        """
+        A start while a job runs attaches to that run instead of starting another
+        """
+        run = graph_jobs.start_generation(self.blocking_job)
+        self.assertEqual(graph_jobs.start_generation(self.blocking_job).id, run.id)
+        self.assertEqual(GraphGenerationRun.objects.count(), 1)
+
+        self.release.set()
+        self.wait_for_job()
+        run.refresh_from_db()
+        self.assertEqual(run.status, graph_jobs.SUCCEEDED)
+        self.assertEqual(run.progress, 100)
+        self.assertIsNotNone(run.finished)
+        self.assertEqual(graph_jobs.last_successful_run(), run)
+
+        # The lock is released, so the next start is a new run.
+        self.release.clear()
+        self.assertNotEqual(graph_jobs.start_generation(self.blocking_job).id, run.id)
+        self.release.set()
+        self.wait_for_job()
+
+    def test_failure_is_recorded(self):
+        """
+        A failing job is recorded with its error and doesn't hold the lock
+        """
+
+        def failing_job(progress):
+            raise ValueError("no legacy database")
+
+        with mock.patch.object(graph_jobs, "logger") as logger:
+            run = graph_jobs.start_generation(failing_job)
+            self.wait_for_job()
+        logger.exception.assert_called_once()
+        run.refresh_from_db()
+        self.assertEqual(run.status, graph_jobs.FAILED)
+        self.assertIn("no legacy database", run.error)
+        self.assertIsNone(graph_jobs.last_successful_run())
+
+    def test_stale_run_is_failed(self):
+        """
+        A run left running by a dead process is reported as failed, not polled forever
+        """
+        stale = GraphGenerationRun.objects.create(
+            started=timezone.now(), step="Counting contributions"
+        )
+        self.assertEqual(graph_jobs.latest_run().status, graph_jobs.FAILED)
+        stale.refresh_from_db()
+        self.assertEqual(stale.error, "Interrupted")
+
+        # A run whose job holds the lock is left alone.
+        run = graph_jobs.start_generation(self.blocking_job)
+        self.started.wait(timeout=10)
+        self.assertEqual(graph_jobs.latest_run().status, graph_jobs.RUNNING)
+        self.assertEqual(graph_jobs.latest_run().id, run.id)
+        self.release.set()
+        self.wait_for_job()
+
+    def test_views(self):
+        """
+        The generate view starts a job and the status view reports its progress
+        """
+        self.client.force_login(User.objects.create(username="admin"))
+        with mock.patch.object(graph_jobs.graphs, "generate", self.blocking_job):
+            url = reverse("main_app:generate-graphs")
+            self.assertEqual(self.client.get(url).status_code, 405)
+            response = self.client.post(url)
+            self.assertRedirects(
+                response, reverse("main_app:index"), fetch_redirect_response=False
+            )
+
+        self.assertTrue(self.started.wait(timeout=10))
+        run = self.client.get(reverse("main_app:graph-status")).json()["run"]
+        self.assertEqual(run["status"], "running")
+        self.assertContains(
+            self.client.get(reverse("main_app:index")),
+            "Generating: Counting contributions (25%)",
+        )
+        self.release.set()
+        self.wait_for_job()
+        run = self.client.get(reverse("main_app:graph-status")).json()["run"]
+        self.assertEqual((run["status"], run["progress"]), ("succeeded", 100))
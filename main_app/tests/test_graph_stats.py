@@ -0,0 +1,107 @@
+import datetime
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from main_app.graph_stats import (
+    ARDUINO_CONTRIBUTOR_ID,
+    contributor_station_counts,
+    contributors_per_total,
+    rebuild_graph_stats,
+    state_daily_counts,
+    update_graph_stats,
+)
+from main_app.graphs import ContributionCounts, fill_state_days
+from main_app.models import GraphStatsWatermark, SMSContribution
+from main_app.rollups import record_contribution
+from main_app.tests.test_rollups import create_station
+
+ALICE = uuid.UUID("00000000-0000-0000-0000-00000000000a")
+BOB = uuid.UUID("00000000-0000-0000-0000-00000000000b")
+
+
+class TestGraphStats(TestCase):
+    def setUp(self):
+        self.ny = create_station("NY9999")
+        self.ny.state = "NY"
+        self.ny.save()
+        self.pa = create_station("PA9999")
+        self.pa.state = "PA"
+        self.pa.save()
+        self.first_day = timezone.make_aware(datetime.datetime(2018, 6, 18, 12))
+        self.minutes = 0
+
+    def contribute(self, contributor_id, station, days=0):
+        self.minutes += 1
+        contribution = SMSContribution.objects.create(
+            contributor_id=contributor_id,
+            station=station,
+            water_height=1.0,
+            date_received=self.first_day
+            + datetime.timedelta(days=days, minutes=self.minutes),
+        )
+        record_contribution(contribution)
+        return contribution
+
+    def test_folds_only_new_contributions(self):
+        """
+        Each update adds the contributions saved since the last one to the counts
+        """
+        self.contribute(ALICE, self.ny)
+        self.contribute(ALICE, self.ny, days=2)
+        self.contribute(uuid.UUID(ARDUINO_CONTRIBUTOR_ID), self.ny, days=3)
+        self.assertEqual(update_graph_stats(), 3)
+        self.assertEqual(update_graph_stats(), 0)
+
+        latest = self.contribute(BOB, self.pa)
+        self.contribute(ALICE, self.ny, days=2)
+        # A fixed number of queries, however many contributions are new.
+        with self.assertNumQueries(9):
+            self.assertEqual(update_graph_stats(), 2)
+
+        self.assertEqual(
+            contributor_station_counts(),
+            [
+                (str(ALICE), "NY9999", 3),
+                (str(BOB), "PA9999", 1),
+                (ARDUINO_CONTRIBUTOR_ID, "NY9999", 1),
+            ],
+        )
+        self.assertEqual(
+            state_daily_counts(),
+            [
+                ("NY", datetime.date(2018, 6, 18), 1),
+                ("NY", datetime.date(2018, 6, 20), 2),
+                ("PA", datetime.date(2018, 6, 18), 1),
+            ],
+        )
+        watermark = GraphStatsWatermark.objects.get()
+        self.assertEqual(watermark.last_contribution_id, latest.id + 1)
+
+        counts = ContributionCounts.from_rows(contributor_station_counts())
+        self.assertEqual(counts.per_station, {"NY9999": 4, "PA9999": 1})
+        self.assertEqual(contributors_per_total(), {1: 1, 3: 1})
+        self.assertEqual(
+            fill_state_days(state_daily_counts())["NY"].tolist(), [1, 0, 2]
+        )
+
+    def test_rebuild_matches_incremental(self):
+        """
+        Rebuilding recomputes the same counts and is run by --rebuild
+        """
+        self.contribute(ALICE, self.ny)
+        update_graph_stats()
+        self.contribute(BOB, self.ny, days=1)
+        update_graph_stats()
+        incremental = (contributor_station_counts(), state_daily_counts())
+
+        out = StringIO()
+        call_command("update_graph_stats", "--rebuild", stdout=out)
+        self.assertIn("Folded in 2 contributions", out.getvalue())
+        self.assertEqual(
+            (contributor_station_counts(), state_daily_counts()), incremental
+        )
+        self.assertEqual(rebuild_graph_stats(), 2)
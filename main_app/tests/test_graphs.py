@@ -0,0 +1,225 @@
+import datetime
+import os
+import random
+import tempfile
+import uuid
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from main_app.graph_stats import (
+    ARDUINO_CONTRIBUTOR_ID,
+    contributor_station_counts,
+    contributors_per_total,
+    state_daily_counts,
+    update_graph_stats,
+)
+from main_app.graphs import (
+    ContributionCounts,
+    fill_state_days,
+    generate_station_contrib_bar_graph,
+    write_contribution_stats_files,
+)
+from main_app.models import SMSContribution
+from main_app.rollups import rebuild_contributor_stats
+from main_app.tests.test_rollups import create_station
+
+A = uuid.UUID("00000000-0000-0000-0000-00000000000a")
+B = uuid.UUID("00000000-0000-0000-0000-00000000000b")
+C = uuid.UUID("00000000-0000-0000-0000-00000000000c")
+ARDUINO = uuid.UUID(ARDUINO_CONTRIBUTOR_ID)
+STATES = ("NY", "PA", "MI")
+
+
+def fill_dates_between(date1, date2, date_list, text_amount_list):
+    """The gap filling of the previous line graph, kept to compare against."""
+    next_day = date1 + datetime.timedelta(days=1)
+    days_difference = (date2 - date1).days
+
+    for i in range(days_difference - 1):
+        try:
+            date_list.append(next_day)
+            text_amount_list.append(0)
+        except OverflowError:  # date value out of range, ex: July 32nd
+            if next_day.month == 12:
+                next_day = next_day.replace(month=1)
+            else:
+                next_day = next_day.replace(month=next_day.month + 1)
+
+        next_day += datetime.timedelta(days=1)
+
+
+def walked_days(dates):
+    """The previous line graph's walk over a state's sorted contribution dates."""
+    day = dates[0].replace(hour=0, minute=0, second=0, microsecond=0)
+    days, amounts = [day], [0]
+    for date in dates:
+        date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        if date > day:
+            fill_dates_between(day, date, days, amounts)
+            day = date
+            days.append(date)
+            amounts.append(1)
+        else:
+            amounts[-1] += 1
+    return days, amounts
+
+
+def contribute(rows):
+    """Save (contributor, station, date) rows and bring the graph stats up to date."""
+    SMSContribution.objects.bulk_create(
+        SMSContribution(
+            contributor_id=contributor_id,
+            station=station,
+            water_height=1.0,
+            date_received=date,
+        )
+        for contributor_id, station, date in rows
+    )
+    rebuild_contributor_stats()
+    update_graph_stats()
+
+
+class TestContributionCounts(TestCase):
+    def setUp(self):
+        stations = [create_station("NY%d" % i) for i in range(1000, 1003)]
+        date = timezone.make_aware(datetime.datetime(2018, 6, 18, 12))
+        contribute(
+            (contributor_id, stations[station], date + datetime.timedelta(minutes=i))
+            for i, (contributor_id, station) in enumerate(
+                [
+                    (A, 0),
+                    (A, 0),
+                    (A, 1),
+                    (B, 1),
+                    (C, 0),
+                    (ARDUINO, 2),
+                ]
+            )
+        )
+        self.counts = ContributionCounts.from_rows(contributor_station_counts())
+
+    def test_counts(self):
+        """
+        The graph stats give the per pair, per contributor and per station counts
+        """
+        self.assertEqual(
+            self.counts.per_pair,
+            [
+                (str(A), "NY1000", 2),
+                (str(A), "NY1001", 1),
+                (str(B), "NY1001", 1),
+                (str(C), "NY1000", 1),
+                (ARDUINO_CONTRIBUTOR_ID, "NY1002", 1),
+            ],
+        )
+        self.assertEqual(
+            self.counts.per_contributor,
+            {str(A): 3, str(B): 1, str(C): 1, ARDUINO_CONTRIBUTOR_ID: 1},
+        )
+        self.assertEqual(
+            self.counts.per_station, {"NY1000": 3, "NY1001": 2, "NY1002": 1}
+        )
+        self.assertEqual(contributors_per_total(), {1: 2, 3: 1})
+
+    def test_stats_files(self):
+        """
+        The CSVs keep their headers and row formats and get .gz variants
+        """
+        with tempfile.TemporaryDirectory() as stats_dir:
+            write_contribution_stats_files(self.counts, stats_dir)
+            with open(os.path.join(stats_dir, "contrib_per_station_file.csv")) as fh:
+                self.assertEqual(
+                    fh.read(),
+                    "station, contribution_amount\nNY1000,3\nNY1001,2\nNY1002,1\n",
+                )
+            with open(os.path.join(stats_dir, "contrib_per_person_file.csv")) as fh:
+                self.assertEqual(
+                    fh.readlines()[:2],
+                    ["contributor, contribution_amount\n", "{},3\n".format(A)],
+                )
+            with open(os.path.join(stats_dir, "station_contribution_dict.csv")) as fh:
+                self.assertEqual(
+                    fh.readlines()[:2],
+                    ["contributor, station, sms_amount\n", "{},NY1000,2\n".format(A)],
+                )
+            self.assertTrue(
+                os.path.exists(
+                    os.path.join(stats_dir, "contrib_per_station_file.csv.gz")
+                )
+            )
+
+    def test_stats_dir(self):
+        """
+        The CSVs are written to STATIC_DIR/stats whatever the working directory
+        """
+        with tempfile.TemporaryDirectory() as static_dir:
+            with override_settings(STATIC_DIR=static_dir):
+                generate_station_contrib_bar_graph(self.counts)
+            self.assertTrue(
+                os.path.exists(
+                    os.path.join(static_dir, "stats", "contrib_per_station_file.csv")
+                )
+            )
+
+
+class TestContributionDays(TestCase):
+    def setUp(self):
+        self.stations = []
+        for state in STATES:
+            station = create_station(state + "1000")
+            station.state = state
+            station.save()
+            self.stations.append(station)
+
+    def test_gaps_filled_per_state(self):
+        """
+        Daily counts run from each state's first to last day with 0 for gaps
+        """
+        ny, pa = self.stations[:2]
+        contribute(
+            (contributor_id, station, timezone.make_aware(date))
+            for contributor_id, station, date in [
+                (A, ny, datetime.datetime(2018, 6, 18, 8)),
+                (B, ny, datetime.datetime(2018, 6, 18, 23, 59, 59)),
+                (A, ny, datetime.datetime(2018, 6, 21)),
+                (ARDUINO, ny, datetime.datetime(2018, 6, 25, 12)),
+                (C, pa, datetime.datetime(2018, 7, 1, 12)),
+            ]
+        )
+        state_days = fill_state_days(state_daily_counts())
+        self.assertEqual(list(state_days), ["NY", "PA"])
+        self.assertEqual(state_days["NY"].tolist(), [2, 0, 0, 1])
+        self.assertEqual(
+            [day.strftime("%Y-%m-%d") for day in state_days["NY"].index],
+            ["2018-06-18", "2018-06-19", "2018-06-20", "2018-06-21"],
+        )
+        self.assertEqual(state_days["PA"].tolist(), [1])
+
+    def test_matches_previous_walk(self):
+        """
+        The daily counts match the previous walk with fill_dates_between
+        """
+        rng = random.Random(0)
+        first = timezone.make_aware(datetime.datetime(2018, 1, 1))
+        rows = [
+            (
+                rng.choice((A, B, C, ARDUINO)),
+                rng.choice(self.stations),
+                first + datetime.timedelta(seconds=seconds),
+            )
+            for seconds in rng.sample(range(120 * 24 * 3600), 500)
+        ]
+        contribute(rows)
+
+        state_days = fill_state_days(state_daily_counts())
+        self.assertEqual(list(state_days), sorted(STATES))
+        for state, amounts in state_days.items():
+            dates = sorted(
+                timezone.localtime(date).replace(tzinfo=None)
+                for contributor_id, station, date in rows
+                if station.state == state and contributor_id != ARDUINO
+            )
+            days, walked_amounts = walked_days(dates)
+            self.assertEqual(list(amounts.index.to_pydatetime()), days)
+            self.assertEqual(amounts.tolist(), walked_amounts)
@@ -0,0 +1,73 @@
+import datetime
+import uuid
+
+from django.test import TestCase
+from django.utils import timezone
+
+from main_app.models import (
+    InvalidSMSContribution,
+    SMSContribution,
+    SurveyReceived,
+    SurveySent,
+)
+
+
+class TestHotQueryIndexes(TestCase):
+    """
+    The hot contribution and survey queries are answered from their composite
+    indexes, according to SQLite's EXPLAIN QUERY PLAN.
+    """
+
+    def setUp(self):
+        self.contributor_id = uuid.uuid4()
+        self.survey_id = "SV_1ImGl1K50tzcEg6"
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertRegex(
+            plan, r"SEARCH \w+ USING (COVERING )?INDEX {} ".format(index_name)
+        )
+        self.assertNotIn("SCAN", plan)
+
+    def test_station_history_uses_station_date_index(self):
+        """
+        Station history ordered by date is an index range scan without a sort
+        """
+        queryset = SMSContribution.objects.filter(
+            station_id="NY1000",
+            date_received__gte=timezone.now() - datetime.timedelta(days=30),
+        ).order_by("date_received")
+        self.assertUsesIndex(queryset, "sms_station_date_idx")
+        self.assertNotIn("TEMP B-TREE", queryset.explain())
+
+    def test_contributor_lookup_uses_index(self):
+        """
+        Contributions for one contributor are looked up by index
+        """
+        self.assertUsesIndex(
+            SMSContribution.objects.filter(contributor_id=self.contributor_id),
+            "sms_contributor_idx",
+        )
+        self.assertUsesIndex(
+            InvalidSMSContribution.objects.filter(contributor_id=self.contributor_id),
+            "invalid_sms_contributor_idx",
+        )
+
+    def test_survey_should_send_queries_use_indexes(self):
+        """
+        Both SurveyDistribution.should_send lookups are covered by an index
+        """
+        self.assertUsesIndex(
+            SurveySent.objects.filter(
+                survey_id=self.survey_id,
+                contributor_id=self.contributor_id,
+                date_sent__gte=timezone.now() - datetime.timedelta(days=30),
+            ),
+            "survey_sent_lookup_idx",
+        )
+        self.assertUsesIndex(
+            SurveyReceived.objects.filter(
+                survey_id=self.survey_id, contributor_id=self.contributor_id
+            ),
+            "survey_received_lookup_idx",
+        )
@@ -0,0 +1,142 @@
+import datetime
+import json
+import uuid
+from unittest import mock
+
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from main_app import live
+from main_app.contribution_database import save_valid_contribution
+from main_app.models import SMSContribution
+from main_app.tests.test_rollups import create_station
+from main_app.views import live_feed
+
+
+class TestLiveFeed(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.station = create_station("NY9999")
+        self.other = create_station("PA9999")
+        self.other.state = "PA"
+        self.other.save()
+        heartbeat = mock.patch.object(live, "HEARTBEAT_SECONDS", 0.01)
+        heartbeat.start()
+        self.addCleanup(heartbeat.stop)
+        self.addCleanup(live.broker.subscribers.clear)
+
+    def save(self, station, height):
+        with self.captureOnCommitCallbacks(execute=True):
+            return save_valid_contribution(str(uuid.uuid4()), station, height)
+
+    def open(self, headers=None, **params):
+        response = live_feed(self.factory.get("/live/", params, headers=headers))
+        self.addCleanup(response.close)
+        if response.status_code != 200:
+            return response, None
+        events = iter(response.streaming_content)
+        self.assertEqual(next(events), b"retry: 5000\n\n")
+        return response, events
+
+    def next_event(self, events):
+        for chunk in events:
+            if chunk.startswith(b"id: "):
+                lines = chunk.decode().splitlines()
+                return int(lines[0][4:]), json.loads(lines[2][6:])
+        return None
+
+    def test_pushes_new_contributions_for_station(self):
+        """
+        Contributions saved after connecting are pushed; other stations' are not
+        """
+        response, events = self.open(station=self.station.id)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.save(self.other, 1.0)
+        contribution = self.save(self.station, 2.5)
+
+        event_id, data = self.next_event(events)
+        self.assertEqual(event_id, contribution.id)
+        self.assertEqual(data["station"], "NY9999")
+        self.assertEqual(data["gage_height"], 2.5)
+
+    def test_state_feed_and_heartbeat(self):
+        """
+        State feeds receive their stations' contributions; idle streams heartbeat
+        """
+        response, events = self.open(state="pa")
+        self.assertEqual(next(events), b": keepalive\n\n")
+        self.save(self.station, 1.0)
+        self.save(self.other, 3.0)
+        event_id, data = self.next_event(events)
+        self.assertEqual(data["station"], "PA9999")
+
+    def test_replay_after_last_event_id(self):
+        """
+        Reconnecting with Last-Event-ID replays what was missed, in order
+        """
+        first = self.save(self.station, 1.0)
+        missed = [self.save(self.station, height) for height in (2.0, 3.0)]
+        response, events = self.open(
+            headers={"Last-Event-ID": str(first.id)}, station=self.station.id
+        )
+        self.assertEqual(
+            [self.next_event(events)[0] for _ in missed], [c.id for c in missed]
+        )
+
+    def test_slow_subscriber_catches_up_from_database(self):
+        """
+        A full queue drops pushes, and the stream reads them back from the database
+        """
+        with mock.patch.object(live, "QUEUE_SIZE", 1):
+            response, events = self.open(station=self.station.id)
+        saved = [self.save(self.station, height) for height in (1.0, 2.0, 3.0)]
+        (subscriber,) = live.broker.subscribers
+        self.assertTrue(subscriber.queue.full())
+        self.assertEqual(
+            [self.next_event(events)[0] for _ in saved], [c.id for c in saved]
+        )
+
+    def test_pushes_do_not_skip_lower_ids(self):
+        """
+        A push doesn't move the stream past an earlier contribution it wasn't told of
+        """
+        # End the stream soon rather than wait for a skipped event forever.
+        deadline = mock.patch.object(live, "MAX_STREAM_SECONDS", 1)
+        deadline.start()
+        self.addCleanup(deadline.stop)
+        response, events = self.open(station=self.station.id)
+        self.assertEqual(next(events), b": keepalive\n\n")
+        # Saved by another process: in the database, but never pushed here.
+        unpushed = SMSContribution.objects.create(
+            contributor_id=uuid.uuid4(),
+            station=self.station,
+            water_height=1.0,
+            date_received=timezone.now() - datetime.timedelta(seconds=1),
+        )
+        pushed = self.save(self.station, 2.0)
+        self.assertEqual(
+            [self.next_event(events)[0] for _ in range(2)], [unpushed.id, pushed.id]
+        )
+
+    def test_bounded_fan_out(self):
+        """
+        Subscribers beyond the limit get 503, and closing a stream frees its slot
+        """
+        with mock.patch.object(live.broker, "max_subscribers", 1):
+            response, _ = self.open(station=self.station.id)
+            busy, _ = self.open(station=self.station.id)
+            self.assertEqual(busy.status_code, 503)
+            self.assertIn("Retry-After", busy)
+
+            response.close()
+            self.assertEqual(live.broker.subscribers, set())
+
+    def test_bad_requests(self):
+        """
+        Unknown stations, missing selections and bad event IDs are rejected
+        """
+        self.assertEqual(self.open(station="XX0000")[0].status_code, 400)
+        self.assertEqual(self.open()[0].status_code, 400)
+        self.assertEqual(
+            self.open(station=self.station.id, last_event_id="x")[0].status_code, 400
+        )
@@ -0,0 +1,153 @@
+import datetime
+import os
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+from unittest import mock
+
+import pyarrow.dataset as ds
+from django.core.management import call_command
+from django.test import TestCase
+
+from main_app import parquet_snapshots
+from main_app.models import InvalidSMSContribution, SMSContribution, Station
+from main_app.tests.test_rollups import create_station
+
+
+class TestParquetSnapshot(TestCase):
+    def setUp(self):
+        self.parquet_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.parquet_dir)
+        self.stations = [create_station("NY0000"), create_station("MI0000")]
+        Station.objects.filter(id="NY0000").update(state="NY")
+        self.start = datetime.datetime(2019, 12, 31, 12, tzinfo=datetime.timezone.utc)
+        self.added = 0
+
+    def add(self, count):
+        SMSContribution.objects.bulk_create(
+            SMSContribution(
+                contributor_id=uuid.uuid4(),
+                station=self.stations[i % 2],
+                water_height=i / 2,
+                date_received=self.start + datetime.timedelta(hours=12 * i),
+            )
+            for i in range(self.added, self.added + count)
+        )
+        self.added += count
+
+    def export(self, *args):
+        out = StringIO()
+        call_command(
+            "export_parquet", "--output-dir", self.parquet_dir, *args, stdout=out
+        )
+        return out.getvalue()
+
+    def read(self, name):
+        return ds.dataset(
+            os.path.join(self.parquet_dir, name), format="parquet", partitioning="hive"
+        ).to_table()
+
+    def parts(self, partition):
+        return sorted(
+            os.listdir(os.path.join(self.parquet_dir, "contributions", partition))
+        )
+
+    def test_incremental_snapshot(self):
+        """Runs add a part per touched partition holding only the new rows"""
+        self.add(4)
+        InvalidSMSContribution.objects.create(
+            contributor_id=uuid.uuid4(), message_body="hello", date_received=self.start
+        )
+        self.assertIn("contributions: added 4 rows", self.export())
+        self.assertEqual(self.parts("state=NY/year=2019"), ["part-1-1.parquet"])
+        self.assertEqual(self.parts("state=NY/year=2020"), ["part-1-3.parquet"])
+
+        self.assertIn("contributions: added 0 rows", self.export())
+        self.add(2)
+        self.export()
+        self.assertEqual(
+            self.parts("state=NY/year=2020"), ["part-1-3.parquet", "part-5-5.parquet"]
+        )
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(
+                    self.parquet_dir,
+                    "contributions",
+                    "state=NY",
+                    "year=2019",
+                    "part-5-5.parquet",
+                )
+            )
+        )
+
+        table = self.read("contributions").sort_by("id")
+        self.assertEqual(table["id"].to_pylist(), list(range(1, 7)))
+        self.assertEqual(table["state"].to_pylist(), ["NY", "MI"] * 3)
+        self.assertEqual(
+            table["year"].to_pylist(), [2019, 2020, 2020, 2020, 2020, 2020]
+        )
+        self.assertEqual(table["water_height"].to_pylist(), [0, 0.5, 1, 1.5, 2, 2.5])
+        self.assertEqual(table["date_received"][0].as_py(), self.start)
+        self.assertEqual(
+            self.read("invalid_contributions")["message_body"].to_pylist(), ["hello"]
+        )
+        self.assertEqual(self.read("stations")["id"].to_pylist(), ["MI0000", "NY0000"])
+
+    def test_compaction_and_recovery(self):
+        """Parts are merged at MAX_PARTS, and leftovers of a failed run are removed"""
+        self.start = datetime.datetime(2020, 6, 1, tzinfo=datetime.timezone.utc)
+        with mock.patch.object(parquet_snapshots, "MAX_PARTS", 3):
+            for _ in range(3):
+                self.add(2)
+                self.export()
+        self.assertEqual(self.parts("state=NY/year=2020"), ["part-1-5.parquet"])
+
+        # A run that died before writing the manifest.
+        shutil.copy(
+            os.path.join(
+                self.parquet_dir,
+                "contributions",
+                "state=NY",
+                "year=2020",
+                "part-1-5.parquet",
+            ),
+            os.path.join(
+                self.parquet_dir,
+                "contributions",
+                "state=NY",
+                "year=2020",
+                "part-7-9.parquet",
+            ),
+        )
+        self.add(2)
+        self.export()
+        self.assertEqual(
+            self.parts("state=NY/year=2020"), ["part-1-5.parquet", "part-7-7.parquet"]
+        )
+        self.assertEqual(self.read("contributions").num_rows, 8)
+
+        self.assertIn("contributions: added 8 rows", self.export("--rebuild"))
+        self.assertEqual(self.parts("state=NY/year=2020"), ["part-1-7.parquet"])
+
+    def test_no_duplicates_after_failed_manifest_write(self):
+        """Parts are only merged once the manifest records their ids"""
+        self.start = datetime.datetime(2020, 6, 1, tzinfo=datetime.timezone.utc)
+        with mock.patch.object(parquet_snapshots, "MAX_PARTS", 2):
+            self.add(2)
+            self.export()
+            self.add(2)
+            with mock.patch.object(
+                parquet_snapshots, "write_atomic", side_effect=OSError("disk full")
+            ):
+                with self.assertRaises(OSError):
+                    self.export()
+            self.assertEqual(
+                self.parts("state=NY/year=2020"),
+                ["part-1-1.parquet", "part-3-3.parquet"],
+            )
+            self.export()
+        self.assertEqual(self.parts("state=NY/year=2020"), ["part-1-3.parquet"])
+        self.assertEqual(
+            sorted(self.read("contributions")["id"].to_pylist()), [1, 2, 3, 4]
+        )
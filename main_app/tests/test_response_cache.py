@@ -0,0 +1,117 @@
+import json
+import uuid
+
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase
+
+from main_app.contribution_database import save_valid_contribution
+from main_app.models import SMSContribution, StationStats
+from main_app.response_cache import CACHE_ALIAS
+from main_app.tests.test_rollups import create_station
+from main_app.views import get_data
+
+
+class TestStationResponseCache(TestCase):
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        self.factory = RequestFactory()
+        self.station = create_station()
+        save_valid_contribution(str(uuid.uuid4()), self.station, 1.5)
+
+    def get(self, headers=None, **params):
+        request = self.factory.get(
+            "/data/", dict(params, station=self.station.id), headers=headers
+        )
+        response = get_data(request)
+        if response.streaming:
+            # Drain the stream, which is what stores it in the cache.
+            response.body = b"".join(response.streaming_content)
+        else:
+            response.body = response.content
+        return response
+
+    def test_repeat_requests_served_from_cache(self):
+        """
+        A repeated request costs one version lookup and returns the same body
+        """
+        first = self.get(format="csv")
+        with self.assertNumQueries(1):
+            second = self.get(format="csv")
+        self.assertFalse(second.streaming)
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second["Content-Type"], "text/csv")
+
+    def test_saving_a_contribution_invalidates(self):
+        """
+        Saving a contribution bumps the station version and the ETag
+        """
+        first = self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            save_valid_contribution(str(uuid.uuid4()), self.station, 2.5)
+        self.assertEqual(StationStats.objects.get(station=self.station).version, 2)
+
+        second = self.get()
+        self.assertTrue(second.streaming)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(len(json.loads(second.body)["contributions"]), 2)
+
+    def test_editing_or_deleting_a_contribution_invalidates(self):
+        """
+        Contributions edited or deleted outside record_contribution bump the ETag
+        """
+        first = self.get()
+        contribution = SMSContribution.objects.get(station=self.station)
+        contribution.water_height = 3.0
+        with self.captureOnCommitCallbacks(execute=True):
+            contribution.save()
+        edited = self.get()
+        self.assertNotEqual(edited["ETag"], first["ETag"])
+        self.assertEqual(
+            json.loads(edited.body)["contributions"][0]["gage_height"], 3.0
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            contribution.delete()
+        deleted = self.get()
+        self.assertNotEqual(deleted["ETag"], edited["ETag"])
+        self.assertEqual(json.loads(deleted.body)["contributions"], [])
+
+    def test_conditional_requests(self):
+        """
+        Matching If-None-Match or If-Modified-Since is answered with 304
+        """
+        first = self.get()
+        with self.assertNumQueries(1):
+            response = self.get(headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+
+        response = self.get(headers={"If-Modified-Since": first["Last-Modified"]})
+        self.assertEqual(response.status_code, 304)
+
+        save_valid_contribution(str(uuid.uuid4()), self.station, 2.5)
+        response = self.get(headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_parameters(self):
+        """
+        Different parameters or formats are different representations
+        """
+        etags = {
+            self.get()["ETag"],
+            self.get(format="csv")["ETag"],
+            self.get(points=10)["ETag"],
+            self.get(headers={"Accept-Encoding": "gzip"})["ETag"],
+        }
+        self.assertEqual(len(etags), 4)
+
+    def test_stations_without_stats_are_not_cached(self):
+        """
+        Bulk loaded stations have no version, so responses are not cached
+        """
+        StationStats.objects.all().delete()
+        response = self.get()
+        self.assertNotIn("ETag", response)
+        SMSContribution.objects.all().delete()
+        self.assertEqual(json.loads(self.get().body)["contributions"], [])
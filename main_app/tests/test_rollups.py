@@ -0,0 +1,250 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from main_app.contribution_database import (
+    save_invalid_contribution,
+    save_valid_contribution,
+)
+from main_app.models import (
+    ContributorStationCount,
+    ContributorStats,
+    SMSContribution,
+    Station,
+    StationDailyRollup,
+    StationStats,
+)
+from main_app.rollups import (
+    rebuild_contributor_stats,
+    rebuild_station_rollups,
+    record_contribution,
+)
+
+ROLLUP_FIELDS = [
+    "day",
+    "count",
+    "contributors",
+    "height_count",
+    "height_sum",
+    "height_min",
+    "height_max",
+    "temperature_count",
+    "temperature_sum",
+    "temperature_min",
+    "temperature_max",
+]
+
+
+def create_station(station_id="NY9999"):
+    return Station.objects.create(
+        id=station_id,
+        name=station_id,
+        loc_latitude=0,
+        loc_longitude=0,
+        upper_bound=5,
+        lower_bound=0,
+        date_added=timezone.now(),
+    )
+
+
+class TestStationDailyRollup(TestCase):
+    def setUp(self):
+        self.station = create_station()
+        self.alice = "2b6bd2a0-43c2-3a8e-9b7a-5e1b0c0f0a01"
+        self.bob = "2b6bd2a0-43c2-3a8e-9b7a-5e1b0c0f0a02"
+
+    def rollup_values(self):
+        return list(
+            StationDailyRollup.objects.filter(station=self.station)
+            .order_by("day")
+            .values(*ROLLUP_FIELDS)
+        )
+
+    def test_save_updates_rollup(self):
+        """
+        Each saved contribution is folded into its station's rollup for the day
+        """
+        save_valid_contribution(self.alice, self.station, 2.0, temperature=60.0)
+        save_valid_contribution(self.alice, self.station, 3.0)
+        save_valid_contribution(self.bob, self.station, 1.0, temperature=70.0)
+
+        rollup = StationDailyRollup.objects.get(station=self.station)
+        self.assertEqual(rollup.day, timezone.localdate())
+        self.assertEqual(rollup.count, 3)
+        self.assertEqual(rollup.contributors, 2)
+        self.assertEqual((rollup.height_min, rollup.height_max), (1.0, 3.0))
+        self.assertAlmostEqual(rollup.height_mean, 2.0)
+        self.assertEqual((rollup.temperature_min, rollup.temperature_max), (60, 70))
+        self.assertAlmostEqual(rollup.temperature_mean, 65.0)
+
+    def test_rebuild_matches_incremental(self):
+        """
+        rebuild_station_rollups reproduces the incrementally maintained rows
+        """
+        save_valid_contribution(self.alice, self.station, 2.5)
+        save_valid_contribution(self.bob, self.station, None, temperature=55.0)
+        yesterday = timezone.localtime() - datetime.timedelta(days=1)
+        contribution = SMSContribution.objects.create(
+            contributor_id=self.alice,
+            station=self.station,
+            water_height=4.0,
+            date_received=yesterday,
+        )
+        record_contribution(contribution)
+        incremental = self.rollup_values()
+
+        self.assertEqual(rebuild_station_rollups(self.station.id), 2)
+        self.assertEqual(self.rollup_values(), incremental)
+
+    def test_edit_and_delete_recounted(self):
+        """
+        Edited and deleted contributions are recounted in every derived table
+        """
+        other = create_station("NY9998")
+        first = save_valid_contribution(self.alice, self.station, 2.0)
+        save_valid_contribution(self.alice, self.station, 3.0)
+        last = save_valid_contribution(self.bob, self.station, 1.0)
+
+        first.water_height = 5.0
+        first.save()
+        last.station = other
+        last.date_received -= datetime.timedelta(days=1)
+        last.save()
+        SMSContribution.objects.get(water_height=3.0).delete()
+
+        rollup = StationDailyRollup.objects.get(station=self.station)
+        self.assertEqual((rollup.count, rollup.contributors), (1, 1))
+        self.assertEqual((rollup.height_min, rollup.height_max), (5.0, 5.0))
+        incremental = self.rollup_values()
+        rebuild_station_rollups(self.station.id)
+        self.assertEqual(self.rollup_values(), incremental)
+        self.assertEqual(
+            StationDailyRollup.objects.get(station=other).day,
+            timezone.localtime(last.date_received).date(),
+        )
+
+        stats = StationStats.objects.get(station=self.station)
+        self.assertEqual((stats.contribution_count, stats.last_water_height), (1, 5.0))
+        self.assertEqual(
+            ContributorStats.objects.get(contributor_id=self.bob).contribution_count, 1
+        )
+        self.assertEqual(
+            dict(ContributorStationCount.objects.values_list("station_id", "count")),
+            {"NY9999": 1, "NY9998": 1},
+        )
+
+
+class TestStationStats(TestCase):
+    def setUp(self):
+        self.station = create_station()
+        self.contributor_id = "2b6bd2a0-43c2-3a8e-9b7a-5e1b0c0f0a01"
+
+    def test_save_updates_counter_and_latest_reading(self):
+        """
+        Saving a contribution bumps the counter and moves the latest reading
+        """
+        save_valid_contribution(self.contributor_id, self.station, 1.5)
+        latest = save_valid_contribution(
+            self.contributor_id, self.station, 2.5, temperature=65.0
+        )
+
+        stats = StationStats.objects.get(station=self.station)
+        self.assertEqual(stats.contribution_count, 2)
+        self.assertEqual(stats.last_date_received, latest.date_received)
+        self.assertEqual(stats.last_water_height, 2.5)
+        self.assertEqual(stats.last_temperature, 65.0)
+
+    def test_older_contribution_keeps_latest_reading(self):
+        """
+        A contribution older than the latest one only bumps the counter
+        """
+        latest = save_valid_contribution(self.contributor_id, self.station, 2.5)
+        older = SMSContribution.objects.create(
+            contributor_id=self.contributor_id,
+            station=self.station,
+            water_height=9.0,
+            date_received=latest.date_received - datetime.timedelta(hours=1),
+        )
+        record_contribution(older)
+
+        stats = StationStats.objects.get(station=self.station)
+        self.assertEqual(stats.contribution_count, 2)
+        self.assertEqual(stats.last_water_height, 2.5)
+
+    def test_reconcile_repairs_drift(self):
+        """
+        reconcile_station_stats rewrites stats that disagree with contributions
+        """
+        save_valid_contribution(self.contributor_id, self.station, 2.5)
+        StationStats.objects.filter(station=self.station).update(
+            contribution_count=40, last_water_height=None
+        )
+
+        call_command("reconcile_station_stats", stdout=StringIO())
+
+        stats = StationStats.objects.get(station=self.station)
+        self.assertEqual(stats.contribution_count, 1)
+        self.assertEqual(stats.last_water_height, 2.5)
+
+
+class TestContributorStats(TestCase):
+    def setUp(self):
+        self.station = create_station()
+        self.other = create_station("NY9998")
+        self.alice = "2b6bd2a0-43c2-3a8e-9b7a-5e1b0c0f0a01"
+
+    def stats_values(self):
+        return (
+            list(
+                ContributorStats.objects.order_by("contributor_id").values(
+                    "contributor_id",
+                    "contribution_count",
+                    "invalid_count",
+                    "first_date_received",
+                    "last_date_received",
+                )
+            ),
+            list(
+                ContributorStationCount.objects.order_by(
+                    "contributor_id", "station_id"
+                ).values("contributor_id", "station_id", "count")
+            ),
+        )
+
+    def test_save_updates_contributor_stats(self):
+        """
+        Valid and invalid contributions update the contributor's counters
+        """
+        first = save_valid_contribution(self.alice, self.station, 2.0)
+        save_valid_contribution(self.alice, self.station, 3.0)
+        last = save_valid_contribution(self.alice, self.other, 1.0)
+        save_invalid_contribution(self.alice, "NY9999 high")
+
+        stats = ContributorStats.objects.get(contributor_id=self.alice)
+        self.assertEqual((stats.contribution_count, stats.invalid_count), (3, 1))
+        self.assertEqual(stats.first_date_received, first.date_received)
+        self.assertEqual(stats.last_date_received, last.date_received)
+        self.assertEqual(
+            dict(ContributorStationCount.objects.values_list("station_id", "count")),
+            {"NY9999": 2, "NY9998": 1},
+        )
+
+    def test_rebuild_matches_incremental(self):
+        """
+        rebuild_contributor_stats reproduces the incrementally maintained rows
+        """
+        save_valid_contribution(self.alice, self.station, 2.0)
+        save_valid_contribution(self.alice, self.other, 3.0)
+        save_invalid_contribution(self.alice, "hi")
+        save_invalid_contribution("2b6bd2a0-43c2-3a8e-9b7a-5e1b0c0f0a02", "hello")
+        incremental = self.stats_values()
+
+        ContributorStats.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_contributor_stats", stdout=out)
+        self.assertIn("Rebuilt stats for 2 contributors", out.getvalue())
+        self.assertEqual(self.stats_values(), incremental)
+        self.assertEqual(rebuild_contributor_stats(), 2)
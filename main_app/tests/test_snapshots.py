@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.test import TestCase, override_settings
+
+from main_app import snapshots
+from main_app.contribution_database import save_valid_contribution
+from main_app.tests.test_rollups import create_station
+
+
+class TestStationSnapshot(TestCase):
+    def setUp(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir)
+        self.snapshot_dir = os.path.join(static_dir, "snapshots")
+        settings_override = override_settings(
+            STATIC_DIR=static_dir, STATION_SNAPSHOT_DIR=self.snapshot_dir
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.stations = [create_station("NY%04d" % i) for i in range(3)]
+
+    def features(self, manifest):
+        with open(os.path.join(self.snapshot_dir, manifest["file"]), "rb") as fh:
+            data = fh.read()
+        self.assertEqual(hashlib.sha256(data).hexdigest()[:16], manifest["hash"])
+        return {feature["id"]: feature for feature in json.loads(data)["features"]}
+
+    def test_full_snapshot(self):
+        """
+        write_snapshot writes a hashed GeoJSON file, its .gz and a manifest
+        """
+        manifest = snapshots.write_snapshot()
+        self.assertEqual(manifest, snapshots.read_manifest(self.snapshot_dir))
+        self.assertEqual(manifest["url"], "/static/snapshots/" + manifest["file"])
+        features = self.features(manifest)
+        self.assertEqual(list(features), ["NY0000", "NY0001", "NY0002"])
+        self.assertEqual(features["NY0000"]["geometry"]["type"], "Point")
+        self.assertEqual(features["NY0000"]["properties"]["contribution_count"], 0)
+
+        path = os.path.join(self.snapshot_dir, manifest["file"])
+        with gzip.open(path + ".gz") as fh, open(path, "rb") as raw:
+            self.assertEqual(fh.read(), raw.read())
+
+    def test_contribution_updates_only_its_station(self):
+        """
+        Saving a contribution refreshes that station's feature after commit
+        """
+        first = snapshots.write_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            save_valid_contribution(str(uuid.uuid4()), self.stations[1], 2.5)
+
+        manifest = snapshots.read_manifest(self.snapshot_dir)
+        self.assertNotEqual(manifest["hash"], first["hash"])
+        features = self.features(manifest)
+        self.assertEqual(features["NY0001"]["properties"]["last_water_height"], 2.5)
+        self.assertEqual(features["NY0000"], self.features(first)["NY0000"])
+
+        # Only the changed station is read back from the database.
+        with self.assertNumQueries(1):
+            snapshots.write_snapshot(["NY0001"])
+
+    def test_station_edit_and_delete(self):
+        """
+        Station edits and deletions are reflected in the snapshot
+        """
+        snapshots.write_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stations[0].status = "CD"
+            self.stations[0].save()
+            self.stations[2].delete()
+
+        features = self.features(snapshots.read_manifest(self.snapshot_dir))
+        self.assertEqual(features["NY0000"]["properties"]["status"], "CD")
+        self.assertNotIn("NY0002", features)
+
+    def test_old_snapshots_pruned(self):
+        """
+        Unchanged content keeps its file and only recent hashes are kept
+        """
+        first = snapshots.write_snapshot()
+        self.assertEqual(snapshots.write_snapshot(), first)
+        for height in (1.0, 2.0, 3.0):
+            with self.captureOnCommitCallbacks(execute=True):
+                save_valid_contribution(str(uuid.uuid4()), self.stations[0], height)
+
+        geojson = [n for n in os.listdir(self.snapshot_dir) if n.endswith(".geojson")]
+        self.assertEqual(len(geojson), snapshots.KEEP_SNAPSHOTS)
+        self.assertIn(snapshots.read_manifest(self.snapshot_dir)["file"], geojson)
@@ -0,0 +1,150 @@
+import json
+import random
+
+from django.test import RequestFactory, TestCase
+
+from main_app import spatial
+from main_app.management.commands.bench_station_index import haversine_km
+from main_app.spatial import StationIndex, StationPoint
+from main_app.tests.test_rollups import create_station
+from main_app.views import stations_bbox, stations_near
+
+
+def point(station_id, latitude, longitude):
+    return StationPoint(station_id, station_id, "NY", latitude, longitude)
+
+
+class TestStationIndex(TestCase):
+    def test_nearest_matches_linear_scan(self):
+        """
+        nearest returns the same stations and distances as a haversine scan
+        """
+        rng = random.Random(0)
+        points = [
+            point(str(i), rng.uniform(-80, 80), rng.uniform(-180, 180))
+            for i in range(500)
+        ]
+        index = StationIndex(points)
+        for _ in range(50):
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            expected = sorted(
+                points, key=lambda p: haversine_km(lat, lon, p.latitude, p.longitude)
+            )[:5]
+            nearest = index.nearest(lat, lon, 5)
+            self.assertEqual([p for _, p in nearest], expected)
+            for distance, p in nearest:
+                self.assertAlmostEqual(
+                    distance, haversine_km(lat, lon, p.latitude, p.longitude), 3
+                )
+
+    def test_nearest_across_antimeridian_and_radius(self):
+        """
+        Distances wrap around the antimeridian and radius_km bounds the result
+        """
+        index = StationIndex(
+            [point("east", 0, 179.9), point("west", 0, -179.8), point("far", 0, 0)]
+        )
+        nearest = index.nearest(0, -179.97, 2)
+        self.assertEqual([p.id for _, p in nearest], ["east", "west"])
+        self.assertEqual(len(index.nearest(0, -179.97, 3, radius_km=100)), 2)
+
+    def test_within(self):
+        """
+        within filters by latitude and longitude, including wrapped boxes
+        """
+        index = StationIndex(
+            [point("a", 42, -78), point("b", 43, -76), point("c", 10, 179)]
+        )
+        self.assertEqual([p.id for p in index.within(-79, 41, -77, 44)], ["a"])
+        self.assertEqual([p.id for p in index.within(170, 0, -170, 20)], ["c"])
+        self.assertEqual(index.within(0, 0, 1, 1), [])
+
+
+class TestStationEndpoints(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            spatial.invalidate_station_index()
+        for station_id, latitude, longitude in [
+            ("NY1000", 42.88, -78.88),  # Buffalo
+            ("NY1001", 43.16, -77.61),  # Rochester
+            ("NY1002", 40.71, -74.00),  # New York
+        ]:
+            station = create_station(station_id)
+            station.loc_latitude, station.loc_longitude = latitude, longitude
+            station.save()
+
+    def get(self, view, **params):
+        response = view(self.factory.get("/", params))
+        return response.status_code, json.loads(response.content or "null")
+
+    def test_stations_near(self):
+        """
+        stations/near returns the k closest stations with their distance
+        """
+        status, data = self.get(stations_near, lat=42.9, lon=-78.8, k=2)
+        self.assertEqual(status, 200)
+        stations = data["stations"]
+        self.assertEqual([s["id"] for s in stations], ["NY1000", "NY1001"])
+        self.assertLess(stations[0]["distance_km"], stations[1]["distance_km"])
+
+    def test_stations_bbox(self):
+        """
+        stations/bbox returns the stations inside west,south,east,north
+        """
+        status, data = self.get(stations_bbox, bbox="-79.5,42,-77,44")
+        self.assertEqual({s["id"] for s in data["stations"]}, {"NY1000", "NY1001"})
+
+    def test_index_rebuilt_when_stations_change(self):
+        """
+        Saving or deleting a station invalidates the cached index
+        """
+        self.get(stations_near, lat=40.7, lon=-74, k=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            station = create_station("NY1003")
+            station.loc_latitude, station.loc_longitude = 40.70, -74.01
+            station.save()
+        status, data = self.get(stations_near, lat=40.7, lon=-74.01, k=1)
+        self.assertEqual(data["stations"][0]["id"], "NY1003")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            station.delete()
+        status, data = self.get(stations_near, lat=40.7, lon=-74.01, k=1)
+        self.assertEqual(data["stations"][0]["id"], "NY1002")
+
+    def test_index_kept_until_commit(self):
+        """
+        The index is only invalidated once the station change commits
+        """
+        self.get(stations_near, lat=40.7, lon=-74, k=1)
+        index = spatial.station_index()
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_station("NY1003")
+            self.assertIs(spatial.station_index(), index)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertIsNot(spatial.station_index(), index)
+
+    def test_bad_requests(self):
+        """
+        Missing or out of range parameters are rejected
+        """
+        self.assertEqual(stations_near(self.factory.get("/")).status_code, 400)
+        self.assertEqual(
+            stations_near(self.factory.get("/", {"lat": 91, "lon": 0})).status_code,
+            400,
+        )
+        self.assertEqual(
+            stations_near(
+                self.factory.get("/", {"lat": 0, "lon": 0, "k": 1000})
+            ).status_code,
+            400,
+        )
+        self.assertEqual(
+            stations_bbox(self.factory.get("/", {"bbox": "1,2,3"})).status_code, 400
+        )
+        self.assertEqual(
+            stations_bbox(self.factory.get("/", {"bbox": "0,10,1,5"})).status_code,
+            400,
+        )
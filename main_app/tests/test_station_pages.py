@@ -0,0 +1,170 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from main_app import station_pages
+from main_app.models import SMSContribution, Station
+from main_app.tests.test_rollups import create_station
+
+
+class TestStationPages(TestCase):
+    def setUp(self):
+        self.page_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.page_dir)
+        self.csv_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.csv_dir)
+        self.stations = [create_station("NY%04d" % i) for i in range(3)]
+        self.start = timezone.now() - datetime.timedelta(days=1)
+        self.add(self.stations[0], 5)
+        self.add(self.stations[1], 3)
+
+    def add(self, station, count):
+        SMSContribution.objects.bulk_create(
+            SMSContribution(
+                contributor_id=uuid.uuid4(),
+                station=station,
+                water_height=i / 2,
+                date_received=self.start + datetime.timedelta(minutes=i),
+            )
+            for i in range(count)
+        )
+        self.start += datetime.timedelta(minutes=count)
+
+    def build(self):
+        return station_pages.build_station_pages(self.page_dir, self.csv_dir, workers=2)
+
+    def entry(self, station_id):
+        return station_pages.read_manifest(self.page_dir)["stations"][station_id]
+
+    def read(self, path):
+        with open(os.path.join(self.page_dir, path)) as fh:
+            return fh.read()
+
+    def test_pages_reference_hashed_files(self):
+        """Each page loads a content-named copy of its CSV and the hashed assets"""
+        with self.assertNumQueries(3):
+            result = self.build()
+        self.assertEqual(
+            result,
+            {
+                "stations": 3,
+                "csvs_written": 3,
+                "data_written": 3,
+                "pages_written": 3,
+                "rows": 8,
+            },
+        )
+
+        page = self.read("NY0000_dygraph.html")
+        manifest = station_pages.read_manifest(self.page_dir)
+        data_file = self.entry("NY0000")["data"]
+        self.assertRegex(data_file, r"^data/NY0000\.[0-9a-f]{16}\.csv$")
+        self.assertIn('data-csv="{}"'.format(data_file), page)
+        for asset in manifest["assets"].values():
+            self.assertIn('src="{}"'.format(asset), page)
+            self.assertTrue(os.path.isfile(os.path.join(self.page_dir, asset + ".gz")))
+        self.assertRegex(
+            manifest["assets"]["script"], r"^assets/station_chart\.[0-9a-f]{16}\.js$"
+        )
+
+        with open(os.path.join(self.csv_dir, "NY0000.csv")) as fh:
+            self.assertEqual(self.read(data_file), fh.read())
+        self.assertEqual(len(self.read(data_file).splitlines()), 6)
+        self.assertEqual(
+            self.read(self.entry("NY0002")["data"]).splitlines(),
+            ["Date and Time,Gage Height (ft),POSIX Stamp"],
+        )
+
+    def test_only_changed_stations_rebuilt(self):
+        """Stations without new data keep their files; changed ones get new names"""
+        self.build()
+        before = {station.id: self.entry(station.id) for station in self.stations}
+        self.assertEqual(
+            self.build(),
+            {
+                "stations": 3,
+                "csvs_written": 0,
+                "data_written": 0,
+                "pages_written": 0,
+                "rows": 0,
+            },
+        )
+
+        self.add(self.stations[1], 2)
+        self.assertEqual(
+            self.build(),
+            {
+                "stations": 3,
+                "csvs_written": 1,
+                "data_written": 1,
+                "pages_written": 1,
+                "rows": 5,
+            },
+        )
+        self.assertEqual(self.entry("NY0000"), before["NY0000"])
+        changed = self.entry("NY0001")
+        self.assertNotEqual(changed["data"], before["NY0001"]["data"])
+        self.assertEqual(changed["previous_data"], before["NY0001"]["data"])
+        self.assertIn(changed["data"], self.read("NY0001_dygraph.html"))
+
+        # The data file before the previous one is removed.
+        self.add(self.stations[1], 1)
+        self.build()
+        self.assertFalse(
+            os.path.exists(os.path.join(self.page_dir, before["NY0001"]["data"]))
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.page_dir, changed["data"])))
+
+        # A station edit only rewrites its page.
+        Station.objects.filter(id="NY0000").update(name="Renamed")
+        self.assertEqual(
+            self.build(),
+            {
+                "stations": 3,
+                "csvs_written": 0,
+                "data_written": 0,
+                "pages_written": 1,
+                "rows": 0,
+            },
+        )
+        self.assertIn("Renamed", self.read("NY0000_dygraph.html"))
+
+    def test_deleted_station_removed(self):
+        """Pages of deleted stations are removed"""
+        self.build()
+        data_file = self.entry("NY0002")["data"]
+        Station.objects.filter(id="NY0002").delete()
+        self.build()
+        self.assertFalse(
+            os.path.exists(os.path.join(self.page_dir, "NY0002_dygraph.html"))
+        )
+        self.assertFalse(os.path.exists(os.path.join(self.page_dir, data_file)))
+        self.assertNotIn(
+            "NY0002", station_pages.read_manifest(self.page_dir)["stations"]
+        )
+
+    def test_command(self):
+        """build_station_pages reports what it wrote"""
+        out = StringIO()
+        call_command(
+            "build_station_pages",
+            "--output-dir",
+            self.page_dir,
+            "--csv-dir",
+            self.csv_dir,
+            stdout=out,
+        )
+        self.assertIn(
+            "3 stations: wrote 3 CSVs from 8 rows, 3 data files and 3 pages",
+            out.getvalue(),
+        )
+        with open(os.path.join(self.page_dir, "pages.json")) as fh:
+            self.assertEqual(len(json.load(fh)["stations"]), 3)
@@ -0,0 +1,157 @@
+import datetime
+import os
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from main_app import crowdhydrology_website_database as website_database
+from main_app.contribution_database import save_valid_contribution
+from main_app.models import SMSContribution
+from main_app.tests.test_rollups import create_station
+
+
+class TestStationCsv(TestCase):
+    def setUp(self):
+        self.csv_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.csv_dir)
+        settings_override = override_settings(STATION_CSV_DIR=self.csv_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.station = create_station("NY9999")
+        self.path = os.path.join(self.csv_dir, "NY9999.csv")
+
+    def save(self, height):
+        with self.captureOnCommitCallbacks(execute=True):
+            return save_valid_contribution(str(uuid.uuid4()), self.station, height)
+
+    def read(self):
+        with open(self.path, newline="") as fh:
+            return fh.read()
+
+    def rebuilt(self):
+        """The file's content as a full rebuild writes it."""
+        content = self.read()
+        website_database.rebuild_station_csv("NY9999")
+        self.assertEqual(self.read(), content)
+        return content
+
+    def test_only_published_for_existing_files(self):
+        """
+        Stations without a CSV are not published
+        """
+        self.save(1.0)
+        self.assertIsNone(website_database.publish_station_csv("NY9999"))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_appends_new_contributions(self):
+        """
+        Saved contributions are appended after commit, matching a full rebuild
+        """
+        open(self.path, "w").close()
+        first = self.save(1.5)
+        self.assertEqual(
+            self.read().splitlines()[0], "Date and Time,Gage Height (ft),POSIX Stamp"
+        )
+
+        self.save(2.5)
+        self.save(3.5)
+        with self.assertNumQueries(1):
+            self.assertEqual(website_database.publish_station_csv("NY9999"), 0)
+        lines = self.rebuilt().splitlines()
+        # Dates are written as read from the database, in UTC.
+        first.refresh_from_db()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(
+            lines[1].startswith(first.date_received.strftime("%m/%d/%Y %X") + ",1.5,")
+        )
+        self.assertEqual(
+            [line.split(",")[1] for line in lines[1:]], ["1.5", "2.5", "3.5"]
+        )
+
+    def test_rebuilds_when_file_does_not_match(self):
+        """
+        A file changed behind the watermark, or a back-dated contribution, is rebuilt
+        """
+        open(self.path, "w").close()
+        self.save(1.0)
+        self.save(2.0)
+        with open(self.path, "a") as fh:
+            fh.write("partial")
+        self.save(3.0)
+        self.assertNotIn("partial", self.read())
+
+        SMSContribution.objects.create(
+            contributor_id=uuid.uuid4(),
+            station=self.station,
+            water_height=0.5,
+            date_received=timezone.now() - datetime.timedelta(days=1),
+        )
+        self.assertEqual(website_database.publish_station_csv("NY9999"), 4)
+        heights = [line.split(",")[1] for line in self.rebuilt().splitlines()[1:]]
+        self.assertEqual(heights, ["0.5", "1.0", "2.0", "3.0"])
+
+
+class TestExportStationCsvs(TestCase):
+    def setUp(self):
+        self.csv_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.csv_dir)
+        self.stations = [create_station("NY%04d" % i) for i in range(3)]
+        start = timezone.now() - datetime.timedelta(days=1)
+        SMSContribution.objects.bulk_create(
+            SMSContribution(
+                contributor_id=uuid.uuid4(),
+                station=self.stations[i % 2],
+                water_height=i / 2,
+                date_received=start + datetime.timedelta(minutes=i),
+            )
+            for i in range(20)
+        )
+
+    def export(self):
+        out = StringIO()
+        call_command(
+            "export_station_csvs",
+            "--output-dir",
+            self.csv_dir,
+            "--workers",
+            "2",
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def read(self, station_id):
+        with open(os.path.join(self.csv_dir, station_id + ".csv"), newline="") as fh:
+            return fh.read()
+
+    def test_exports_changed_stations(self):
+        """
+        Every station is exported from one scan, then only changed ones are rewritten
+        """
+        with self.assertNumQueries(2):
+            self.assertIn(
+                "Wrote 3 stations (0 unchanged skipped), 20 rows", self.export()
+            )
+        self.assertEqual(len(self.read("NY0000").splitlines()), 11)
+        self.assertEqual(
+            self.read("NY0002").splitlines(),
+            ["Date and Time,Gage Height (ft),POSIX Stamp"],
+        )
+
+        self.assertIn("Wrote 0 stations (3 unchanged skipped), 0 rows", self.export())
+        SMSContribution.objects.create(
+            contributor_id=uuid.uuid4(),
+            station=self.stations[1],
+            water_height=9.0,
+            date_received=timezone.now(),
+        )
+        self.assertIn("Wrote 1 stations (2 unchanged skipped), 11 rows", self.export())
+
+        exported = self.read("NY0001")
+        with override_settings(STATION_CSV_DIR=self.csv_dir):
+            website_database.rebuild_station_csv("NY0001")
+        self.assertEqual(self.read("NY0001"), exported)
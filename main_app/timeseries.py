@@ -0,0 +1,207 @@
+import datetime
+from typing import Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from main_app.models import SMSContribution, Station
+
+"""
+Query helpers for station time series served by the data endpoints.
+
+Rows are read with values_list() and iterator() in date_received order, which
+the (station, date_received) index returns without sorting, so memory stays flat
+however long a station's history is. Pagination is keyset based: the cursor is
+the date_received of the last row on the page (date_received is unique).
+"""
+
+CONTRIBUTION_FIELDS = ("contributor_id", "water_height", "temperature", "date_received")
+CHUNK_SIZE = 2000
+MAX_PAGE_SIZE = 10000
+MAX_BULK_STATIONS = 50
+
+
+class TimeSeriesQueryError(ValueError):
+    """Raised for malformed time series query parameters."""
+
+
+def parse_timestamp(value: str, end_of_day: bool = False) -> datetime.datetime:
+    """
+    Parse an ISO 8601 date or datetime into an aware datetime.
+
+    Naive values are read in the current timezone. A bare date is that day's
+    midnight, or the following midnight with end_of_day so an exclusive upper
+    bound still includes the whole day.
+    """
+    try:
+        day = parse_date(value)
+        if day is not None:
+            if end_of_day:
+                day += datetime.timedelta(days=1)
+            parsed = datetime.datetime.combine(day, datetime.time.min)
+        else:
+            parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError
+    except ValueError:
+        raise TimeSeriesQueryError("Invalid date: {}".format(value))
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def encode_cursor(date_received: datetime.datetime) -> str:
+    return urlsafe_base64_encode(date_received.isoformat().encode())
+
+
+def decode_cursor(cursor: str) -> datetime.datetime:
+    try:
+        parsed = parse_datetime(urlsafe_base64_decode(cursor).decode())
+    except ValueError:
+        parsed = None
+    if parsed is None or timezone.is_naive(parsed):
+        raise TimeSeriesQueryError("Invalid cursor.")
+    return parsed
+
+
+def parse_time_range(params):
+    """Return the (start, end) bounds given by the start/end query parameters."""
+    start = parse_timestamp(params["start"]) if params.get("start") else None
+    end = parse_timestamp(params["end"], end_of_day=True) if params.get("end") else None
+    return start, end
+
+
+def parse_page_size(params) -> Optional[int]:
+    if not params.get("limit"):
+        return None
+    try:
+        limit = int(params["limit"])
+    except ValueError:
+        raise TimeSeriesQueryError("Invalid limit.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise TimeSeriesQueryError(
+            "limit must be between 1 and {}.".format(MAX_PAGE_SIZE)
+        )
+    return limit
+
+
+def station_contributions(
+    station_ids,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    after: Optional[datetime.datetime] = None,
+    fields=CONTRIBUTION_FIELDS,
+    order_by=("date_received",),
+):
+    """Contributions of the given stations in [start, end), oldest first."""
+    queryset = SMSContribution.objects.filter(station_id__in=station_ids)
+    if start:
+        queryset = queryset.filter(date_received__gte=start)
+    if end:
+        queryset = queryset.filter(date_received__lt=end)
+    if after:
+        queryset = queryset.filter(date_received__gt=after)
+    return queryset.order_by(*order_by).values_list(*fields)
+
+
+class ContributionPage:
+    """
+    One keyset page of a station's contributions, read lazily.
+
+    The page boundary is resolved up front with a small indexed query, so
+    next_cursor (None on the last page) is known before any rows are streamed
+    and rows saved meanwhile cannot shift the page. Iterating yields rows of
+    CONTRIBUTION_FIELDS.
+    """
+
+    def __init__(self, station_id: str, params):
+        self.start, self.end = parse_time_range(params)
+        self.after = decode_cursor(params["cursor"]) if params.get("cursor") else None
+        self.limit = parse_page_size(params)
+        self.station_id = station_id
+        self.last_date = None
+        self.next_cursor = None
+
+        if self.limit:
+            boundary = self.queryset(fields=("date_received",))[
+                self.limit - 1 : self.limit + 1
+            ]
+            dates = [date_received for (date_received,) in boundary]
+            if len(dates) == 2:
+                self.last_date = dates[0]
+                self.next_cursor = encode_cursor(self.last_date)
+
+    def queryset(self, fields=CONTRIBUTION_FIELDS):
+        return station_contributions(
+            [self.station_id], self.start, self.end, self.after, fields
+        )
+
+    def __iter__(self):
+        queryset = self.queryset()
+        if self.last_date:
+            queryset = queryset.filter(date_received__lte=self.last_date)
+        elif self.limit:
+            queryset = queryset[: self.limit]
+        return queryset.iterator(chunk_size=CHUNK_SIZE)
+
+
+def select_stations(params):
+    """
+    Resolve the stations of a bulk request, a page of stations at a time.
+
+    stations is a comma separated list of IDs or "all"; state restricts the
+    selection to one state. Listed stations that don't exist, or aren't in the
+    state, are rejected with their own errors. At most MAX_BULK_STATIONS are returned, ordered by
+    ID, after the station ID given as cursor. Returns (station_ids, next_cursor).
+    """
+    requested = params.get("stations", "").strip()
+    state = params.get("state", "").strip().upper()
+    if not requested and not state:
+        raise TimeSeriesQueryError("Pass stations=<id,id,...|all> or state=<XX>.")
+
+    stations = Station.objects.order_by("id")
+    if requested and requested.lower() != "all":
+        station_ids = {sid.strip() for sid in requested.split(",") if sid.strip()}
+        stations = stations.filter(id__in=station_ids)
+        states = dict(stations.values_list("id", "state"))
+        missing = station_ids - states.keys()
+        if missing:
+            raise TimeSeriesQueryError(
+                "Unknown stations: {}".format(", ".join(sorted(missing)))
+            )
+        elsewhere = state and sorted(
+            sid for sid, station_state in states.items() if station_state != state
+        )
+        if elsewhere:
+            raise TimeSeriesQueryError(
+                "Stations not in {}: {}".format(state, ", ".join(elsewhere))
+            )
+    if state:
+        stations = stations.filter(state=state)
+    if params.get("cursor"):
+        stations = stations.filter(id__gt=params["cursor"])
+
+    station_ids = list(stations.values_list("id", flat=True)[: MAX_BULK_STATIONS + 1])
+    if len(station_ids) > MAX_BULK_STATIONS:
+        return station_ids[:MAX_BULK_STATIONS], station_ids[MAX_BULK_STATIONS - 1]
+    return station_ids, None
+
+
+def bulk_contributions(station_ids, params):
+    """
+    Contributions of several stations in one query, grouped by station.
+
+    Rows are ("station_id",) + CONTRIBUTION_FIELDS, ordered by station and then
+    date, which the (station, date_received) index yields without sorting.
+    """
+    start, end = parse_time_range(params)
+    queryset = station_contributions(
+        station_ids,
+        start,
+        end,
+        fields=("station_id",) + CONTRIBUTION_FIELDS,
+        order_by=("station_id", "date_received"),
+    )
+    return queryset.iterator(chunk_size=CHUNK_SIZE)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from main_app import graphs, receive_sms, survey, views
+from main_app import receive_sms, survey, views
 
 # Template Urls
 app_name = "main_app"
@@ -9,8 +9,14 @@ urlpatterns = [
     path("sms/", receive_sms.incoming_sms, name="sms"),
     path("survey/", survey.incoming_survey, name="survey"),
     path("", views.index, name="index"),
-    path("generate-graphs/", graphs.generate, name="generate-graphs"),
+    path("generate-graphs/", views.generate_graphs, name="generate-graphs"),
+    path("generate-graphs/status/", views.graph_status, name="graph-status"),
     path("data/", views.get_data, name="get-data"),
+    path("data/bulk/", views.get_bulk_data, name="get-bulk-data"),
+    path("stations/near/", views.stations_near, name="stations-near"),
+    path("stations/bbox/", views.stations_bbox, name="stations-bbox"),
+    path("live/", views.live_feed, name="live-feed"),
     path("download/", views.download, name="download"),
+    path("charts/<str:filename>", views.chart, name="chart"),
     # path('user_login/', views.user_login, name='user_login')
 ]
@@ -1,59 +1,333 @@
-import os
-
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
-from django.shortcuts import render
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import redirect, render
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 # from main_app import data_migrate_csv
 # from main_app import twilio_csv_data_migration
-# from main_app import send_CUAHSI_data
-from main_app.models import SMSContribution, Station
+from main_app import (
+    charts,
+    downloads,
+    downsampling,
+    formats,
+    graph_jobs,
+    live,
+    response_cache,
+    spatial,
+)
+from main_app.models import Station
+from main_app.timeseries import (
+    ContributionPage,
+    TimeSeriesQueryError,
+    bulk_contributions,
+    parse_time_range,
+    select_stations,
+)
+
+# Public names of timeseries.CONTRIBUTION_FIELDS in get_data responses.
+CONTRIBUTION_COLUMNS = ("contributor_id", "gage_height", "temperature", "date_received")
+# Public names of downsampling.BUCKET_FIELDS.
+BUCKET_COLUMNS = (
+    "bucket_start",
+    "count",
+    "gage_height_min",
+    "gage_height_max",
+    "gage_height_mean",
+    "temperature_mean",
+)
+MAX_NEAREST_STATIONS = 100
 
 
 # Create your views here.
 @login_required
 def index(request):
-    return render(request, "main_app/index.html")
+    return render(
+        request,
+        "main_app/index.html",
+        {
+            "graph_run": graph_jobs.latest_run(),
+            "graphs_generated": graph_jobs.last_successful_run(),
+            "charts": charts.read_manifest(),
+        },
+    )
+
+
+def chart(request, filename):
+    """A file rendered by main_app.charts; its name changes with its content."""
+    file_path = charts.chart_path(filename)
+    if file_path is None:
+        raise Http404
+    return downloads.file_response(
+        request, file_path, as_attachment=False, immutable=True
+    )
+
+
+@login_required
+@require_POST
+def generate_graphs(request):
+    """Start generating the stats graphs and CSVs, unless it is already running."""
+    graph_jobs.start_generation()
+    return redirect("main_app:index")
+
+
+@login_required
+def graph_status(request):
+    """The latest graph generation run, for polling its progress."""
+    return JsonResponse({"run": graph_jobs.run_json(graph_jobs.latest_run())})
 
 
 @login_required
 def download(request):
-    path = request.GET["path"]
-    file_path = os.path.join(settings.STATIC_DIR, path)
-    if os.path.exists(file_path):
-        with open(file_path, "rb") as fh:
-            response = HttpResponse(fh.read(), content_type="text/csv")
-            response[
-                "Content-Disposition"
-            ] = "attachment; filename=" + os.path.basename(file_path)
-            return response
-    raise Http404
+    path = request.GET.get("path")
+    if not path:
+        raise Http404
+    return downloads.file_response(request, downloads.resolve(path))
 
 
 @csrf_exempt
 def get_data(request):
-    station_id = request.GET["station"]
-    try:
-        station = Station.objects.get(id=station_id)
-        contributions = SMSContribution.objects.filter(station=station)
-        contributions_json = []
-        for contribution in contributions:
-            print("hey")
-            contributions_json += [
-                (
-                    {
-                        "contributor_id": contribution.contributor_id,
-                        "gage_height": contribution.water_height,
-                        "temperature": contribution.temperature,
-                        "date_received": contribution.date_received,
-                    }
-                )
-            ]
-        print(contributions_json)
-        return JsonResponse({"contributions": contributions_json})
-    except Exception:
+    """
+    Stream a station's contributions, oldest first.
+
+    Query parameters:
+        station: station ID (required)
+        start, end: ISO date/datetime bounds; start is inclusive, end exclusive
+            (a bare end date includes that whole day)
+        limit: page size; without it the whole range is returned
+        cursor: the "next" value (or X-Next-Cursor header) of the previous page
+        format: json (default), ndjson, csv, columns, arrow or parquet; the
+            Accept header is used when it is absent
+        points: return at most this many readings, picked with LTTB
+        bucket: 1h or 1d; return per bucket count/min/max/mean ("buckets")
+            instead of readings
+
+    Responses carry an ETag (and Last-Modified) that changes with the
+    station's data; conditional requests are answered with 304 and repeated
+    ones from the station data cache.
+    """
+    station_id = request.GET.get("station")
+    version = response_cache.station_version(station_id) if station_id else None
+    if version is None:
         return HttpResponseBadRequest(
             content="Error: Couldn't find a station with that ID."
         )
+
+    try:
+        wire_format = formats.negotiate_format(request)
+    except formats.UnsupportedFormat as e:
+        return HttpResponse("Error: {}".format(e), status=406)
+
+    cache = None
+    if version[0] is not None:
+        cache = response_cache.StationResponseCache(
+            request, station_id, *version, wire_format
+        )
+        response = cache.not_modified() or cache.cached()
+        if response:
+            return response
+
+    try:
+        response = station_data_response(request, station_id, wire_format)
+    except TimeSeriesQueryError as e:
+        return HttpResponseBadRequest(content="Error: {}".format(e))
+    return cache.store(response) if cache else response
+
+
+def station_data_response(request, station_id, wire_format):
+    points, bucket = downsampling.parse_downsampling(request.GET)
+    if points or bucket:
+        series = downsampled_series(station_id, request.GET, points, bucket)
+        return formats.streaming_response(request, series, wire_format, station_id)
+
+    page = ContributionPage(station_id, request.GET)
+    series = formats.TimeSeries(
+        "contributions", CONTRIBUTION_COLUMNS, page, {"next": page.next_cursor}
+    )
+    response = formats.streaming_response(request, series, wire_format, station_id)
+    _link_next_page(request, response, page.next_cursor)
+    return response
+
+
+def downsampled_series(station_id, params, points, bucket):
+    start, end = parse_time_range(params)
+    if points:
+        rows = downsampling.lttb_contributions(station_id, start, end, points)
+        return formats.TimeSeries(
+            "contributions", CONTRIBUTION_COLUMNS, rows, {"points": points}
+        )
+    rows = downsampling.bucket_summaries(station_id, start, end, bucket)
+    return formats.TimeSeries("buckets", BUCKET_COLUMNS, rows, {"bucket": bucket})
+
+
+@csrf_exempt
+def get_bulk_data(request):
+    """
+    Stream the contributions of many stations with one query, grouped by station.
+
+    Query parameters:
+        stations: comma separated station IDs, or "all"
+        state: two letter state code, alone or to narrow stations
+        start, end: as for get_data
+        cursor: the "next" value of the previous page; each response covers
+            at most timeseries.MAX_BULK_STATIONS stations
+        format: as for get_data; json and columns nest rows under each station
+            ID, the other formats add a station column. Stations without
+            contributions in the range are left out.
+    """
+    try:
+        wire_format = formats.negotiate_format(request)
+    except formats.UnsupportedFormat as e:
+        return HttpResponse("Error: {}".format(e), status=406)
+
+    try:
+        station_ids, next_cursor = select_stations(request.GET)
+        rows = bulk_contributions(station_ids, request.GET)
+    except TimeSeriesQueryError as e:
+        return HttpResponseBadRequest(content="Error: {}".format(e))
+
+    series = formats.TimeSeries(
+        "stations",
+        ("station",) + CONTRIBUTION_COLUMNS,
+        rows,
+        {"next": next_cursor},
+        group_by="station",
+    )
+    response = formats.streaming_response(request, series, wire_format, "stations")
+    _link_next_page(request, response, next_cursor)
+    return response
+
+
+def _link_next_page(request, response, cursor):
+    if cursor:
+        next_params = request.GET.copy()
+        next_params["cursor"] = cursor
+        response["X-Next-Cursor"] = cursor
+        response["Link"] = '<{}?{}>; rel="next"'.format(
+            request.path, next_params.urlencode()
+        )
+
+
+def _coordinate(params, name, limit):
+    try:
+        value = float(params[name])
+    except (KeyError, ValueError):
+        raise ValueError("{} is required and must be a number.".format(name))
+    if not -limit <= value <= limit:
+        raise ValueError("{} must be between -{} and {}.".format(name, limit, limit))
+    return value
+
+
+def _station_json(point, distance_km=None):
+    station = {
+        "id": point.id,
+        "name": point.name,
+        "state": point.state,
+        "latitude": point.latitude,
+        "longitude": point.longitude,
+    }
+    if distance_km is not None:
+        station["distance_km"] = round(distance_km, 3)
+    return station
+
+
+@csrf_exempt
+def stations_near(request):
+    """
+    The stations closest to a point, closest first.
+
+    Query parameters:
+        lat, lon: the point (required)
+        k: number of stations, 1 to MAX_NEAREST_STATIONS (default 10)
+        radius_km: only stations within this distance
+    """
+    try:
+        latitude = _coordinate(request.GET, "lat", 90)
+        longitude = _coordinate(request.GET, "lon", 180)
+        k = int(request.GET.get("k", 10))
+        if not 1 <= k <= MAX_NEAREST_STATIONS:
+            raise ValueError("k must be between 1 and {}.".format(MAX_NEAREST_STATIONS))
+        radius_km = request.GET.get("radius_km")
+        radius_km = float(radius_km) if radius_km else None
+    except ValueError as e:
+        return HttpResponseBadRequest(content="Error: {}".format(e))
+
+    nearest = spatial.station_index().nearest(latitude, longitude, k, radius_km)
+    return JsonResponse(
+        {"stations": [_station_json(point, distance) for distance, point in nearest]}
+    )
+
+
+@csrf_exempt
+def stations_bbox(request):
+    """
+    The stations inside a bounding box.
+
+    Query parameters:
+        bbox: west,south,east,north in degrees (required); west > east crosses
+            the antimeridian
+    """
+    try:
+        west, south, east, north = (
+            float(value) for value in request.GET.get("bbox", "").split(",")
+        )
+    except ValueError:
+        return HttpResponseBadRequest(
+            content="Error: bbox must be west,south,east,north."
+        )
+    if south > north:
+        return HttpResponseBadRequest(content="Error: bbox south is above north.")
+
+    stations = spatial.station_index().within(west, south, east, north)
+    return JsonResponse({"stations": [_station_json(point) for point in stations]})
+
+
+@csrf_exempt
+def live_feed(request):
+    """
+    Server-sent events of contributions as they are saved.
+
+    Query parameters:
+        station: station ID, or
+        state: two letter state code
+        last_event_id: resume after this event; the Last-Event-ID header
+            sent by a reconnecting EventSource takes precedence
+    """
+    station_id = request.GET.get("station")
+    state = request.GET.get("state", "").upper()
+    if station_id:
+        if not Station.objects.filter(id=station_id).exists():
+            return HttpResponseBadRequest(
+                content="Error: Couldn't find a station with that ID."
+            )
+        state = None
+    elif not state:
+        return HttpResponseBadRequest(content="Error: Pass station or state.")
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id"
+    )
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return HttpResponseBadRequest(content="Error: Invalid last event ID.")
+
+    try:
+        subscriber = live.broker.subscribe(live.Subscriber(station_id, state))
+    except live.TooManySubscribers:
+        response = HttpResponse("Error: Too many live viewers.", status=503)
+        response["Retry-After"] = live.RETRY_MS // 1000
+        return response
+
+    response = StreamingHttpResponse(
+        live.EventStream(subscriber, last_event_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Don't let nginx buffer the stream
+    return response
@@ -83,12 +83,21 @@ class AbstractLLMClient(ABC, Generic[LLM_CLIENT_TYPE]):
 
 class GeminiClient(AbstractLLMClient[genai.Client]):
     def __init__(
-        self, model_name: str = "gemini-2.5-flash", secret_key: Optional[str] = None
+        self,
+        model_name: str = "gemini-2.5-flash",
+        secret_key: Optional[str] = None,
+        base_url: Optional[str] = None,
     ):
+        # Overrides the Gemini API endpoint, e.g. to point at a stub server.
+        self.base_url = base_url
         super().__init__(model_name, secret_key)
 
     def _initialize_client(self, secret_key: str) -> genai.Client:
-        return genai.Client(api_key=secret_key)  # Replace with your actual API key
+        http_options = (
+            types.HttpOptions(base_url=self.base_url) if self.base_url else None
+        )
+        # Replace with your actual API key
+        return genai.Client(api_key=secret_key, http_options=http_options)
 
     def get_gauge_and_station_label_reading(
         self, prompt: str, gauge_roi: Image, station_label_roi: Image
@@ -0,0 +1,39 @@
+// Draws a station page's hydrograph from its copy of the station's dygraph CSV
+// (see main_app.crowdhydrology_website_database): "MM/DD/YYYY HH:MM:SS" UTC
+// times and gage heights, "None" when a reading has no height.
+(function () {
+  var chart = document.getElementById("chart");
+  fetch(chart.dataset.csv)
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      return response.text();
+    })
+    .then(function (text) {
+      var x = [];
+      var y = [];
+      text.trim().split("\n").slice(1).forEach(function (line) {
+        var fields = line.split(",");
+        var parts = fields[0].split(/[\/ :]/).map(Number);
+        var height = parseFloat(fields[1]);
+        if (!isNaN(height)) {
+          x.push(new Date(Date.UTC(parts[2], parts[0] - 1, parts[1], parts[3], parts[4], parts[5])));
+          y.push(height);
+        }
+      });
+      Plotly.newPlot(
+        chart,
+        [{x: x, y: y, type: "scatter", mode: "lines", line: {color: "blue", width: 2}}],
+        {
+          title: {text: chart.dataset.title},
+          xaxis: {title: {text: "Date"}, rangeslider: {visible: true}},
+          yaxis: {title: {text: "Gage Height (ft.)"}},
+        },
+        {responsive: true}
+      );
+    })
+    .catch(function (error) {
+      chart.textContent = "Couldn't load the readings: " + error.message;
+    });
+})();